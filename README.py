@@ -24,6 +24,16 @@ print("""
   - Sheet "Có thông tin sáp nhập": Chỉ những địa chỉ có thông tin
   - Sheet "Danh sách lỗi": Chi tiết các lỗi gặp phải
 
+▪️ sap_nhap_simple_YYYYMMDD_HHMMSS.parquet - Cùng dữ liệu, dạng cột (pyarrow)
+  - ma_tinh / cap_hanh_chinh: category, co_thong_tin: bool, so_luong_thay_doi: int
+  - Đọc lại trong vài ms: pd.read_parquet(file, columns=['ma_tinh', 'ma_xa', 'sau_sap_nhap'])
+  - --columnar feather để lưu Arrow IPC/Feather, --columnar none để tắt
+
+▪️ sap_nhap_results.sqlite3 - Kho kết quả chung (ResultStore)
+  - Mỗi (ma_tinh, ma_xa) một dòng: crawl lại, retry, crawl từng phần đều upsert vào đây
+  - Index theo mã và tên đã chuẩn hóa (bỏ dấu): store.get('83', '28756'), store.find_by_name('xa chau hoa')
+  - --store <file> để dùng file khác, --no-store để tắt
+
 ▪️ error_log_YYYYMMDD_HHMMSS.xlsx - Log lỗi chi tiết
   - Sheet "Danh sách lỗi": Chi tiết từng lỗi
   - Sheet "Thống kê lỗi": Thống kê theo loại lỗi
@@ -40,25 +50,95 @@ print("""
    3. Auto-discovery toàn bộ (63 tỉnh, ~4-6 giờ)
    4. Auto-discovery giới hạn (test với vài tỉnh)
    5. Retry các lỗi từ lần crawl trước
+   6. Auto-discovery song song (async, cần aiohttp)
+
+   Resume khi bị dừng giữa chừng (crash, Ctrl+C, mất mạng):
+   python sap_nhap_simple.py --resume
+   - Mỗi xã/phường crawl xong được ghi ngay vào sap_nhap_journal.jsonl
+   - --resume nạp lại các bản ghi đã có và chỉ crawl phần còn thiếu
+   - --journal <file> để dùng file journal khác
+
+   Streaming kết quả (bộ nhớ không tăng khi crawl toàn quốc):
+   python sap_nhap_simple.py --stream ket_qua.xlsx   # hoặc .csv / .jsonl / .parquet
+   - Mỗi bản ghi được ghi ra file ngay khi crawl xong, không giữ trong crawler.data
+   - Sheet "Thống kê" được dựng từ bộ đếm chạy
+
+   Đo thời gian từng bước (chờ rate limiter, DNS/connect/TTFB/tải body, parse, ghi, export):
+   python sap_nhap_simple.py --metrics-file metrics.json     # ghi JSON mỗi 15s (--metrics-interval)
+   python sap_nhap_simple.py --metrics-port 9108             # Prometheus: http://host:9108/metrics
+   - Histogram latency chung và theo từng tỉnh (p50/p90/p99), kèm bộ đếm lỗi / 429 / cache
+   - Bảng tóm tắt theo bước in cùng thống kê cuối; DNS/connect chỉ tách riêng ở chế độ async
 
 2. DEMO VÀ TEST:
    python test_auto_discovery.py      # Test với 3 tỉnh
    python test_error_handling.py      # Test error handling
    python demo_error_handling.py      # Demo retry functionality
+   python debug_parse.py              # So sánh backend parse lxml / html.parser
+   python debug_batch.py              # Kiểm tra output NDJSON chuyển đổi hàng loạt (API + CLI)
+   python debug_journal.py            # Kiểm tra resume journal sau khi crash giữa lúc ghi
+   python bench_api.py                # So sánh req/s API: lọc DataFrame / index dựng sẵn
+   python bench_crawl.py              # Benchmark crawler offline (server replay cục bộ, không gọi website)
+     --save-baseline lưu kết quả, các lần sau tự so sánh pages/s, p50/p99, CPU/trang, RSS đỉnh
+     --latency-ms / --rate-429 / --timeout-rate giả lập độ trễ, 429 và timeout; --mode async để đo bản async
+     --outage-after N --outage-seconds S giả lập website sập (503) để thử circuit breaker
+
+3. API TRA CỨU (Flask):
+   SAP_NHAP_DATA=sap_nhap_simple_YYYYMMDD_HHMMSS.parquet python api_sap_nhap.py
+   - Production: SAP_NHAP_DATA=... gunicorn -c gunicorn.conf.py
+     (app factory api_sap_nhap:create_app(), nạp dữ liệu một lần rồi fork mỗi CPU một worker,
+      dùng chung bộ nhớ copy-on-write; WEB_CONCURRENCY / BIND để đổi số worker / cổng)
+   - Dev server không bật debug; cần debug thì đặt FLASK_DEBUG=1
+   - Đọc .xlsx / .parquet / .feather / .snapshot (mặc định sap_nhap_backup.xlsx)
+   - Khởi động nhanh: biên dịch dữ liệu + index thành snapshot một lần
+     python sap_nhap_snapshot.py sap_nhap_simple_YYYYMMDD_HHMMSS.xlsx -o sap_nhap.snapshot
+     SAP_NHAP_DATA=sap_nhap.snapshot gunicorn -c gunicorn.conf.py
+     (Arrow IPC mở bằng mmap: nạp ~0.15 s thay vì ~6 s đọc Excel và dựng lại index;
+      các worker chỉ dùng chung index trigram, bản ghi mỗi worker vẫn giữ một bản;
+      cần pyarrow, không có thì API đọc file dữ liệu gốc ghi trong snapshot)
+   - Tự nạp lại khi file dữ liệu thay đổi, không cần restart: dựng index mới ở thread nền
+     rồi mới đổi vào, request đang chạy vẫn dùng bản cũ (SAP_NHAP_RELOAD_INTERVAL giây, 0 = tắt)
+   - Phiên bản dữ liệu đang dùng: header X-Sap-Nhap-Version ở mọi response, chi tiết ở /phien-ban
+   - Cache HTTP: các route GET trả ETag theo phiên bản dữ liệu + Cache-Control
+     (SAP_NHAP_CACHE_MAX_AGE giây, mặc định 300); gửi lại If-None-Match thì nhận 304 không cần tra cứu
+   - Nén gzip / brotli theo Accept-Encoding; trang chủ và /get-xa dựng + nén sẵn một lần cho mỗi tỉnh
+   - Index dựng sẵn khi khởi động (sap_nhap_index.py): tra theo mã O(1),
+     danh sách xã/phường của từng tỉnh đã sắp sẵn
+   - Tra theo tên không phân biệt dấu qua index trigram:
+     /tra-cuu?ten_tinh=ha noi&ten_xa=phuong 1    (chuỗi con)
+     /tra-cuu?ten_xa=hong&khop=dau_tu            (đầu từ, dùng cho gợi ý)
+   - Chuyển địa chỉ cũ dạng chữ tự do (viết tắt P./Q./TP, gõ sai, không dấu):
+     /chuyen-doi?dia_chi=P. Phuc Xa, Q. Ba Dinh, HN&k=5
+     -> top-k địa chỉ sau sáp nhập kèm điểm (score 0-1), ~1 ms mỗi lần tra
+   - Chuyển đổi hàng loạt: POST /chuyen-doi-hang-loat
+     body mảng JSON [{"ma_tinh": "01", "ma_xa": "1"}, {"ten_tinh": "Hà Nội", "ten_xa": "Phường Phúc Xá"}]
+     hoặc upload file (field "file": .csv/.xlsx/.json/.jsonl); kết quả stream NDJSON,
+     thêm ?dinh_dang=csv để nhận CSV; cột "khop" cho biết dòng có tìm thấy không
+
+4. CHUYỂN ĐỔI FILE HÀNG LOẠT (không cần chạy API):
+   python sap_nhap_batch.py khach_hang.csv -o ket_qua.csv --data sap_nhap_backup.xlsx
+   - Đầu vào có cột ma_tinh, ma_xa hoặc ten_tinh, ten_xa (tên không phân biệt dấu)
+   - So khớp bằng join theo khóa trên từng khối 50.000 dòng, vài triệu dòng/phút
 
 📈 THỐNG KÊ VÀ MONITORING:
 
-Script sẽ hiển thị real-time:
-▪️ Số tỉnh/xã đã xử lý
-▪️ Tỷ lệ thành công/lỗi
-▪️ Loại lỗi gặp phải
+Auto-discovery in một dòng tiến độ mỗi 30 giây (--progress-interval) thay cho output từng xã/phường:
+▪️ Số xã/phường đã xong / tổng (tổng ngoại suy khi chưa liệt kê hết các tỉnh)
+▪️ Tốc độ xã/phường mỗi giây (trung bình 5 phút gần nhất)
+▪️ Tỷ lệ lỗi trong cùng cửa sổ
 ▪️ Thời gian ước tính còn lại
+▪️ --status-file status.json: ghi cùng thông tin ra file JSON để theo dõi từ xa
 
 🔄 XỬ LÝ LỖI VÀ RETRY:
 
-Nếu gặp lỗi:
+Auto-discovery tự thử lại ngay trong lúc crawl:
+▪️ Xã/phường lỗi (timeout, mất kết nối, 429...) được đưa lại vào lịch crawl sau
+  5s, 10s, 20s... (kèm jitter), chạy xen với các xã/phường mới
+▪️ Tối đa 4 lần thử mỗi xã/phường (--retry-attempts, --retry-delay); chỉ xã/phường
+  hết lượt mới vào error log, nên lần chạy đầy đủ thường kết thúc với dữ liệu đủ
+
+Nếu vẫn còn lỗi:
 1. Script tự động lưu error log
-2. Chọn option 5 để retry các lỗi
+2. Chọn option 5 để retry các lỗi (dùng cùng hàng đợi thử lại)
 3. Hoặc dùng code:
    
    from sap_nhap_simple import SapNhapCrawlerSimple
@@ -69,30 +149,51 @@ Nếu gặp lỗi:
    error_df = pd.read_excel('error_log_latest.xlsx', sheet_name='Danh sách lỗi')
    crawler.error_log = error_df.to_dict('records')
    
-   # Retry
+   # Retry (kết quả cũng được thêm vào crawler.data)
    retry_data = crawler.retry_failed_requests()
    
    # Lưu kết quả
-   crawler.data = retry_data
    crawler.save_to_excel()
 
 ⚡ PERFORMANCE TIPS:
 
-▪️ Delay giữa requests: 1.2s (tránh rate limit)
-▪️ Delay giữa tỉnh: 3s 
-▪️ Timeout: 15s với 3 lần retry
-▪️ Exponential backoff cho rate limiting
+▪️ Rate limiter dùng chung (sap_nhap_ratelimit.py): bắt đầu ~0.8 req/s,
+  tự tăng dần khi ổn định (tối đa 10 req/s)
+▪️ Timeout: 15s; trang xã/phường lỗi vào hàng đợi thử lại, trang danh sách retry tại chỗ 3 lần
+▪️ Gặp 429 / Retry-After: giảm một nửa tốc độ và tạm dừng mọi request
+▪️ Circuit breaker theo host (sap_nhap_breaker.py): website timeout / mất kết nối / 5xx
+  hàng loạt (>= 50% trong 20 request gần nhất hoặc 5 lỗi liên tiếp) thì mọi worker dừng chờ
+  30s, gửi 1 request thăm dò, ổn thì crawl tiếp, vẫn lỗi thì chờ gấp đôi (tối đa 10 phút)
+  - Không tốn timeout và lượt thử cho từng URL khi website sập, error log không bị dồn lỗi
+  - --breaker-ratio / --breaker-cooldown để chỉnh; "Thống kê" ghi số lần và tổng thời gian ngắt
+▪️ Tùy chỉnh: SapNhapCrawlerSimple(rate_limiter=AdaptiveRateLimiter(rate=2, max_rate=5))
+▪️ Cache HTML trên đĩa (sap_nhap_cache.sqlite3, nén zlib, TTL 12 giờ, tối đa 500MB):
+  chạy lại để parse/xuất Excel không tốn request nào
+  - Tùy chỉnh: SapNhapCrawlerSimple(page_cache=PageCache(ttl=3600, max_bytes=100 * 1024 * 1024))
+  - Tắt cache: SapNhapCrawlerSimple(use_cache=False)
+▪️ Backend parse: mặc định lxml (chỉ duyệt các bảng/select cần thiết, nhanh ~10 lần);
+  dùng SapNhapCrawlerSimple(parser_backend='html.parser') để quay về BeautifulSoup
+▪️ Trang hết hạn trong cache được revalidate bằng If-None-Match / If-Modified-Since:
+  server trả 304 thì dùng lại trang và kết quả parse cũ (xem tỷ lệ 304 trong "Thống kê")
 
 Ước tính thời gian:
 - 5 địa chỉ test: ~10 giây
 - 1 tỉnh (~200 xã): ~5-10 phút  
 - Toàn bộ 63 tỉnh: ~4-6 giờ
+- Toàn bộ 63 tỉnh với option 6 (8 request song song): dưới 1 giờ
+
+▪️ Chế độ async: crawler.crawl_all_autodiscovery_async(concurrency=8)
+  - Giữ tối đa `concurrency` request cùng lúc trên nhiều tỉnh
+  - Kết quả vẫn được ghi vào crawler.data như chế độ tuần tự
+  - Tách 2 stage: tải HTML (async) và parse (ProcessPoolExecutor, parse_workers = số CPU)
+    nối bằng queue có giới hạn; parse_workers=0 để parse ngay trong event loop
 
 🛠️ TROUBLESHOOTING:
 
-▪️ Lỗi 429 (Too Many Requests): Script tự động retry với delay tăng dần
+▪️ Lỗi 429 (Too Many Requests): Rate limiter tự giảm tốc toàn cục rồi retry
 ▪️ Timeout: Tăng timeout trong get_page_content()
 ▪️ Connection error: Kiểm tra internet, script sẽ retry tự động
+▪️ Thấy "🔌 Ngắt mạch": website đang lỗi, crawler tự thăm dò và chạy tiếp khi website ổn lại
 ▪️ Excel error: Script tự động fallback sang CSV
 
 📞 SUPPORT:
@@ -1,12 +1,92 @@
-from flask import Flask, request, jsonify, render_template_string
-import pandas as pd
+"""
+API tra cứu địa chỉ sau sáp nhập
 
-# Đọc dữ liệu từ file Excel
-EXCEL_FILE = 'sap_nhap_backup.xlsx'
-df = pd.read_excel(EXCEL_FILE)
+Chạy thử (dev server, tắt debug):
+    python api_sap_nhap.py
+
+Chạy production (nhiều worker, dữ liệu nạp một lần trong master rồi fork):
+    gunicorn -c gunicorn.conf.py
+
+Khởi động nhanh từ snapshot dựng sẵn (xem sap_nhap_snapshot.py):
+    SAP_NHAP_DATA=sap_nhap.snapshot python api_sap_nhap.py
+
+File dữ liệu đổi (crawl xong, dựng snapshot mới) thì tự nạp lại ở thread nền,
+chu kỳ kiểm tra SAP_NHAP_RELOAD_INTERVAL giây (0 để tắt). Phiên bản dữ liệu
+đang dùng trả về ở header X-Sap-Nhap-Version và route /phien-ban.
+
+Các route GET trả ETag theo phiên bản dữ liệu và Cache-Control (SAP_NHAP_CACHE_MAX_AGE giây),
+trả 304 khi If-None-Match khớp, nén gzip/brotli (xem sap_nhap_http.py).
+"""
+
+import hashlib
+import io
+import os
+from datetime import datetime
+
+from flask import Blueprint, Flask, Response, current_app, g, request, jsonify, render_template_string, stream_with_context
+
+from sap_nhap_batch import BatchConverter, CHUNK_SIZE, read_input_chunks, records_frame, to_csv, to_jsonl
+from sap_nhap_export import load_dataset
+from sap_nhap_http import MIN_COMPRESS_SIZE, ResponseCache, choose_encoding, compress, request_etag
+from sap_nhap_index import LookupIndex
+from sap_nhap_reload import DatasetWatcher
+from sap_nhap_resolver import AddressResolver
+
+# Đọc dữ liệu từ file Excel (hoặc Parquet/Feather/snapshot), đổi file bằng biến môi trường SAP_NHAP_DATA
+EXCEL_FILE = os.environ.get('SAP_NHAP_DATA', 'sap_nhap_backup.xlsx')
+
+# Chu kỳ (giây) kiểm tra file dữ liệu để nạp lại, 0 để tắt
+RELOAD_INTERVAL = float(os.environ.get('SAP_NHAP_RELOAD_INTERVAL', '10'))
+
+# Thời gian (giây) trình duyệt / CDN dùng lại response mà không hỏi lại server
+CACHE_MAX_AGE = int(os.environ.get('SAP_NHAP_CACHE_MAX_AGE', '300'))
+
+# Các route GET có kết quả chỉ phụ thuộc URL và phiên bản dữ liệu
+CACHEABLE_ENDPOINTS = {'sap_nhap.index', 'sap_nhap.get_xa', 'sap_nhap.tra_cuu', 'sap_nhap.chuyen_doi'}
+
+
+def file_version(path):
+    """Phiên bản dữ liệu: 12 ký tự đầu sha1 nội dung file"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()[:12]
+
+
+class ApiData:
+    """Dữ liệu và các index dựng sẵn, chỉ đọc, dùng chung cho mọi request"""
+
+    def __init__(self, df, path=None, lookup_index=None, resolver=None, batch_converter=None, meta=None):
+        self.path = path
+        self.df = df
+        self.meta = meta or {}
+        self.version = self.meta.get('version') or (file_version(path) if path else 'dev')
+        self.loaded_at = datetime.now().isoformat(timespec='seconds')
+        self.lookup_index = lookup_index if lookup_index is not None else LookupIndex(df)
+        self.resolver = resolver if resolver is not None else AddressResolver(self.lookup_index.records)
+        self.batch_converter = batch_converter if batch_converter is not None else BatchConverter(df)
+        # Danh sách tỉnh/thành phố
+        self.provinces = self.lookup_index.provinces
+        # Body response dựng sẵn của phiên bản dữ liệu này
+        self.responses = ResponseCache()
+
+
+def load_data(path=None):
+    """Đọc file dữ liệu và dựng index (gọi một lần khi khởi động); file .snapshot thì nạp thẳng
+
+    Chưa cài pyarrow thì thay snapshot bằng file dữ liệu gốc ghi trong header của nó
+    """
+    path = path or EXCEL_FILE
+    if path.endswith('.snapshot'):
+        from sap_nhap_snapshot import pa, read_meta, read_snapshot
+        if pa is not None:
+            return ApiData(path=path, **read_snapshot(path))
+        source = read_meta(path)['source']
+        print(f"⚠️  Chưa cài pyarrow, không đọc được {path}; dùng file dữ liệu gốc {source}")
+        path = source
+    return ApiData(load_dataset(path), path)
 
-# Lấy danh sách tỉnh/thành phố
-provinces = df[['ma_tinh', 'ten_tinh']].drop_duplicates().sort_values('ten_tinh').to_dict(orient='records')
 
 # Trang HTML giao diện
 HTML_FORM = '''
@@ -53,7 +133,7 @@ HTML_FORM = '''
             xaSelect.innerHTML = '<option value="">-- Đang tải xã/phường --</option>';
             if(ma_tinh) {
                 fetch('/get-xa?ma_tinh=' + ma_tinh)
-                .then(res => res.json())
+                .then(res => res.ok ? res.json() : [])
                 .then(data => {
                     xaSelect.innerHTML = '<option value="">-- Chọn xã/phường --</option>';
                     data.forEach(function(xa) {
@@ -89,50 +169,211 @@ HTML_FORM = '''
 </html>
 '''
 
-app = Flask(__name__)
+bp = Blueprint('sap_nhap', __name__)
+
+
+def get_data():
+    """ApiData của app hiện tại, cố định trong suốt một request kể cả khi dữ liệu được nạp lại giữa chừng"""
+    if 'sap_nhap' not in g:
+        g.sap_nhap = current_app.extensions['sap_nhap']
+    return g.sap_nhap
+
+
+def swap_data(app, data):
+    """Đổi sang dữ liệu mới (đã dựng xong): một phép gán, request mới dùng bản mới"""
+    app.extensions['sap_nhap'] = data
+
+
+def create_app(data_file=None, data=None):
+    """App factory: nạp dữ liệu (hoặc dùng ApiData có sẵn) và đăng ký các route
+
+    Với gunicorn --preload (xem gunicorn.conf.py) hàm này chạy một lần trong master,
+    các worker fork ra dùng chung bộ nhớ dữ liệu (copy-on-write) thay vì mỗi worker đọc lại file
+    """
+    app = Flask(__name__)
+    app.extensions['sap_nhap'] = data if data is not None else load_data(data_file)
+    app.register_blueprint(bp)
+    return app
+
+
+def start_watcher(app, interval=None):
+    """Bật nạp lại dữ liệu khi file thay đổi; gọi trong từng process phục vụ request (thread không qua được fork)"""
+    interval = RELOAD_INTERVAL if interval is None else interval
+    path = app.extensions['sap_nhap'].path
+    if not interval or not path:
+        return None
+    watcher = DatasetWatcher(path, load_data, lambda data: swap_data(app, data), interval)
+    app.extensions['sap_nhap_watcher'] = watcher
+    return watcher.start()
+
 
-@app.route('/')
+def _cacheable():
+    return request.method == 'GET' and request.endpoint in CACHEABLE_ENDPOINTS
+
+
+def cached_response(key, build, mimetype):
+    """Response từ body dựng sẵn theo khóa (đã nén sẵn theo Accept-Encoding), build() chỉ chạy lần đầu"""
+    cached = get_data().responses.get(key, build, mimetype)
+    body, encoding = cached.encoded(choose_encoding(request.headers.get('Accept-Encoding')))
+    response = Response(body, mimetype=cached.mimetype)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+@bp.before_request
+def check_not_modified():
+    """If-None-Match khớp ETag của phiên bản dữ liệu hiện tại thì trả 304 ngay, không tra cứu"""
+    if _cacheable() and request.if_none_match.contains_weak(request_etag(get_data().version, request.full_path)):
+        return Response(status=304)
+
+
+@bp.after_request
+def finalize_response(response):
+    """Header phiên bản, ETag / Cache-Control và nén body"""
+    data = get_data()
+    response.headers['X-Sap-Nhap-Version'] = data.version
+    response.vary.add('Accept-Encoding')
+
+    # Chỉ response 2xx (và 304 của chúng) có ETag: kết quả "không tìm thấy" không bao giờ thành 304
+    if _cacheable() and (200 <= response.status_code < 300 or response.status_code == 304):
+        response.set_etag(request_etag(data.version, request.full_path), weak=True)
+        response.headers['Cache-Control'] = f'public, max-age={CACHE_MAX_AGE}'
+
+    # Body stream (chuyển đổi hàng loạt) và body đã nén sẵn thì giữ nguyên
+    if (response.is_streamed or response.direct_passthrough or 'Content-Encoding' in response.headers
+            or response.content_length is None or response.content_length < MIN_COMPRESS_SIZE):
+        return response
+    encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+    if encoding:
+        response.set_data(compress(response.get_data(), encoding))
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+@bp.route('/')
 def index():
-    return render_template_string(HTML_FORM, provinces=provinces)
+    provinces = get_data().provinces
+    return cached_response('/', lambda: render_template_string(HTML_FORM, provinces=provinces), 'text/html')
+
+
+@bp.route('/phien-ban')
+def phien_ban():
+    """Phiên bản dữ liệu đang phục vụ"""
+    data = get_data()
+    return jsonify({
+        'version': data.version,
+        'source': data.path,
+        'loaded_at': data.loaded_at,
+        'created_at': data.meta.get('created_at'),
+        'rows': len(data.df),
+    })
 
-@app.route('/get-xa')
+
+@bp.route('/get-xa')
 def get_xa():
     ma_tinh = request.args.get('ma_tinh')
-    xa_list = df[df['ma_tinh'].astype(str) == str(ma_tinh)][['ma_xa', 'ten_xa']].drop_duplicates().sort_values('ten_xa')
-    return jsonify(xa_list.to_dict(orient='records'))
+    if not ma_tinh:
+        return jsonify({'result': None, 'message': 'Thiếu tham số ma_tinh.'}), 400
+    xa_list = get_data().lookup_index.xa_list(ma_tinh)
+    # Mã tỉnh lạ: 404 như các endpoint tra cứu khác (không có ETag, không làm phình cache)
+    if not xa_list:
+        return jsonify({'result': None, 'message': 'Không tìm thấy tỉnh/thành phố.'}), 404
+    return cached_response(('get-xa', str(ma_tinh)), lambda: jsonify(xa_list).get_data(), 'application/json')
+
 
-@app.route('/tra-cuu', methods=['GET'])
+@bp.route('/tra-cuu', methods=['GET'])
 def tra_cuu():
     """
     Tra cứu địa chỉ cũ ra địa chỉ sau sáp nhập
     Truyền vào: ma_tinh, ma_xa hoặc ten_tinh, ten_xa hoặc truoc_sap_nhap
+    Tên không phân biệt dấu ("ha noi" khớp "Hà Nội"); khop=dau_tu để tìm theo đầu từ
     """
     ma_tinh = request.args.get('ma_tinh')
     ma_xa = request.args.get('ma_xa')
     ten_tinh = request.args.get('ten_tinh')
     ten_xa = request.args.get('ten_xa')
     truoc = request.args.get('truoc_sap_nhap')
+    prefix = request.args.get('khop') == 'dau_tu'
     
-    # Lọc theo các trường truyền vào
-    query = df.copy()
-    if ma_tinh:
-        query = query[query['ma_tinh'].astype(str) == str(ma_tinh)]
-    if ma_xa:
-        query = query[query['ma_xa'].astype(str) == str(ma_xa)]
-    if ten_tinh:
-        query = query[query['ten_tinh'].str.lower().str.contains(ten_tinh.lower())]
-    if ten_xa:
-        query = query[query['ten_xa'].str.lower().str.contains(ten_xa.lower())]
-    if truoc:
-        query = query[query['truoc_sap_nhap'].str.lower().str.contains(truoc.lower())]
+    # Tra theo mã qua index O(1), tên qua index trigram đã bỏ dấu
+    result = get_data().lookup_index.lookup(ma_tinh, ma_xa, ten_tinh, ten_xa, truoc, prefix=prefix)
     
     # Trả về kết quả
-    if query.empty:
+    if not result:
         return jsonify({'result': None, 'message': 'Không tìm thấy địa chỉ phù hợp.'}), 404
     
-    # Chỉ trả về các trường quan trọng
-    result = query[['ma_tinh', 'ten_tinh', 'ma_xa', 'ten_xa', 'truoc_sap_nhap', 'sau_sap_nhap']].to_dict(orient='records')
     return jsonify({'result': result, 'count': len(result)})
 
+
+@bp.route('/chuyen-doi', methods=['GET'])
+def chuyen_doi():
+    """
+    Chuyển địa chỉ cũ dạng chữ tự do (có thể viết tắt, gõ sai, không dấu) sang địa chỉ sau sáp nhập
+    Truyền vào: dia_chi, k (số kết quả, mặc định 5)
+    """
+    dia_chi = request.args.get('dia_chi', '').strip()
+    if not dia_chi:
+        return jsonify({'result': None, 'message': 'Thiếu tham số dia_chi.'}), 400
+    
+    try:
+        k = min(max(int(request.args.get('k', 5)), 1), 50)
+    except ValueError:
+        k = 5
+    
+    resolver = get_data().resolver
+    _, province_key, _ = resolver.parse(dia_chi)
+    result = resolver.resolve(dia_chi, k=k)
+    if not result:
+        return jsonify({'result': None, 'message': 'Không tìm thấy địa chỉ phù hợp.'}), 404
+    
+    return jsonify({
+        'query': dia_chi,
+        'tinh': resolver.province_name(province_key),
+        'result': result,
+        'count': len(result)
+    })
+
+
+@bp.route('/chuyen-doi-hang-loat', methods=['POST'])
+def chuyen_doi_hang_loat():
+    """
+    Chuyển đổi hàng loạt: body là mảng JSON hoặc upload file (field 'file': .csv/.xlsx/.json/.jsonl)
+    Mỗi dòng có ma_tinh, ma_xa hoặc ten_tinh, ten_xa; kết quả stream về dạng NDJSON
+    (mặc định) hoặc CSV (dinh_dang=csv), thêm cột 'khop'
+    """
+    upload = request.files.get('file')
+    try:
+        if upload is not None:
+            # Đọc file upload vào bộ nhớ: request đóng file trước khi response stream xong
+            chunks = read_input_chunks(io.BytesIO(upload.read()), filename=upload.filename or '')
+        else:
+            rows = request.get_json(silent=True)
+            if not isinstance(rows, list):
+                return jsonify({'result': None, 'message': 'Cần mảng JSON hoặc file upload.'}), 400
+            frame = records_frame(rows)
+            chunks = (frame.iloc[start:start + CHUNK_SIZE] for start in range(0, len(frame), CHUNK_SIZE))
+        first = next(chunks, None)
+    except ValueError as e:
+        return jsonify({'result': None, 'message': str(e)}), 400
+    
+    as_csv = request.args.get('dinh_dang') == 'csv'
+    batch_converter = get_data().batch_converter
+    
+    def generate():
+        if first is None:
+            return
+        yield to_csv(batch_converter.convert(first), header=True) if as_csv else to_jsonl(batch_converter.convert(first))
+        for chunk in chunks:
+            result = batch_converter.convert(chunk)
+            yield to_csv(result, header=False) if as_csv else to_jsonl(result)
+    
+    mimetype = 'text/csv' if as_csv else 'application/x-ndjson'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # Debug chỉ bật khi đặt FLASK_DEBUG=1, không bao giờ bật mặc định
+    app = create_app()
+    start_watcher(app)
+    app.run(host='0.0.0.0', port=5000, debug=os.environ.get('FLASK_DEBUG') == '1')
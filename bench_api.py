@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark API tra cứu: lọc DataFrame mỗi request (cách cũ) và index dựng sẵn
+"""
+
+import argparse
+import glob
+import os
+import random
+import time
+
+from flask import Flask, request, jsonify
+
+
+def legacy_app(df):
+    """Các route /get-xa và /tra-cuu cũ (lọc cả DataFrame mỗi request), giữ lại để so sánh"""
+    app = Flask('legacy')
+
+    @app.route('/get-xa')
+    def get_xa():
+        ma_tinh = request.args.get('ma_tinh')
+        xa_list = df[df['ma_tinh'].astype(str) == str(ma_tinh)][['ma_xa', 'ten_xa']].drop_duplicates().sort_values('ten_xa')
+        return jsonify(xa_list.to_dict(orient='records'))
+
+    @app.route('/tra-cuu')
+    def tra_cuu():
+        ma_tinh = request.args.get('ma_tinh')
+        ma_xa = request.args.get('ma_xa')
+        ten_xa = request.args.get('ten_xa')
+
+        query = df.copy()
+        if ma_tinh:
+            query = query[query['ma_tinh'].astype(str) == str(ma_tinh)]
+        if ma_xa:
+            query = query[query['ma_xa'].astype(str) == str(ma_xa)]
+        if ten_xa:
+            query = query[query['ten_xa'].str.lower().str.contains(ten_xa.lower())]
+
+        if query.empty:
+            return jsonify({'result': None, 'message': 'Không tìm thấy địa chỉ phù hợp.'}), 404
+
+        result = query[['ma_tinh', 'ten_tinh', 'ma_xa', 'ten_xa', 'truoc_sap_nhap', 'sau_sap_nhap']].to_dict(orient='records')
+        return jsonify({'result': result, 'count': len(result)})
+
+    return app
+
+
+def make_urls(df, count):
+    """Sinh các URL tra cứu ngẫu nhiên (cố định seed) từ dữ liệu thật"""
+    rng = random.Random(42)
+    rows = df[['ma_tinh', 'ma_xa', 'ten_xa']].to_dict(orient='records')
+
+    urls = []
+    for i in range(count):
+        row = rng.choice(rows)
+        kind = i % 3
+        if kind == 0:
+            urls.append(f"/tra-cuu?ma_tinh={row['ma_tinh']}&ma_xa={row['ma_xa']}")
+        elif kind == 1:
+            urls.append(f"/get-xa?ma_tinh={row['ma_tinh']}")
+        else:
+            ten = str(row['ten_xa']).split('(')[0].strip()
+            urls.append(f"/tra-cuu?ma_tinh={row['ma_tinh']}&ten_xa={ten}")
+    return urls
+
+
+def covers(old, new):
+    """Kết quả mới giống kết quả cũ, hoặc chứa thêm các bản ghi khớp khi bỏ dấu"""
+    if old == new:
+        return True
+    old_result = (old[1] or {}).get('result') or []
+    new_result = (new[1] or {}).get('result') or []
+    return all(record in new_result for record in old_result)
+
+
+def run(label, app, urls):
+    client = app.test_client()
+    bodies = []
+
+    start = time.perf_counter()
+    for url in urls:
+        response = client.get(url)
+        bodies.append((response.status_code, response.get_json()))
+    elapsed = time.perf_counter() - start
+
+    print(f"  {label:16s}: {len(urls) / elapsed:8.0f} req/s ({elapsed * 1000 / len(urls):.2f} ms/request)")
+    return bodies, elapsed
+
+
+def bench_name_search(index, repeat=200):
+    """Thời gian tra theo tên (không dấu) trên toàn bộ dữ liệu, không lọc theo mã"""
+    queries = [
+        {'ten_tinh': 'ha noi'},
+        {'ten_xa': 'phuong 1'},
+        {'ten_xa': 'binh thanh'},
+        {'truoc': 'quan ba dinh'},
+        {'ten_xa': 'hong', 'prefix': True},
+    ]
+
+    print("\n  Tra theo tên bằng index trigram:")
+    for query in queries:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            result = index.lookup(**query)
+        elapsed = (time.perf_counter() - start) / repeat * 1000
+        print(f"    {str(query):40s}: {elapsed:6.3f} ms, {len(result)} kết quả")
+
+
+def bench_resolver(resolver, repeat=50):
+    """Thời gian chuyển đổi địa chỉ cũ dạng chữ tự do (viết tắt, gõ sai, không dấu)"""
+    addresses = [
+        'P. Phúc Xá, Q. Ba Đình, TP Hà Nội',
+        'P.Phuc Sa, Q.Ba Dinh, HN',
+        'P1 Q10 TP HCM',
+        'Xa Chau Hoa, H. Giong Trom, Ben Tre',
+        'ia bang chu prong',
+    ]
+
+    print("\n  Chuyển đổi địa chỉ (/chuyen-doi):")
+    for address in addresses:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            result = resolver.resolve(address)
+        elapsed = (time.perf_counter() - start) / repeat * 1000
+        best = f"{result[0]['ten_xa']}, {result[0]['ten_tinh']} ({result[0]['score']})" if result else '-'
+        print(f"    {address:40s}: {elapsed:6.3f} ms -> {best}")
+
+
+def main():
+    files = sorted(glob.glob('sap_nhap_simple_*.xlsx'))
+    parser = argparse.ArgumentParser(description="Benchmark API tra cứu")
+    parser.add_argument('--data', default=os.environ.get('SAP_NHAP_DATA') or (files[-1] if files else 'sap_nhap_backup.xlsx'),
+                        help="File dữ liệu (.xlsx/.parquet/.snapshot)")
+    parser.add_argument('--requests', type=int, default=3000, help="Số request (mặc định 3000)")
+    args = parser.parse_args()
+
+    import api_sap_nhap
+
+    app = api_sap_nhap.create_app(args.data)
+    data = app.extensions['sap_nhap']
+    df = data.df
+    print(f"=== BENCHMARK API ({len(df)} bản ghi, {args.requests} request) ===")
+    urls = make_urls(df, args.requests)
+
+    old_bodies, old_time = run('lọc DataFrame', legacy_app(df), urls)
+    new_bodies, new_time = run('index dựng sẵn', app, urls)
+
+    # Tra theo tên giờ không phân biệt dấu nên có thể trả thêm bản ghi
+    same = sum(old == new for old, new in zip(old_bodies, new_bodies))
+    ok = all(covers(old, new) for old, new in zip(old_bodies, new_bodies))
+    print(f"\n  {'✅' if ok else '❌'} {same}/{len(urls)} kết quả giống hệt, "
+          f"{'còn lại chỉ thêm bản ghi khớp khi bỏ dấu' if ok else 'có kết quả bị THIẾU'}")
+    print(f"  ⚡ Nhanh hơn {old_time / new_time:.1f} lần")
+
+    bench_name_search(data.lookup_index)
+    bench_resolver(data.resolver)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark crawler offline: crawl_all_autodiscovery chạy với server replay cục bộ (sap_nhap_replay.py)
+
+Báo cáo pages/s, latency mỗi trang (p50/p99), CPU mỗi trang và RSS đỉnh,
+so sánh với baseline đã lưu để kiểm tra mỗi thay đổi về hiệu năng.
+
+    python bench_crawl.py --wards 10 --save-baseline          # lưu baseline
+    python bench_crawl.py --wards 10                          # so với baseline
+    python bench_crawl.py --mode async --concurrency 16 --rate-429 0.02 --timeout-rate 0.005
+"""
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+import urllib.request
+
+from sap_nhap_ratelimit import AdaptiveRateLimiter
+from sap_nhap_replay import SEARCH_PATH, serve
+from sap_nhap_simple import SapNhapCrawlerSimple
+
+BASELINE_FILE = 'bench_crawl_baseline.json'
+
+# Chỉ số -> True nếu càng cao càng tốt
+METRICS = {
+    'pages_per_sec': True,
+    'p50_ms': False,
+    'p99_ms': False,
+    'cpu_ms_per_page': False,
+    'peak_rss_mb': False,
+}
+
+# Các tham số quyết định kịch bản; baseline chỉ so được khi giống nhau
+SCENARIO_KEYS = ['mode', 'provinces', 'wards', 'latency_ms', 'jitter_ms', 'rate_429', 'timeout_rate',
+                 'outage_after', 'outage_seconds', 'timeout', 'rate', 'concurrency', 'parse_workers', 'parser', 'seed']
+
+
+def start_server(args):
+    """Chạy server replay trong process riêng để CPU / RSS đo được chỉ là của crawler"""
+    context = multiprocessing.get_context('spawn')
+    ready = context.Queue()
+    process = context.Process(target=serve, daemon=True, kwargs={
+        'ready': ready,
+        'provinces': args.provinces,
+        'wards': args.wards,
+        'seed': args.seed,
+        'latency': args.latency_ms / 1000,
+        'jitter': args.jitter_ms / 1000,
+        'rate_429': args.rate_429,
+        'timeout_rate': args.timeout_rate,
+        'hang': args.timeout + 1,
+        'outage_after': args.outage_after,
+        'outage_duration': args.outage_seconds,
+    })
+    process.start()
+    port = ready.get(timeout=60)
+    return process, f'http://127.0.0.1:{port}'
+
+
+def make_crawler(base_url, args):
+    """Crawler trỏ vào server replay, không dùng cache trang để lần nào cũng tải thật"""
+    limiter = AdaptiveRateLimiter(rate=args.rate, max_rate=args.rate, backoff=1.0)
+    crawler = SapNhapCrawlerSimple(rate_limiter=limiter, use_cache=False, parser_backend=args.parser)
+    crawler.base_url = base_url
+    crawler.search_url = base_url + SEARCH_PATH
+    crawler.request_timeout = args.timeout
+    return crawler
+
+
+def record_latencies(crawler):
+    """Bọc get_page_content / async_get_page_content để ghi thời gian lấy mỗi trang (kể cả retry)"""
+    latencies = []
+    get_page = crawler.get_page_content
+    async_get_page = crawler.async_get_page_content
+
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return get_page(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    async def timed_async(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await async_get_page(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    crawler.get_page_content = timed
+    crawler.async_get_page_content = timed_async
+    return latencies
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def cpu_seconds():
+    """CPU (user + sys) của process này và các process con đã kết thúc (parse pool)"""
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def run_benchmark(args):
+    process, base_url = start_server(args)
+    try:
+        crawler = make_crawler(base_url, args)
+        latencies = record_latencies(crawler)
+
+        cpu_start = cpu_seconds()
+        start = time.perf_counter()
+        # Bỏ output từng xã/phường của crawler (vẫn tính chi phí format chuỗi)
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            if args.mode == 'async':
+                crawler.crawl_all_autodiscovery_async(concurrency=args.concurrency, parse_workers=args.parse_workers)
+            else:
+                crawler.crawl_all_autodiscovery()
+        elapsed = time.perf_counter() - start
+        cpu = cpu_seconds() - cpu_start
+        # Đo trước khi dừng server: lúc này process con đã kết thúc chỉ có parse pool
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB -> MB trên Linux
+        children_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+
+        with urllib.request.urlopen(f'{base_url}/__stats') as response:
+            server = json.load(response)
+    finally:
+        process.terminate()
+        process.join()
+
+    pages = len(latencies)
+
+    return {
+        'config': {key: getattr(args, key) for key in SCENARIO_KEYS},
+        'pages': pages,
+        'records': crawler.result_count,
+        'errors': len(crawler.error_log),
+        'circuit_downtime_s': round(crawler.circuit_downtime(), 1),
+        'elapsed_s': round(elapsed, 3),
+        'pages_per_sec': round(pages / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'cpu_ms_per_page': round(cpu / pages * 1000, 3) if pages else 0.0,
+        'peak_rss_mb': round(peak_rss, 1),
+        'children_peak_rss_mb': round(children_rss, 1),
+        'stages': {
+            stage: {'count': count, 'p50_ms': round(p50 * 1000, 2), 'p99_ms': round(p99 * 1000, 2), 'total_s': round(total, 3)}
+            for stage, count, p50, p99, total in crawler.metrics.summary_rows()
+        },
+        'server': server,
+    }
+
+
+def print_result(result):
+    config = result['config']
+    server = result['server']
+    print(f"=== BENCHMARK CRAWLER ({config['mode']}, {config['provinces']} tỉnh x {config['wards']} xã/phường, "
+          f"latency {config['latency_ms']}±{config['jitter_ms']} ms, 429 {config['rate_429']:.1%}, "
+          f"timeout {config['timeout_rate']:.1%}) ===")
+    print(f"  📄 {result['pages']} trang, {result['records']} bản ghi, {result['errors']} lỗi "
+          f"trong {result['elapsed_s']:.1f}s")
+    print(f"  🌐 Server: {server['requests']} request, {server['rate_limited']} lần 429, {server['hung']} lần treo, "
+          f"{server['outage']} lần 503 do sự cố")
+    print(f"  ⚡ {result['pages_per_sec']:.1f} trang/s")
+    print(f"  ⏱️  Latency mỗi trang: p50 {result['p50_ms']:.1f} ms, p99 {result['p99_ms']:.1f} ms")
+    print(f"  🧮 CPU: {result['cpu_ms_per_page']:.2f} ms/trang")
+    print(f"  💾 RSS đỉnh: {result['peak_rss_mb']:.0f} MB (parse pool: {result['children_peak_rss_mb']:.0f} MB)")
+    print("  ⏱️  Từng bước (ước lượng từ histogram):")
+    for stage, row in result['stages'].items():
+        print(f"     {stage:12s}: {row['count']:6d} lần, p50 {row['p50_ms']:8.2f} ms, p99 {row['p99_ms']:8.2f} ms, "
+              f"tổng {row['total_s']:7.2f}s")
+
+
+def compare(result, baseline, tolerance):
+    """In chênh lệch so với baseline, trả về False nếu có chỉ số tệ hơn quá tolerance"""
+    if baseline['config'] != result['config']:
+        print("\n⚠️  Baseline chạy với kịch bản khác, bỏ qua so sánh")
+        return True
+
+    print("\n📏 So với baseline:")
+    ok = True
+    for metric, higher_is_better in METRICS.items():
+        old = baseline[metric]
+        new = result[metric]
+        change = (new - old) / old if old else 0.0
+        worse = -change if higher_is_better else change
+        mark = '✅'
+        if worse > tolerance:
+            mark = '❌'
+            ok = False
+        print(f"  {mark} {metric:16s}: {old:10.2f} -> {new:10.2f} ({change:+.1%})")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark crawler offline với server replay cục bộ")
+    parser.add_argument('--mode', choices=['sync', 'async'], default='sync',
+                        help="crawl_all_autodiscovery (sync) hoặc crawl_all_autodiscovery_async")
+    parser.add_argument('--provinces', type=int, default=63, help="Số tỉnh (mặc định 63)")
+    parser.add_argument('--wards', type=int, default=10, help="Số xã/phường mỗi tỉnh (mặc định 10)")
+    parser.add_argument('--latency-ms', type=float, default=20, help="Độ trễ trung bình của server (ms)")
+    parser.add_argument('--jitter-ms', type=float, default=5, help="Độ lệch chuẩn độ trễ (ms)")
+    parser.add_argument('--rate-429', type=float, default=0.0, help="Tỷ lệ response 429 (0-1)")
+    parser.add_argument('--timeout-rate', type=float, default=0.0, help="Tỷ lệ request bị treo tới timeout (0-1)")
+    parser.add_argument('--outage-after', type=int, help="Giả lập sự cố sau N request: server trả 503 mọi request")
+    parser.add_argument('--outage-seconds', type=float, default=30.0, help="Thời gian sự cố (giây)")
+    parser.add_argument('--timeout', type=float, default=2.0, help="Timeout request của crawler (giây)")
+    parser.add_argument('--rate', type=float, default=1000.0,
+                        help="Tốc độ tối đa của rate limiter (req/s); 0.8 để giống chạy thật")
+    parser.add_argument('--concurrency', type=int, default=8, help="Số request song song (mode async)")
+    parser.add_argument('--parse-workers', type=int, default=0, help="Số process parse (mode async, 0 = trong event loop)")
+    parser.add_argument('--parser', choices=['lxml', 'html.parser'], default='lxml')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=BASELINE_FILE, help=f"File baseline (mặc định {BASELINE_FILE})")
+    parser.add_argument('--save-baseline', action='store_true', help="Lưu kết quả lần này làm baseline")
+    parser.add_argument('--tolerance', type=float, default=0.10, help="Mức tệ hơn cho phép so với baseline (mặc định 10%%)")
+    parser.add_argument('--output', help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    result = run_benchmark(args)
+    print_result(result)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Đã lưu baseline: {args.baseline}")
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        return 0 if compare(result, baseline, args.tolerance) else 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
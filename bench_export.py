@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark bước làm sạch dữ liệu trước khi xuất Excel: cách cũ (apply từng ô) và clean_dataframe
+"""
+
+import argparse
+import json
+import re
+import time
+
+import pandas as pd
+
+from sap_nhap_export import clean_dataframe
+
+
+def legacy_clean(df):
+    """Cách làm sạch cũ của save_to_excel (giữ lại để so sánh)"""
+    for col in df.columns:
+        if df[col].dtype == 'object':
+            df[col] = df[col].astype(str).apply(lambda x: re.sub(r'[^\x20-\x7E\u00A0-\uFFFF]', '', str(x)))
+            df[col] = df[col].apply(lambda x: x[:32767] if len(str(x)) > 32767 else x)
+            df[col] = df[col].fillna('')
+    return df
+
+
+def make_records(n):
+    """Sinh n bản ghi giống output crawler, có vài ô chứa ký tự điều khiển / quá dài"""
+    records = []
+    for i in range(n):
+        ma_tinh = f"{i % 63 + 1:02d}"
+        ma_xa = f"{i:05d}"
+        truoc = f"Phường {i} (Quận Ba Đình cũ), Thành phố Hà Nội"
+        sau = f"Phường Hồng Hà {i % 500}, Thành phố Hà Nội"
+        chi_tiet = [{'truoc': truoc, 'sau': sau}, {'truoc': 'Thành phố Hà Nội', 'sau': 'Thành phố Hà Nội'}]
+
+        if i % 1000 == 0:
+            truoc += '\x07\x1f'  # Ký tự điều khiển Excel không chấp nhận
+        if i % 5000 == 0:
+            sau += 'x' * 40000  # Vượt giới hạn 32767 ký tự/ô
+
+        records.append({
+            'ma_tinh': ma_tinh,
+            'ten_tinh': 'Hà Nội',
+            'ma_xa': ma_xa,
+            'ten_xa': f"Phường {i}",
+            'cap_hanh_chinh': 'Xã/Phường',
+            'url': f"https://thuvienphapluat.vn/ma-so-thue/tra-cuu-thong-tin-sap-nhap-tinh?MaTinh={ma_tinh}&MaXa={ma_xa}",
+            'truoc_sap_nhap': truoc,
+            'sau_sap_nhap': sau,
+            'chi_tiet_json': json.dumps(chi_tiet, ensure_ascii=False),
+            'so_luong_thay_doi': len(chi_tiet),
+            'co_thong_tin': True
+        })
+    return records
+
+
+def measure(label, func, records):
+    df = pd.DataFrame(records)
+    start = time.perf_counter()
+    df = func(df)
+    elapsed = time.perf_counter() - start
+    print(f"  {label:16s}: {elapsed:8.3f} s")
+    return df, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark làm sạch dữ liệu xuất Excel")
+    parser.add_argument('--rows', type=int, default=100000, help="Số bản ghi (mặc định 100000)")
+    args = parser.parse_args()
+
+    print(f"=== BENCHMARK LÀM SẠCH DỮ LIỆU ({args.rows} bản ghi) ===")
+    records = make_records(args.rows)
+
+    old_df, old_time = measure('apply từng ô', legacy_clean, records)
+    new_df, new_time = measure('clean_dataframe', clean_dataframe, records)
+
+    # Các cột chuỗi phải cho kết quả giống hệt; cột số/bool giữ nguyên kiểu
+    text_columns = [col for col in new_df.columns if new_df[col].dtype == object]
+    same = old_df[text_columns].equals(new_df[text_columns])
+    print(f"\n  {'✅ Kết quả giống nhau' if same else '❌ Kết quả KHÁC nhau'} trên các cột chuỗi")
+    print(f"  Kiểu cột sau khi làm sạch: {dict(new_df.dtypes.astype(str))}")
+    print(f"  ⚡ Nhanh hơn {old_time / new_time:.1f} lần")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script debug kiểm tra output NDJSON của chuyển đổi hàng loạt: mỗi dòng phải là một object JSON
+(không có dòng trống giữa các khối), cả ở API /chuyen-doi-hang-loat lẫn file .jsonl của CLI
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+import pandas as pd
+
+import api_sap_nhap
+from sap_nhap_batch import BatchConverter, convert_file
+
+SAMPLE = pd.DataFrame([
+    {'ma_tinh': '01', 'ten_tinh': 'Hà Nội', 'ma_xa': '00004', 'ten_xa': 'Phường Trúc Bạch',
+     'truoc_sap_nhap': 'Phường Trúc Bạch (Quận Ba Đình cũ)', 'sau_sap_nhap': 'Phường Ba Đình'},
+    {'ma_tinh': '01', 'ten_tinh': 'Hà Nội', 'ma_xa': '00006', 'ten_xa': 'Phường Vĩnh Phúc',
+     'truoc_sap_nhap': 'Phường Vĩnh Phúc (Quận Ba Đình cũ)', 'sau_sap_nhap': 'Phường Ngọc Hà'},
+])
+
+
+def check_lines(name, text, expected_rows):
+    """Mọi dòng (kể cả dòng cuối) parse được thành object JSON và đủ số dòng"""
+    lines = text.split('\n')
+    ok = lines[-1] == ''  # Kết thúc bằng '\n'
+    lines = lines[:-1]
+    for number, line in enumerate(lines, 1):
+        try:
+            ok &= isinstance(json.loads(line), dict)
+        except json.JSONDecodeError:
+            print(f"  Dòng {number} không phải JSON: {line!r}")
+            ok = False
+    ok &= len(lines) == expected_rows
+    print(f"{'✅' if ok else '❌'} {name}: {len(lines)} dòng")
+    return ok
+
+
+def main():
+    # Khối nhỏ để response API gồm nhiều khối
+    api_sap_nhap.CHUNK_SIZE = 2
+    rows = [{'ma_tinh': '01', 'ma_xa': ma_xa} for ma_xa in ['00004', '00006', '99999', '00004', '00006']]
+
+    app = api_sap_nhap.create_app(data=api_sap_nhap.ApiData(SAMPLE))
+    response = app.test_client().post('/chuyen-doi-hang-loat', json=rows)
+    ok = check_lines('API /chuyen-doi-hang-loat', response.get_data(as_text=True), len(rows))
+
+    folder = tempfile.mkdtemp()
+    input_path = os.path.join(folder, 'input.jsonl')
+    output_path = os.path.join(folder, 'output.jsonl')
+    with open(input_path, 'w', encoding='utf-8') as f:
+        f.writelines(json.dumps(row) + '\n' for row in rows)
+
+    convert_file(BatchConverter(SAMPLE), input_path, output_path)
+    with open(output_path, encoding='utf-8') as f:
+        ok &= check_lines('CLI .jsonl', f.read(), len(rows))
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script debug kiểm tra resume journal sau khi crash để lại dòng cuối ghi dở,
+và việc chạy mới không --resume không làm mất journal cũ
+"""
+
+import os
+import sys
+import tempfile
+
+from sap_nhap_journal import CrawlJournal
+
+
+def resume_and_append(content, new_ma_xa='3'):
+    """Ghi journal có sẵn `content`, resume, ghi thêm một bản ghi rồi load lại"""
+    path = os.path.join(tempfile.mkdtemp(), 'journal.jsonl')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+
+    journal = CrawlJournal(path, fsync=False)
+    journal.open(resume=True)
+    journal.append({'ma_tinh': '01', 'ma_xa': new_ma_xa})
+    journal.close()
+    return sorted(CrawlJournal(path).load())
+
+
+def start_without_resume():
+    """Chạy mới (không --resume) trên journal đã có: journal cũ phải còn nguyên trong .bak"""
+    path = os.path.join(tempfile.mkdtemp(), 'journal.jsonl')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{"ma_tinh": "01", "ma_xa": "1"}\n')
+
+    journal = CrawlJournal(path, fsync=False)
+    journal.open(resume=False)
+    journal.append({'ma_tinh': '01', 'ma_xa': '3'})
+    journal.close()
+    return sorted(CrawlJournal(path).load()), sorted(CrawlJournal(path + '.bak').load())
+
+
+def main():
+    cases = {
+        # Crash giữa lúc ghi: dòng cuối là JSON dở
+        'dòng cuối ghi dở': ('{"ma_tinh": "01", "ma_xa": "1"}\n{"ma_tinh": "01", "ma_x',
+                             [('01', '1'), ('01', '3')]),
+        # Dòng cuối đủ JSON nhưng thiếu '\n'
+        'thiếu xuống dòng': ('{"ma_tinh": "01", "ma_xa": "1"}\n{"ma_tinh": "01", "ma_xa": "2"}',
+                             [('01', '1'), ('01', '2'), ('01', '3')]),
+        'journal bình thường': ('{"ma_tinh": "01", "ma_xa": "1"}\n', [('01', '1'), ('01', '3')]),
+        'chỉ có dòng hỏng': ('{"ma_tin', [('01', '3')]),
+    }
+
+    ok = True
+    for name, (content, expected) in cases.items():
+        keys = resume_and_append(content)
+        passed = keys == expected
+        ok &= passed
+        print(f"{'✅' if passed else '❌'} {name}: {keys}")
+
+    keys, backup_keys = start_without_resume()
+    passed = keys == [('01', '3')] and backup_keys == [('01', '1')]
+    ok &= passed
+    print(f"{'✅' if passed else '❌'} không --resume giữ journal cũ: {keys}, .bak {backup_keys}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Script debug để so sánh các backend parse trên trang HTML đã lưu
+"""
+
+import contextlib
+import multiprocessing
+import os
+import sys
+import time
+import tracemalloc
+
+from sap_nhap_simple import SapNhapCrawlerSimple
+
+# Kết quả đúng của parse_sap_nhap_info trên debug_page.html (để phát hiện regression)
+EXPECTED_DEBUG_PAGE = {
+    'truoc_sap_nhap': 'Xã Châu Hòa (Huyện Giồng Trôm cũ), Tỉnh Bến Tre',
+    'sau_sap_nhap': 'Xã Châu Hòa, Tỉnh Vĩnh Long',
+    'chi_tiet': [
+        {'truoc': 'Xã Châu Hòa (Huyện Giồng Trôm cũ), Tỉnh Bến Tre', 'sau': 'Xã Châu Hòa, Tỉnh Vĩnh Long'},
+        {'truoc': 'Tỉnh Bến TreTỉnh Trà VinhTỉnh Vĩnh Long', 'sau': 'Tỉnh Vĩnh Long'},
+    ]
+}
+
+
+def make_cases():
+    """{tên phép parse: {backend: hàm parse}} trên các trang HTML đã lưu"""
+    with open('debug_page.html', encoding='utf-8') as f:
+        details_page = f.read()
+    with open('debug_main_page.html', encoding='utf-8') as f:
+        main_page = f.read()
+
+    crawlers = {
+        backend: SapNhapCrawlerSimple(use_cache=False, parser_backend=backend)
+        for backend in ['html.parser', 'lxml']
+    }
+
+    return {
+        'parse_sap_nhap_info (debug_page.html)': {
+            backend: (lambda c=c: c.parse_details_html(details_page)) for backend, c in crawlers.items()
+        },
+        'parse_xa_phuong_list (debug_page.html)': {
+            backend: (lambda c=c: c.parse_xa_phuong_list(details_page, '83')) for backend, c in crawlers.items()
+        },
+        'select tỉnh (debug_main_page.html)': {
+            'html.parser': lambda: crawlers['html.parser']._parse_provinces_soup(main_page),
+            'lxml': lambda: crawlers['lxml'].parse_provinces(main_page),
+        },
+    }
+
+
+def _proc_status(key):
+    """Giá trị (KB) trong /proc/self/status, vd. VmRSS / VmHWM"""
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(f'{key}:'):
+                return int(line.split()[1])
+
+
+def _rss_growth_worker(label, backend, conn):
+    try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            func = make_cases()[label][backend]
+            # Đặt lại RSS đỉnh (VmHWM) về RSS hiện tại để không tính phần import / đọc file
+            with open('/proc/self/clear_refs', 'w') as f:
+                f.write('5')
+            before = _proc_status('VmRSS')
+            func()
+        conn.send(_proc_status('VmHWM') - before)
+    except OSError:
+        conn.send(None)  # Không phải Linux
+
+
+def peak_rss_growth(label, backend):
+    """RSS đỉnh tăng thêm (KB) của lần parse đầu tiên trong một process mới (None nếu không đo được)
+
+    Tính cả bộ nhớ C (cây libxml2 của lxml) mà tracemalloc không thấy. Process mới
+    để không dùng lại vùng nhớ đã giải phóng của các lần đo trước.
+    """
+    context = multiprocessing.get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_rss_growth_worker, args=(label, backend, sender))
+    process.start()
+    growth = receiver.recv()
+    process.join()
+    return growth
+
+
+def measure(func, repeat=20):
+    """Đo thời gian trung bình (ms) và heap Python đỉnh (KB, không gồm bộ nhớ C) của một lần parse"""
+    result = func()
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    elapsed = (time.perf_counter() - start) / repeat * 1000
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return result, elapsed, peak / 1024
+
+
+def compare(label, funcs, expected=None):
+    """Chạy cùng một phép parse trên các backend và so sánh kết quả"""
+    print(f"\n=== {label} ===")
+    results = {}
+
+    for backend, func in funcs.items():
+        result, elapsed, heap = measure(func)
+        rss = peak_rss_growth(label, backend)
+        results[backend] = result
+        rss = f"+{rss:6d} KB" if rss is not None else "      ? KB"
+        print(f"  {backend:12s}: {elapsed:8.2f} ms, RSS đỉnh {rss} (heap Python {heap:6.0f} KB)")
+
+    baseline = results['html.parser']
+    same = all(result == baseline for result in results.values())
+    print(f"  {'✅ Kết quả giống nhau' if same else '❌ Kết quả KHÁC nhau'}")
+
+    if expected is not None:
+        matches = baseline == expected
+        print(f"  {'✅ Khớp kết quả mong đợi' if matches else '❌ KHÔNG khớp kết quả mong đợi'}")
+        same = same and matches
+    return same
+
+
+def debug_parse():
+    """Debug các backend parse"""
+    cases = make_cases()
+    expected = {'parse_sap_nhap_info (debug_page.html)': EXPECTED_DEBUG_PAGE}
+
+    ok = True
+    for label, funcs in cases.items():
+        ok &= compare(label, funcs, expected=expected.get(label))
+
+    details = cases['parse_sap_nhap_info (debug_page.html)']['lxml']()
+    print(f"\nKết quả parse_sap_nhap_info: {details}")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if debug_parse() else 1)
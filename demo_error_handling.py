@@ -14,11 +14,12 @@ def main():
     print("=" * 50)
     
     crawler = SapNhapCrawlerSimple()
+    crawler.enable_store('demo_results.sqlite3')
     
     # Hack để tạo lỗi: giảm timeout xuống rất thấp
     original_get_page_content = crawler.get_page_content
     
-    def get_page_content_with_errors(url, ma_tinh=None, ma_xa=None, ten_tinh=None, ten_xa=None):
+    def get_page_content_with_errors(url, ma_tinh=None, ma_xa=None, ten_tinh=None, ten_xa=None, max_retries=3):
         """Version với timeout thấp để demo lỗi"""
         # Tạo lỗi timeout cho một số request
         import random
@@ -27,7 +28,7 @@ def main():
             crawler.log_error('timeout', url, 'Demo timeout error', ma_tinh, ma_xa, ten_tinh, ten_xa)
             return None
         
-        return original_get_page_content(url, ma_tinh, ma_xa, ten_tinh, ten_xa)
+        return original_get_page_content(url, ma_tinh, ma_xa, ten_tinh, ten_xa, max_retries=max_retries)
     
     # Thay thế method để demo
     crawler.get_page_content = get_page_content_with_errors
@@ -58,7 +59,7 @@ def main():
                     xa_info = crawler.get_sap_nhap_details(ma_tinh, ma_xa, ten_tinh, ten_xa)
                     
                     if xa_info:
-                        crawler.data.append(xa_info)
+                        crawler.add_result(xa_info)
                     
                     time.sleep(0.5)  # Delay ngắn cho demo
         
@@ -83,9 +84,8 @@ def main():
             
             if retry_data:
                 print(f"✅ Retry thành công {len(retry_data)} bản ghi")
-                # Merge với dữ liệu chính
-                all_data = crawler.data + retry_data
-                crawler.data = all_data
+                # Kết quả retry đã được upsert vào kho theo (ma_tinh, ma_xa): lấy lại bản đã gộp
+                crawler.data = crawler.store.all_records()
                 
                 # Lưu file cuối cùng
                 final_filename = crawler.save_to_excel()
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cấu hình gunicorn cho API tra cứu (gunicorn -c gunicorn.conf.py)
+
+- preload_app: master nạp dữ liệu và dựng index một lần rồi mới fork worker,
+  các worker dùng chung bộ nhớ đó (copy-on-write) thay vì mỗi worker đọc lại file
+- gc.freeze() trước khi fork để GC của worker không chạm vào (và copy) các trang dữ liệu
+- Số worker mặc định bằng số CPU, đổi bằng biến môi trường WEB_CONCURRENCY
+- Mỗi worker tự theo dõi file dữ liệu và nạp lại khi đổi (SAP_NHAP_RELOAD_INTERVAL);
+  dùng snapshot thì nạp lại chỉ mất vài trăm ms và các worker dùng chung page cache
+"""
+
+import gc
+import multiprocessing
+import os
+
+wsgi_app = 'api_sap_nhap:create_app()'
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+preload_app = True
+timeout = 120  # Batch lớn stream lâu hơn mặc định 30s
+accesslog = '-'
+
+
+def pre_fork(server, worker):
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    import api_sap_nhap
+    api_sap_nhap.start_watcher(worker.wsgi)
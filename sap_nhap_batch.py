@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Chuyển đổi địa chỉ hàng loạt (file CSV / Excel / JSON hàng trăm nghìn dòng)
+
+Mỗi dòng đầu vào có (ma_tinh, ma_xa) hoặc (ten_tinh, ten_xa). Việc so khớp
+là phép join theo khóa băm trên cả khối dữ liệu (pandas reindex), không lọc
+từng dòng. Tên chỉ được chuẩn hóa một lần cho mỗi giá trị khác nhau.
+
+Dùng từ dòng lệnh:
+    python sap_nhap_batch.py khach_hang.csv -o ket_qua.csv --data sap_nhap_backup.xlsx
+"""
+
+import argparse
+import io
+import json
+import os
+import re
+import sys
+import time
+
+import pandas as pd
+
+from sap_nhap_export import load_dataset
+from sap_nhap_index import RESULT_COLUMNS
+from sap_nhap_store import normalize_name
+
+CHUNK_SIZE = 50000
+
+_PROVINCE_PREFIX = re.compile(r'^(tinh|thanh pho|tp)\s+')
+_OLD_DISTRICT = re.compile(r'\s*\(.*?\)')
+
+
+def code_key(series):
+    """Khóa mã: bỏ khoảng trắng, đuôi '.0' và số 0 ở đầu ('01', 1, 1.0 -> '1')"""
+    series = series.where(series.notna(), '').astype(str).str.strip()
+    return series.str.replace(r'\.0$', '', regex=True).str.lstrip('0')
+
+
+def _map_unique(series, func):
+    """Áp dụng func cho từng giá trị khác nhau rồi map lại cả cột"""
+    series = series.where(series.notna(), '').astype(str)
+    mapping = {value: func(value) for value in series.unique()}
+    return series.map(mapping)
+
+
+def _province_key(name):
+    return _PROVINCE_PREFIX.sub('', normalize_name(name))
+
+
+def name_key(ten_tinh, ten_xa, short=False):
+    """Khóa tên 'tinh|xa' đã bỏ dấu; short=True bỏ phần '(Quận ... cũ)' của tên xã"""
+    if short:
+        ten_xa = ten_xa.where(ten_xa.isna(), ten_xa.astype(str).str.replace(_OLD_DISTRICT, '', regex=True))
+    return _map_unique(ten_tinh, _province_key) + '|' + _map_unique(ten_xa, normalize_name)
+
+
+def converter_keys(data):
+    """Ba cột khóa (mã, tên, tên rút gọn) của bảng dữ liệu, dùng lại được khi nạp snapshot"""
+    return pd.DataFrame({
+        'code_key': code_key(data['ma_tinh']) + '|' + code_key(data['ma_xa']),
+        'name_key': name_key(data['ten_tinh'], data['ten_xa']),
+        'short_name_key': name_key(data['ten_tinh'], data['ten_xa'], short=True),
+    })
+
+
+class BatchConverter:
+    def __init__(self, df, keys=None):
+        # Kiểu object để reindex không đổi mã số nguyên thành float (1 -> 1.0)
+        data = df[RESULT_COLUMNS].astype(object).reset_index(drop=True)
+
+        self.keys = keys.reset_index(drop=True) if keys is not None else converter_keys(data)
+        codes = self.keys['code_key']
+        names = self.keys['name_key']
+        short_names = self.keys['short_name_key']
+
+        # Bảng băm theo từng loại khóa; tên rút gọn trùng nhau (Phường 1 của nhiều quận) thì bỏ
+        self.by_code = data[~codes.duplicated()].set_axis(codes[~codes.duplicated()])
+        self.by_name = data[~names.duplicated()].set_axis(names[~names.duplicated()])
+        ambiguous = short_names.duplicated(keep=False)
+        self.by_short_name = data[~ambiguous].set_axis(short_names[~ambiguous])
+
+    def convert(self, rows):
+        """Trả về rows kèm các cột kết quả còn thiếu và cột 'khop' (tìm thấy hay không)"""
+        rows = rows.reset_index(drop=True)
+        matched = pd.DataFrame(index=rows.index, columns=RESULT_COLUMNS, dtype=object)
+        found = pd.Series(False, index=rows.index)
+
+        if {'ma_tinh', 'ma_xa'} <= set(rows.columns):
+            keys = code_key(rows['ma_tinh']) + '|' + code_key(rows['ma_xa'])
+            found = self._fill(matched, found, self.by_code, keys)
+
+        if {'ten_tinh', 'ten_xa'} <= set(rows.columns) and not found.all():
+            keys = name_key(rows['ten_tinh'], rows['ten_xa'])
+            found = self._fill(matched, found, self.by_name, keys)
+
+            if not found.all():
+                keys = name_key(rows['ten_tinh'], rows['ten_xa'], short=True)
+                found = self._fill(matched, found, self.by_short_name, keys)
+
+        # Giữ nguyên giá trị đầu vào; ô trống và cột còn thiếu lấy từ bản ghi khớp
+        result = rows.copy()
+        for col in RESULT_COLUMNS:
+            if col in result.columns:
+                result[col] = result[col].astype(object).where(result[col].notna(), matched[col])
+            else:
+                result[col] = matched[col]
+        result['khop'] = found
+        return result
+
+    def _fill(self, matched, found, table, keys):
+        """Join các dòng chưa khớp với bảng băm theo khóa"""
+        pending = ~found
+        hits = table.reindex(keys[pending].values).set_axis(keys[pending].index)
+        hit = hits['ma_tinh'].notna()
+        matched.loc[hit[hit].index] = hits[hit]
+        return found | hit.reindex(found.index, fill_value=False)
+
+
+def _check_record(row, number, what):
+    if not isinstance(row, dict):
+        value = json.dumps(row, ensure_ascii=False)[:50]
+        raise ValueError(f"Dòng {number} của {what} không phải object JSON: {value}")
+    return row
+
+
+def records_frame(rows, what='mảng JSON'):
+    """List bản ghi JSON thành DataFrame; phần tử không phải object thì báo lỗi kèm số thứ tự (tính từ 1)"""
+    if not isinstance(rows, list):
+        raise ValueError(f"Cần {what} gồm các object, vd. [{{\"ma_tinh\": \"01\", \"ma_xa\": \"00004\"}}]")
+    for number, row in enumerate(rows, 1):
+        _check_record(row, number, what)
+    return pd.DataFrame(rows)
+
+
+def _read_json_lines(path_or_file):
+    """File JSONL thành DataFrame (bỏ qua dòng trống); dòng lỗi báo theo số dòng trong file"""
+    if hasattr(path_or_file, 'read'):
+        lines = io.TextIOWrapper(path_or_file, encoding='utf-8-sig')
+    else:
+        lines = open(path_or_file, encoding='utf-8-sig')
+    rows = []
+    with lines:
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Dòng {number} của file JSONL không phải JSON hợp lệ: {e}") from None
+            rows.append(_check_record(row, number, 'file JSONL'))
+    return pd.DataFrame(rows)
+
+
+def read_input_chunks(path_or_file, filename=None, chunk_size=CHUNK_SIZE):
+    """Đọc file đầu vào theo khối: CSV đọc dần, Excel / JSON đọc một lần rồi chia khối"""
+    filename = filename or path_or_file
+    if filename.endswith('.csv'):
+        yield from pd.read_csv(path_or_file, dtype=str, chunksize=chunk_size, encoding='utf-8-sig')
+        return
+
+    if filename.endswith(('.xlsx', '.xls')):
+        frame = pd.read_excel(path_or_file, dtype=str)
+    elif filename.endswith('.jsonl'):
+        frame = _read_json_lines(path_or_file)
+    elif filename.endswith('.json'):
+        if hasattr(path_or_file, 'read'):
+            frame = records_frame(json.load(path_or_file), 'file JSON')
+        else:
+            with open(path_or_file, encoding='utf-8') as f:
+                frame = records_frame(json.load(f), 'file JSON')
+    else:
+        raise ValueError(f"Không hỗ trợ định dạng file: {filename} (dùng .csv, .xlsx, .json hoặc .jsonl)")
+
+    for start in range(0, len(frame), chunk_size):
+        yield frame.iloc[start:start + chunk_size]
+
+
+def to_jsonl(frame):
+    """Một khối kết quả thành các dòng JSON (NDJSON), mỗi dòng kết thúc bằng đúng một '\n'"""
+    if not len(frame):
+        return ''
+    text = frame.to_json(orient='records', lines=True, force_ascii=False)
+    return text if text.endswith('\n') else text + '\n'  # pandas cũ không có '\n' cuối
+
+
+def to_csv(frame, header):
+    return frame.to_csv(index=False, header=header)
+
+
+def convert_file(converter, input_path, output_path):
+    """Chuyển đổi cả file, ghi kết quả theo khối; trả về (số dòng, số dòng khớp)"""
+    total = matched = 0
+
+    if output_path.endswith('.xlsx'):
+        frames = [converter.convert(chunk) for chunk in read_input_chunks(input_path)]
+        result = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        result.to_excel(output_path, index=False)
+        return len(result), int(result['khop'].sum()) if len(result) else 0
+
+    if not output_path.endswith(('.csv', '.jsonl')):
+        raise ValueError(f"Không hỗ trợ định dạng file: {output_path} (dùng .csv, .jsonl hoặc .xlsx)")
+
+    encoding = 'utf-8-sig' if output_path.endswith('.csv') else 'utf-8'
+    with open(output_path, 'w', encoding=encoding, newline='') as f:
+        for i, chunk in enumerate(read_input_chunks(input_path)):
+            result = converter.convert(chunk)
+            f.write(to_csv(result, header=(i == 0)) if output_path.endswith('.csv') else to_jsonl(result))
+            total += len(result)
+            matched += int(result['khop'].sum())
+            print(f"  ⏳ Đã xử lý {total} dòng...", end='\r')
+
+    print()
+    return total, matched
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chuyển đổi địa chỉ sáp nhập hàng loạt")
+    parser.add_argument('input', help="File đầu vào (.csv/.xlsx/.json/.jsonl) có cột ma_tinh, ma_xa hoặc ten_tinh, ten_xa")
+    parser.add_argument('-o', '--output', help="File kết quả (.csv/.jsonl/.xlsx), mặc định <input>_ket_qua.csv")
+    parser.add_argument('--data', default=os.environ.get('SAP_NHAP_DATA', 'sap_nhap_backup.xlsx'),
+                        help="File dữ liệu sáp nhập (.xlsx/.parquet/.feather)")
+    args = parser.parse_args()
+
+    output = args.output or os.path.splitext(args.input)[0] + '_ket_qua.csv'
+
+    print(f"📂 Đọc dữ liệu sáp nhập: {args.data}")
+    converter = BatchConverter(load_dataset(args.data))
+
+    print(f"🔄 Chuyển đổi {args.input} -> {output}")
+    start = time.perf_counter()
+    try:
+        total, matched = convert_file(converter, args.input, output)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    elapsed = time.perf_counter() - start
+
+    print(f"✅ {total} dòng, khớp {matched} ({matched / total * 100 if total else 0:.1f}%)")
+    print(f"⚡ {elapsed:.2f} s ({total / elapsed * 60 if elapsed else 0:,.0f} dòng/phút)")
+    print(f"💾 File kết quả: {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
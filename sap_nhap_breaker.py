@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Circuit breaker theo host cho crawler
+
+Khi website bắt đầu timeout / mất kết nối / trả 5xx hàng loạt, gửi tiếp chỉ tốn
+thời gian chờ timeout và làm đầy error_log. Breaker theo dõi kết quả các request
+gần nhất của một host:
+- Đóng (bình thường): request đi qua, ghi nhận thành công / lỗi
+- Ngắt khi tỷ lệ lỗi trong cửa sổ vượt ngưỡng (hoặc lỗi liên tiếp quá nhiều):
+  mọi worker dừng lại chờ, không gửi request nào
+- Hết thời gian chờ: cho đúng một request thăm dò; thành công thì đóng lại,
+  lỗi thì ngắt tiếp với thời gian chờ gấp đôi (có giới hạn)
+
+429 và 4xx không tính là lỗi: server vẫn trả lời, rate limiter lo phần 429.
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    def __init__(self, name='', window=20, min_requests=5, failure_ratio=0.5, consecutive_failures=5,
+                 cooldown=30.0, max_cooldown=600.0, probe_timeout=120.0):
+        self.name = name
+        self.window = window  # Số kết quả gần nhất dùng để tính tỷ lệ lỗi
+        self.min_requests = min_requests
+        self.failure_ratio = failure_ratio
+        self.consecutive_failures = consecutive_failures
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.probe_timeout = probe_timeout  # Request thăm dò không báo kết quả sau ngần này thì cho thăm dò lại
+
+        self.state = CLOSED
+        self.trip_count = 0  # Số lần ngắt
+        self.open_seconds = 0.0  # Tổng thời gian không gửi được request
+        self._results = deque(maxlen=window)  # True = thành công
+        self._failure_streak = 0
+        self._cooldown = cooldown
+        self._open_until = 0.0
+        self._opened_at = None
+        self._probe_started = None
+        self._lock = threading.Lock()
+
+    def _wait_time(self):
+        """0 nếu được gửi request ngay (có thể là request thăm dò), ngược lại số giây nên chờ"""
+        with self._lock:
+            if self.state == CLOSED:
+                return 0.0
+
+            now = time.monotonic()
+            if self.state == OPEN:
+                if now < self._open_until:
+                    return self._open_until - now
+                self.state = HALF_OPEN
+                self._probe_started = None
+
+            # HALF_OPEN: chỉ một request thăm dò, các request khác chờ kết quả
+            if self._probe_started is None or now - self._probe_started > self.probe_timeout:
+                self._probe_started = now
+                print(f"🔎 [{self.name}] Gửi 1 request thăm dò...")
+                return 0.0
+            return min(1.0, self.probe_timeout)
+
+    def before_request(self):
+        """Chờ (blocking) tới khi được gửi request"""
+        wait = self._wait_time()
+        while wait > 0:
+            time.sleep(wait)
+            wait = self._wait_time()
+
+    async def before_request_async(self):
+        """Bản async của before_request()"""
+        wait = self._wait_time()
+        while wait > 0:
+            await asyncio.sleep(wait)
+            wait = self._wait_time()
+
+    def record_success(self):
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._close()
+                return
+            self._results.append(True)
+            self._failure_streak = 0
+
+    def record_failure(self):
+        """Timeout / mất kết nối / 5xx"""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._open(min(self.max_cooldown, self._cooldown * 2), reason="thăm dò vẫn lỗi")
+                return
+            if self.state == OPEN:
+                return  # Request đã gửi trước khi ngắt, không cần tính thêm
+
+            self._results.append(False)
+            self._failure_streak += 1
+            failures = self._results.count(False)
+            if self._failure_streak >= self.consecutive_failures:
+                self._open(self.base_cooldown, reason=f"{self._failure_streak} lỗi liên tiếp")
+            elif len(self._results) >= self.min_requests and failures / len(self._results) >= self.failure_ratio:
+                self._open(self.base_cooldown, reason=f"{failures}/{len(self._results)} request gần nhất lỗi")
+
+    def _open(self, cooldown, reason):
+        now = time.monotonic()
+        if self._opened_at is None:
+            self._opened_at = now
+            self.trip_count += 1
+        self.state = OPEN
+        self._cooldown = cooldown
+        self._open_until = now + cooldown
+        self._probe_started = None
+        print(f"🔌 [{self.name}] Ngắt mạch ({reason}), tạm dừng mọi request {cooldown:.0f}s")
+
+    def _close(self):
+        down = time.monotonic() - self._opened_at
+        self.open_seconds += down
+        self.state = CLOSED
+        self._cooldown = self.base_cooldown
+        self._opened_at = None
+        self._probe_started = None
+        self._results.clear()
+        self._failure_streak = 0
+        print(f"✅ [{self.name}] Host hoạt động lại sau {down:.0f}s, tiếp tục crawl")
+
+    @property
+    def is_open(self):
+        return self.state != CLOSED
+
+    def downtime(self):
+        """Tổng số giây đã bị ngắt, kể cả lần ngắt hiện tại"""
+        with self._lock:
+            current = time.monotonic() - self._opened_at if self._opened_at is not None else 0.0
+            return self.open_seconds + current
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache trang HTML trên đĩa cho crawler
+
+- Khóa theo (MaTinh, MaXa) lấy từ query string của URL
+- Nội dung nén zlib, lưu trong một file SQLite
+- Có TTL và giới hạn dung lượng, vượt quá thì xóa theo LRU
+- Lưu ETag / Last-Modified để revalidate bằng conditional GET,
+  kèm kết quả parse theo hash nội dung để bỏ qua bước parse khi trang không đổi
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from urllib.parse import urlsplit, parse_qs
+
+
+def make_cache_key(url):
+    """Tạo khóa cache từ URL: 'MaTinh=..&MaXa=..' hoặc path nếu không có mã"""
+    parts = urlsplit(url)
+    query = parse_qs(parts.query)
+    ma_tinh = query.get('MaTinh', [''])[0]
+    ma_xa = query.get('MaXa', [''])[0]
+
+    if ma_tinh or ma_xa:
+        return f"MaTinh={ma_tinh}&MaXa={ma_xa}"
+    return parts.path
+
+
+def content_hash(content):
+    """Hash nội dung trang để nhận biết trang không thay đổi"""
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+class PageCache:
+    def __init__(self, path='sap_nhap_cache.sqlite3', ttl=12 * 3600, max_bytes=500 * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl  # Giây
+        self.max_bytes = max_bytes  # Dung lượng tối đa (đã nén)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS pages (
+                key TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_pages_last_access ON pages(last_access)')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS page_meta (
+                key TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                body_hash TEXT,
+                parsed_json TEXT
+            )
+        ''')
+        self._conn.commit()
+
+        self.total_bytes = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM pages').fetchone()[0]
+
+    def get(self, url, ttl=None):
+        """Trả về nội dung còn hạn trong cache hoặc None"""
+        ttl = self.ttl if ttl is None else ttl
+        key = make_cache_key(url)
+        now = time.time()
+
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT body, fetched_at FROM pages WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None or now - row[1] > ttl:
+                return None
+
+            self._conn.execute('UPDATE pages SET last_access = ? WHERE key = ?', (now, key))
+            self._conn.commit()
+
+        return zlib.decompress(row[0]).decode('utf-8')
+
+    def get_stale(self, url):
+        """Trả về nội dung trong cache kể cả khi đã hết hạn (dùng sau khi nhận 304)"""
+        key = make_cache_key(url)
+
+        with self._lock:
+            row = self._conn.execute('SELECT body FROM pages WHERE key = ?', (key,)).fetchone()
+
+        return zlib.decompress(row[0]).decode('utf-8') if row else None
+
+    def get_validators(self, url):
+        """Trả về (etag, last_modified) của trang đã cache, hoặc (None, None)"""
+        key = make_cache_key(url)
+
+        with self._lock:
+            row = self._conn.execute(
+                '''SELECT m.etag, m.last_modified FROM page_meta m
+                   JOIN pages p ON p.key = m.key WHERE m.key = ?''', (key,)
+            ).fetchone()
+
+        return row if row else (None, None)
+
+    def touch(self, url):
+        """Server trả 304: làm mới thời điểm tải để trang còn hạn thêm một TTL"""
+        key = make_cache_key(url)
+        now = time.time()
+
+        with self._lock:
+            self._conn.execute(
+                'UPDATE pages SET fetched_at = ?, last_access = ? WHERE key = ?', (now, now, key)
+            )
+            self._conn.commit()
+
+    def get_parsed(self, url, content):
+        """Trả về kết quả parse đã lưu nếu nội dung trang không đổi, ngược lại None"""
+        key = make_cache_key(url)
+
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT body_hash, parsed_json FROM page_meta WHERE key = ?', (key,)
+            ).fetchone()
+
+        if row and row[1] and row[0] == content_hash(content):
+            return json.loads(row[1])
+        return None
+
+    def put_parsed(self, url, content, parsed):
+        """Lưu kết quả parse kèm hash nội dung trang"""
+        key = make_cache_key(url)
+
+        with self._lock:
+            self._conn.execute(
+                '''INSERT INTO page_meta (key, body_hash, parsed_json) VALUES (?, ?, ?)
+                   ON CONFLICT(key) DO UPDATE SET body_hash = excluded.body_hash,
+                                                  parsed_json = excluded.parsed_json''',
+                (key, content_hash(content), json.dumps(parsed, ensure_ascii=False))
+            )
+            self._conn.commit()
+
+    def put(self, url, content, etag=None, last_modified=None):
+        """Lưu nội dung trang vào cache, xóa bớt theo LRU nếu vượt dung lượng"""
+        key = make_cache_key(url)
+        body = zlib.compress(content.encode('utf-8'), 6)
+        now = time.time()
+
+        with self._lock:
+            old = self._conn.execute('SELECT size FROM pages WHERE key = ?', (key,)).fetchone()
+            if old:
+                self.total_bytes -= old[0]
+
+            self._conn.execute(
+                'INSERT OR REPLACE INTO pages (key, body, size, fetched_at, last_access) VALUES (?, ?, ?, ?, ?)',
+                (key, body, len(body), now, now)
+            )
+            self.total_bytes += len(body)
+
+            self._conn.execute(
+                '''INSERT INTO page_meta (key, etag, last_modified) VALUES (?, ?, ?)
+                   ON CONFLICT(key) DO UPDATE SET etag = excluded.etag,
+                                                  last_modified = excluded.last_modified''',
+                (key, etag, last_modified)
+            )
+
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Xóa các trang ít được dùng nhất tới khi còn 90% dung lượng cho phép"""
+        target = self.max_bytes * 0.9
+        rows = self._conn.execute('SELECT key, size FROM pages ORDER BY last_access').fetchall()
+
+        removed = []
+        for key, size in rows:
+            if self.total_bytes <= target:
+                break
+            removed.append((key,))
+            self.total_bytes -= size
+
+        self._conn.executemany('DELETE FROM pages WHERE key = ?', removed)
+        self._conn.executemany('DELETE FROM page_meta WHERE key = ?', removed)
+
+    def clear(self):
+        """Xóa toàn bộ cache"""
+        with self._lock:
+            self._conn.execute('DELETE FROM pages')
+            self._conn.execute('DELETE FROM page_meta')
+            self._conn.commit()
+            self.total_bytes = 0
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Xuất dữ liệu dạng streaming: ghi từng bản ghi ngay khi crawl xong
+
+Không giữ toàn bộ dữ liệu trong bộ nhớ; các sheet thống kê được dựng
+từ bộ đếm chạy (RunningSummary) thay vì từ DataFrame cuối cùng.
+
+Ngoài Excel còn hỗ trợ định dạng cột Parquet / Arrow IPC (Feather) với
+kiểu dữ liệu chuẩn, để các chương trình đọc lại nạp dữ liệu trong vài
+mili giây và chỉ đọc những cột cần dùng.
+"""
+
+import csv
+import json
+import re
+from collections import Counter
+
+import pandas as pd
+from openpyxl import Workbook
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:  # Chỉ cần khi xuất Parquet / Feather
+    pa = None
+
+# Thứ tự cột giống DataFrame của save_to_excel
+COLUMNS = [
+    'ma_tinh', 'ten_tinh', 'ma_xa', 'ten_xa', 'cap_hanh_chinh', 'url',
+    'truoc_sap_nhap', 'sau_sap_nhap', 'chi_tiet_json', 'so_luong_thay_doi', 'co_thong_tin'
+]
+
+ERROR_COLUMNS = ['timestamp', 'error_type', 'url', 'message', 'ma_tinh', 'ma_xa', 'ten_tinh', 'ten_xa']
+
+# Kiểu cột khi xuất Parquet / Feather
+CATEGORY_COLUMNS = ['ma_tinh', 'cap_hanh_chinh']
+COLUMNAR_EXTENSIONS = ('.parquet', '.feather', '.arrow')
+
+EXCEL_CELL_LIMIT = 32767
+_ILLEGAL_CHARS = re.compile(r'[^\x20-\x7E\u00A0-\uFFFF]')
+
+
+def clean_excel_value(value):
+    """Làm sạch một giá trị chuỗi trước khi ghi Excel (ký tự điều khiển, giới hạn độ dài ô)"""
+    if not isinstance(value, str):
+        return value
+    return _ILLEGAL_CHARS.sub('', value)[:EXCEL_CELL_LIMIT]
+
+
+def _may_have_illegal_chars(text):
+    """Kiểm tra nhanh không cần regex (True có thể là báo nhầm, False thì chắc chắn sạch)
+
+    Mọi ký tự đều in được (isprintable loại ký tự điều khiển) và không có ký tự ngoài BMP
+    (UTF-16 không cần cặp surrogate) thì không có ký tự nào thuộc _ILLEGAL_CHARS
+    """
+    if not text.isprintable():
+        return True
+    return not text.isascii() and len(text.encode('utf-16-le')) != 2 * len(text)
+
+
+def clean_dataframe(df):
+    """Làm sạch các cột chuỗi của DataFrame trước khi ghi Excel (thao tác trên cả cột, không lặp từng ô)
+
+    - Cột số / bool giữ nguyên kiểu
+    - None / NaN trong cột object thành ''
+    - Cột có thể chứa ký tự không hợp lệ: một lần .str.replace cho cả cột
+    - Cột có ô quá dài: một lần .str.slice cho cả cột
+    """
+    for col in df.columns:
+        series = df[col]
+        if series.dtype != object:
+            continue
+
+        series = series.where(series.notna(), '')
+        if pd.api.types.infer_dtype(series, skipna=False) != 'string':
+            # Cột lẫn kiểu (hiếm): làm sạch từng ô chuỗi, giữ nguyên giá trị khác
+            df[col] = series.map(clean_excel_value)
+            continue
+
+        # Kiểm tra cả cột trên một chuỗi ghép; đa số cột sạch nên không phải sửa gì
+        strings = series.tolist()
+        text = ''.join(strings)
+        if _may_have_illegal_chars(text):
+            series = series.str.replace(_ILLEGAL_CHARS, '', regex=True)
+        if len(text) > EXCEL_CELL_LIMIT and max(map(len, strings)) > EXCEL_CELL_LIMIT:
+            series = series.str.slice(0, EXCEL_CELL_LIMIT)
+
+        df[col] = series
+
+    return df
+
+
+def typed_dataframe(data):
+    """Tạo DataFrame với kiểu cột chuẩn: category cho ma_tinh/cap_hanh_chinh, bool, int"""
+    df = pd.DataFrame(data)
+    for col in COLUMNS:
+        if col not in df.columns:
+            df[col] = None
+    df = df[COLUMNS]
+
+    for col in COLUMNS:
+        if col in CATEGORY_COLUMNS:
+            df[col] = df[col].fillna('').astype(str).astype('category')
+        elif col == 'co_thong_tin':
+            df[col] = df[col].fillna(False).astype(bool)
+        elif col == 'so_luong_thay_doi':
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype('int32')
+        else:
+            df[col] = df[col].fillna('').astype(str)
+
+    return df
+
+
+def _arrow_schema():
+    """Schema Arrow cố định để mọi batch / mọi lần xuất có cùng kiểu cột"""
+    fields = []
+    for col in COLUMNS:
+        if col in CATEGORY_COLUMNS:
+            fields.append(pa.field(col, pa.dictionary(pa.int32(), pa.string())))
+        elif col == 'co_thong_tin':
+            fields.append(pa.field(col, pa.bool_()))
+        elif col == 'so_luong_thay_doi':
+            fields.append(pa.field(col, pa.int32()))
+        else:
+            fields.append(pa.field(col, pa.string()))
+    return pa.schema(fields)
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("Cần cài pyarrow để xuất Parquet/Feather: pip install pyarrow")
+
+
+def _arrow_table(df):
+    return pa.Table.from_pandas(typed_dataframe(df), schema=_arrow_schema(), preserve_index=False)
+
+
+def save_columnar(data, path):
+    """Ghi dữ liệu ra file Parquet (.parquet) hoặc Arrow IPC/Feather (.feather, .arrow)"""
+    _require_pyarrow()
+    table = _arrow_table(data)
+
+    if path.endswith('.parquet'):
+        pq.write_table(table, path, compression='zstd')
+    elif path.endswith(('.feather', '.arrow')):
+        feather.write_feather(table, path, compression='zstd')
+    else:
+        raise ValueError(f"Không hỗ trợ định dạng file: {path} (dùng .parquet, .feather hoặc .arrow)")
+    return path
+
+
+def read_columnar(path, columns=None):
+    """Đọc file Parquet/Feather thành DataFrame, có thể chỉ đọc một số cột"""
+    _require_pyarrow()
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path, columns=columns)
+    return pd.read_feather(path, columns=columns)
+
+
+def load_dataset(path):
+    """Đọc dữ liệu kết quả crawl theo đuôi file: .parquet / .feather / .arrow hoặc Excel"""
+    if path.endswith(COLUMNAR_EXTENSIONS):
+        return read_columnar(path)
+    return pd.read_excel(path)
+
+
+class RunningSummary:
+    """Bộ đếm chạy cho sheet "Thống kê" - cập nhật theo từng bản ghi"""
+
+    def __init__(self):
+        self.record_count = 0
+        self.cap_counts = Counter()
+        self.info_counts = Counter()
+        self.total_changes = 0
+
+    def update(self, record):
+        self.record_count += 1
+        self.cap_counts[record.get('cap_hanh_chinh')] += 1
+        self.info_counts[bool(record.get('co_thong_tin'))] += 1
+        self.total_changes += record.get('so_luong_thay_doi') or 0
+
+    def to_rows(self):
+        """Các dòng thống kê dữ liệu, cùng định dạng với sheet "Thống kê" của save_to_excel"""
+        rows = []
+        for cap, count in self.cap_counts.most_common():
+            rows.append({'Loại': 'Cấp hành chính', 'Giá trị': cap, 'Số lượng': count})
+        for has_info, count in self.info_counts.most_common():
+            label = 'Có thông tin sáp nhập' if has_info else 'Không có thông tin'
+            rows.append({'Loại': 'Thông tin sáp nhập', 'Giá trị': label, 'Số lượng': count})
+        rows.append({'Loại': 'Tổng số thay đổi', 'Giá trị': '', 'Số lượng': self.total_changes})
+        return rows
+
+
+class JsonlSink:
+    """Ghi mỗi bản ghi thành một dòng JSON"""
+
+    def __init__(self, path):
+        self.path = path
+        self.summary = RunningSummary()
+        self._file = open(path, 'w', encoding='utf-8')
+
+    def write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.summary.update(record)
+
+    def close(self, stats_rows=None, error_log=None):
+        self._file.close()
+        return self.path
+
+
+class CsvSink:
+    """Ghi CSV (utf-8-sig để mở được bằng Excel)"""
+
+    def __init__(self, path):
+        self.path = path
+        self.summary = RunningSummary()
+        self._file = open(path, 'w', encoding='utf-8-sig', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=COLUMNS, extrasaction='ignore')
+        self._writer.writeheader()
+
+    def write(self, record):
+        self._writer.writerow(record)
+        self.summary.update(record)
+
+    def close(self, stats_rows=None, error_log=None):
+        self._file.close()
+        return self.path
+
+
+class ExcelStreamSink:
+    """Ghi Excel bằng workbook write-only của openpyxl, cùng bố cục sheet với save_to_excel"""
+
+    def __init__(self, path):
+        self.path = path
+        self.summary = RunningSummary()
+        self._workbook = Workbook(write_only=True)
+        # Tạo sheet theo đúng thứ tự của save_to_excel
+        self._data_sheet = self._workbook.create_sheet('Dữ liệu sáp nhập')
+        self._stats_sheet = self._workbook.create_sheet('Thống kê')
+        self._info_sheet = self._workbook.create_sheet('Có thông tin sáp nhập')
+        self._data_sheet.append(COLUMNS)
+        self._info_sheet.append(COLUMNS)
+
+    def write(self, record):
+        row = [clean_excel_value(record.get(col, '')) for col in COLUMNS]
+        self._data_sheet.append(row)
+        if record.get('co_thong_tin'):
+            self._info_sheet.append(row)
+        self.summary.update(record)
+
+    def close(self, stats_rows=None, error_log=None):
+        self._stats_sheet.append(['Loại', 'Giá trị', 'Số lượng'])
+        for row in self.summary.to_rows() + (stats_rows or []):
+            self._stats_sheet.append([row['Loại'], row['Giá trị'], row['Số lượng']])
+
+        if error_log:
+            error_sheet = self._workbook.create_sheet('Danh sách lỗi')
+            error_sheet.append(ERROR_COLUMNS)
+            for error in error_log:
+                error_sheet.append([clean_excel_value(error.get(col)) for col in ERROR_COLUMNS])
+
+        self._workbook.save(self.path)
+        return self.path
+
+
+class ParquetSink:
+    """Ghi Parquet theo từng row group, mỗi row group gồm batch_size bản ghi"""
+
+    def __init__(self, path, batch_size=5000):
+        _require_pyarrow()
+        self.path = path
+        self.batch_size = batch_size
+        self.summary = RunningSummary()
+        self._batch = []
+        self._writer = pq.ParquetWriter(path, _arrow_schema(), compression='zstd')
+
+    def write(self, record):
+        self._batch.append(record)
+        self.summary.update(record)
+        if len(self._batch) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if self._batch:
+            self._writer.write_table(_arrow_table(self._batch))
+            self._batch = []
+
+    def close(self, stats_rows=None, error_log=None):
+        self._flush()
+        self._writer.close()
+        return self.path
+
+
+def open_sink(path):
+    """Chọn sink theo đuôi file: .jsonl, .csv, .xlsx hoặc .parquet"""
+    if path.endswith('.jsonl'):
+        return JsonlSink(path)
+    if path.endswith('.csv'):
+        return CsvSink(path)
+    if path.endswith('.xlsx'):
+        return ExcelStreamSink(path)
+    if path.endswith('.parquet'):
+        return ParquetSink(path)
+    raise ValueError(f"Không hỗ trợ định dạng file: {path} (dùng .jsonl, .csv, .xlsx hoặc .parquet)")
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Index tra cứu dựng sẵn trong bộ nhớ cho API
+
+Dựng một lần khi khởi động từ DataFrame kết quả crawl:
+- (ma_tinh, ma_xa), ma_tinh, ma_xa -> danh sách bản ghi (dict/hash, O(1))
+- ma_tinh -> danh sách xã/phường đã bỏ trùng và sắp theo tên
+- Tên đã bỏ dấu sẵn, tra theo tên qua index trigram (NameSearchIndex) nên
+  gõ "ha noi" hay "phuong 1" vẫn khớp "Hà Nội", "Phường 1"
+
+Danh sách id theo trigram lưu dạng CSR (Postings: mảng numpy) để có thể
+nạp thẳng từ snapshot bằng mmap (xem sap_nhap_snapshot.py).
+"""
+
+import itertools
+from collections import defaultdict
+from functools import reduce
+
+import numpy as np
+
+from sap_nhap_store import normalize_name
+
+# Các trường trả về của /tra-cuu
+RESULT_COLUMNS = ['ma_tinh', 'ten_tinh', 'ma_xa', 'ten_xa', 'truoc_sap_nhap', 'sau_sap_nhap']
+
+# Các trường tìm theo tên, theo thứ tự tham số của lookup()
+NAME_FIELDS = ['ten_tinh', 'ten_xa', 'truoc_sap_nhap']
+
+# Nhóm bản ghi nhỏ hơn ngưỡng này thì quét trực tiếp thay vì dùng index trigram
+SCAN_LIMIT = 64
+
+
+def _trigrams(text):
+    """Các trigram của chuỗi đã bỏ dấu, có đệm khoảng trắng hai đầu để khớp được đầu/cuối từ"""
+    padded = f' {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class Postings:
+    """Danh sách id bản ghi theo trigram dạng CSR: vocab[i] -> ids[offsets[i]:offsets[i + 1]]"""
+
+    def __init__(self, vocab, offsets, ids):
+        self.vocab = vocab
+        self.slots = {gram: slot for slot, gram in enumerate(vocab)}
+        self.offsets = offsets
+        self.ids = ids  # Tăng dần trong từng trigram
+
+    @classmethod
+    def build(cls, gram_sets):
+        """Dựng từ tập trigram của từng bản ghi (theo thứ tự id)"""
+        lists = {}
+        for record_id, grams in enumerate(gram_sets):
+            for gram in grams:
+                lists.setdefault(gram, []).append(record_id)
+
+        vocab = list(lists)
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int32)
+        np.cumsum([len(lists[gram]) for gram in vocab], out=offsets[1:])
+        ids = np.fromiter(itertools.chain.from_iterable(lists[gram] for gram in vocab),
+                          dtype=np.int32, count=int(offsets[-1]))
+        return cls(vocab, offsets, ids)
+
+    def get(self, gram):
+        """Mảng id của trigram, None nếu không có"""
+        slot = self.slots.get(gram)
+        if slot is None:
+            return None
+        return self.ids[self.offsets[slot]:self.offsets[slot + 1]]
+
+    def size(self, gram):
+        slot = self.slots.get(gram)
+        return 0 if slot is None else int(self.offsets[slot + 1] - self.offsets[slot])
+
+    def union(self, grams):
+        """Tập id xuất hiện ở ít nhất một trigram"""
+        arrays = [ids for ids in map(self.get, grams) if ids is not None]
+        if not arrays:
+            return set()
+        return set(np.unique(np.concatenate(arrays)).tolist())
+
+
+class NameSearchIndex:
+    """Index trigram đảo ngược trên tên đã bỏ dấu: tìm chuỗi con / đầu từ không cần quét cả cột"""
+
+    def __init__(self, names, postings=None):
+        self.names = names  # Tên đã bỏ dấu theo id bản ghi
+        self.postings = postings if postings is not None else Postings.build(map(_trigrams, names))
+
+    def _candidates(self, query):
+        """Các id có thể khớp (chưa kiểm tra lại chuỗi con)"""
+        if len(query) >= 3:
+            lists = []
+            for i in range(len(query) - 2):
+                ids = self.postings.get(query[i:i + 3])
+                if ids is None:
+                    return set()
+                lists.append(ids)
+            lists.sort(key=len)
+            return set(reduce(lambda a, b: np.intersect1d(a, b, assume_unique=True), lists).tolist())
+
+        # Truy vấn 1-2 ký tự: hợp các trigram có chứa chuỗi đó
+        return self.postings.union(gram for gram in self.postings.vocab if query in gram)
+
+    def search(self, query, prefix=False):
+        """Trả về tập id có tên chứa query (prefix=True: có từ bắt đầu bằng query)"""
+        query = normalize_name(query)
+        if not query:
+            return set(range(len(self.names)))
+
+        names = self.names
+        candidates = self._candidates(query)
+        if prefix:
+            needle = f' {query}'
+            return {i for i in candidates if names[i].startswith(query) or needle in names[i]}
+        return {i for i in candidates if query in names[i]}
+
+    def matches(self, record_id, query, prefix=False):
+        """Kiểm tra một bản ghi (dùng khi đã lọc theo mã, số ứng viên ít)"""
+        name = self.names[record_id]
+        if prefix:
+            return name.startswith(query) or f' {query}' in name
+        return query in name
+
+
+class _Bucket:
+    """Các bản ghi cùng một khóa: list kết quả trả thẳng ra và id tương ứng để lọc theo tên"""
+    __slots__ = ('records', 'ids')
+
+    def __init__(self):
+        self.records = []
+        self.ids = []
+
+    def add(self, record, record_id):
+        self.records.append(record)
+        self.ids.append(record_id)
+
+
+def folded_names(records, field):
+    """Tên đã bỏ dấu của một trường, theo thứ tự bản ghi"""
+    return [normalize_name(record[field]) if isinstance(record[field], str) else '' for record in records]
+
+
+class LookupIndex:
+    def __init__(self, df):
+        records = df[RESULT_COLUMNS].to_dict(orient='records')
+        name_indexes = [NameSearchIndex(folded_names(records, field)) for field in NAME_FIELDS]
+
+        # Danh sách xã/phường theo tỉnh, giống kết quả cũ của /get-xa
+        xa_rows = df[['ma_tinh', 'ma_xa', 'ten_xa']].drop_duplicates().sort_values('ten_xa').to_dict(orient='records')
+        provinces = df[['ma_tinh', 'ten_tinh']].drop_duplicates().sort_values('ten_tinh').to_dict(orient='records')
+
+        self._setup(records, name_indexes, xa_rows, provinces)
+
+    @classmethod
+    def from_parts(cls, records, name_indexes, xa_rows, provinces):
+        """Dựng từ các phần đã tính sẵn (snapshot), không cần DataFrame"""
+        index = cls.__new__(cls)
+        index._setup(records, name_indexes, xa_rows, provinces)
+        return index
+
+    def _setup(self, records, name_indexes, xa_rows, provinces):
+        self.all = _Bucket()
+        by_code = defaultdict(_Bucket)
+        by_tinh = defaultdict(_Bucket)
+        by_xa = defaultdict(_Bucket)
+
+        for record_id, record in enumerate(records):
+            ma_tinh = str(record['ma_tinh'])
+            ma_xa = str(record['ma_xa'])
+
+            self.all.add(record, record_id)
+            by_code[(ma_tinh, ma_xa)].add(record, record_id)
+            by_tinh[ma_tinh].add(record, record_id)
+            by_xa[ma_xa].add(record, record_id)
+
+        # dict thường: tra khóa không có không được tạo bucket rỗng
+        self.by_code = dict(by_code)
+        self.by_tinh = dict(by_tinh)
+        self.by_xa = dict(by_xa)
+
+        self.records = records
+        self.name_indexes = name_indexes
+
+        self.xa_rows = xa_rows
+        self.xa_lists = {}
+        for row in xa_rows:
+            self.xa_lists.setdefault(str(row['ma_tinh']), []).append({'ma_xa': row['ma_xa'], 'ten_xa': row['ten_xa']})
+
+        self.provinces = provinces
+
+    def _bucket(self, ma_tinh=None, ma_xa=None):
+        if ma_tinh and ma_xa:
+            return self.by_code.get((str(ma_tinh), str(ma_xa)))
+        if ma_tinh:
+            return self.by_tinh.get(str(ma_tinh))
+        if ma_xa:
+            return self.by_xa.get(str(ma_xa))
+        return self.all
+
+    def lookup(self, ma_tinh=None, ma_xa=None, ten_tinh=None, ten_xa=None, truoc=None, prefix=False):
+        """Tra cứu theo mã (O(1)) rồi lọc theo tên không phân biệt dấu / hoa thường
+
+        prefix=False: tên chứa chuỗi cần tìm; prefix=True: có từ bắt đầu bằng chuỗi đó
+        """
+        bucket = self._bucket(ma_tinh, ma_xa)
+        if bucket is None:
+            return []
+
+        filters = []
+        for name_index, query in zip(self.name_indexes, (ten_tinh, ten_xa, truoc)):
+            query = normalize_name(query)
+            if query:
+                filters.append((name_index, query))
+
+        # Chỉ tra theo mã: trả thẳng list dựng sẵn, không cấp phát gì thêm
+        if not filters:
+            return bucket.records
+
+        # Ít ứng viên (đã lọc theo mã xã): kiểm tra trực tiếp từng bản ghi
+        if len(bucket.ids) <= SCAN_LIMIT:
+            return [
+                record for record, record_id in zip(bucket.records, bucket.ids)
+                if all(name_index.matches(record_id, query, prefix) for name_index, query in filters)
+            ]
+
+        ids = None if bucket is self.all else set(bucket.ids)
+        for name_index, query in filters:
+            found = name_index.search(query, prefix)
+            ids = found if ids is None else ids & found
+            if not ids:
+                return []
+        return [self.records[record_id] for record_id in sorted(ids)]
+
+    def xa_list(self, ma_tinh):
+        """Danh sách xã/phường (ma_xa, ten_xa) của tỉnh, đã sắp theo tên"""
+        return self.xa_lists.get(str(ma_tinh), [])
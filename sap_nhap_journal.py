@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Journal tiến trình crawl (JSONL, chỉ ghi nối)
+
+Mỗi xã/phường crawl xong được ghi ngay một dòng JSON và fsync xuống đĩa,
+nên khi crawl bị dừng giữa chừng có thể chạy lại với --resume để bỏ qua
+các (ma_tinh, ma_xa) đã có trong journal.
+"""
+
+import json
+import os
+import threading
+
+
+def journal_key(ma_tinh, ma_xa):
+    """Khóa định danh một đơn vị công việc"""
+    return (str(ma_tinh), str(ma_xa or ''))
+
+
+class CrawlJournal:
+    def __init__(self, path='sap_nhap_journal.jsonl', fsync=True):
+        self.path = path
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._file = None
+
+    def load(self):
+        """Đọc các bản ghi đã hoàn thành, bỏ qua dòng cuối bị ghi dở khi crash"""
+        records = {}
+        if not os.path.exists(self.path):
+            return records
+
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                records[journal_key(record.get('ma_tinh'), record.get('ma_xa'))] = record
+
+        return records
+
+    def open(self, resume=False):
+        """Mở journal để ghi; không resume thì bắt đầu journal mới (journal cũ được đổi tên thành .bak)"""
+        if resume:
+            self._repair_tail()
+        else:
+            self._backup_existing()
+        self._file = open(self.path, 'a' if resume else 'w', encoding='utf-8')
+
+    def _backup_existing(self):
+        """Giữ lại journal cũ còn dữ liệu thay vì ghi đè khi quên --resume"""
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return
+
+        backup_path = self.path + '.bak'
+        os.replace(self.path, backup_path)
+        print(f"⚠️  Journal {self.path} đã có dữ liệu: chuyển sang {backup_path} và bắt đầu journal mới")
+        print(f"   Để tiếp tục lần crawl trước, chạy lại với --resume (đổi tên {backup_path} về {self.path})")
+
+    def _repair_tail(self):
+        """Dòng cuối không kết thúc bằng '\n' (crash khi đang ghi): cắt bỏ nếu hỏng, thêm '\n' nếu đủ
+
+        Không sửa thì bản ghi mới sẽ bị nối vào dòng hỏng và mất khi load lần sau
+        """
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, 'rb+') as f:
+            end = f.seek(0, os.SEEK_END)
+            if end == 0:
+                return
+            f.seek(end - 1)
+            if f.read(1) == b'\n':
+                return
+
+            # Tìm '\n' cuối cùng, đọc lùi từng khối
+            position = end
+            line_start = 0
+            while position > 0:
+                size = min(65536, position)
+                position -= size
+                f.seek(position)
+                index = f.read(size).rfind(b'\n')
+                if index >= 0:
+                    line_start = position + index + 1
+                    break
+
+            f.seek(line_start)
+            tail = f.read()
+            try:
+                json.loads(tail.decode('utf-8'))
+            except (UnicodeDecodeError, json.JSONDecodeError):
+                f.truncate(line_start)
+                print(f"⚠️  Journal {self.path}: bỏ dòng cuối bị ghi dở ({len(tail)} byte)")
+            else:
+                f.write(b'\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def append(self, record):
+        """Ghi một bản ghi đã hoàn thành xuống đĩa"""
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Đo thời gian từng bước crawl và xuất metrics
+
+Mỗi bước (chờ circuit breaker, chờ rate limiter, DNS, kết nối, TTFB, tải body,
+parse HTML, trích thông tin, ghi kết quả, xuất file) có một histogram latency
+chung và một histogram theo từng tỉnh. Ghi một lần đo chỉ tốn một bisect và vài phép cộng.
+
+Xuất ra:
+- Prometheus text format qua HTTP (/metrics)
+- File JSON ghi định kỳ (ghi file tạm rồi đổi tên, không bao giờ đọc phải file dở)
+"""
+
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Cận trên các bucket (giây), từ 0,1 ms tới 2 phút
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Các bước, theo thứ tự hiển thị (circuit_wait: thời gian chờ vì host bị ngắt mạch)
+STAGES = ('circuit_wait', 'rate_wait', 'dns', 'connect', 'ttfb', 'download', 'page', 'parse_html', 'extract', 'persist', 'export')
+
+
+class Histogram:
+    __slots__ = ('counts', 'count', 'sum')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # Bucket cuối: lớn hơn BUCKETS[-1]
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q):
+        """Ước lượng phân vị từ bucket (nội suy tuyến tính trong bucket)"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = BUCKETS[i - 1] if i > 0 else 0.0
+                upper = BUCKETS[i] if i < len(BUCKETS) else BUCKETS[-1]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return BUCKETS[-1]
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'p50': round(self.quantile(0.5), 6),
+            'p90': round(self.quantile(0.9), 6),
+            'p99': round(self.quantile(0.99), 6),
+            'buckets': dict(zip([str(b) for b in BUCKETS] + ['+Inf'], self.counts)),
+        }
+
+
+class CrawlMetrics:
+    """Histogram theo bước và theo (bước, mã tỉnh)"""
+
+    def __init__(self):
+        self.stages = {}
+        self.provinces = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds, ma_tinh=None):
+        with self._lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram()
+            histogram.observe(seconds)
+
+            if ma_tinh:
+                key = (stage, str(ma_tinh))
+                histogram = self.provinces.get(key)
+                if histogram is None:
+                    histogram = self.provinces[key] = Histogram()
+                histogram.observe(seconds)
+
+    def observe_many(self, timings, ma_tinh=None):
+        """Ghi nhiều bước một lúc, timings: {bước: giây}"""
+        for stage, seconds in timings.items():
+            self.observe(stage, seconds, ma_tinh)
+
+    @contextmanager
+    def timer(self, stage, ma_tinh=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, ma_tinh)
+
+    def _ordered_stages(self):
+        order = {stage: i for i, stage in enumerate(STAGES)}
+        return sorted(self.stages, key=lambda stage: (order.get(stage, len(order)), stage))
+
+    def summary_rows(self):
+        """(bước, số lần, p50, p99, tổng giây) theo thứ tự các bước"""
+        with self._lock:
+            return [
+                (stage, h.count, h.quantile(0.5), h.quantile(0.99), h.sum)
+                for stage, h in ((stage, self.stages[stage]) for stage in self._ordered_stages())
+            ]
+
+    def to_dict(self, counters=None, gauges=None):
+        with self._lock:
+            provinces = {}
+            for (stage, ma_tinh), histogram in sorted(self.provinces.items()):
+                provinces.setdefault(ma_tinh, {})[stage] = histogram.to_dict()
+            return {
+                'updated_at': datetime.now().isoformat(timespec='seconds'),
+                'stages': {stage: self.stages[stage].to_dict() for stage in self._ordered_stages()},
+                'provinces': provinces,
+                'counters': dict(counters or {}),
+                'gauges': dict(gauges or {}),
+            }
+
+    def to_prometheus(self, counters=None, gauges=None):
+        """Prometheus text exposition format"""
+        lines = [
+            '# HELP sap_nhap_stage_seconds Thời gian từng bước crawl',
+            '# TYPE sap_nhap_stage_seconds histogram',
+        ]
+        with self._lock:
+            for stage in self._ordered_stages():
+                _histogram_lines(lines, 'sap_nhap_stage_seconds', f'stage="{stage}"', self.stages[stage])
+
+            lines.append('# HELP sap_nhap_province_stage_seconds Thời gian từng bước crawl theo tỉnh')
+            lines.append('# TYPE sap_nhap_province_stage_seconds histogram')
+            for (stage, ma_tinh), histogram in sorted(self.provinces.items()):
+                _histogram_lines(lines, 'sap_nhap_province_stage_seconds',
+                                 f'stage="{stage}",ma_tinh="{ma_tinh}"', histogram)
+
+        if counters:
+            lines.append('# TYPE sap_nhap_crawl_events_total counter')
+            for name, value in counters.items():
+                lines.append(f'sap_nhap_crawl_events_total{{event="{name}"}} {value}')
+        for name, value in (gauges or {}).items():
+            lines.append(f'# TYPE sap_nhap_{name} gauge')
+            lines.append(f'sap_nhap_{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def _histogram_lines(lines, name, labels, histogram):
+    cumulative = 0
+    for bound, count in zip(BUCKETS, histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+    lines.append(f'{name}_sum{{{labels}}} {histogram.sum:.6f}')
+    lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+
+
+def aiohttp_trace_config(metrics):
+    """TraceConfig của aiohttp ghi DNS / connect / TTFB; truyền trace_request_ctx={'ma_tinh': ...} khi gửi request"""
+    import aiohttp
+
+    def context_province(context):
+        request_ctx = context.trace_request_ctx
+        return request_ctx.get('ma_tinh') if isinstance(request_ctx, dict) else None
+
+    def mark(name):
+        async def handler(session, context, params):
+            setattr(context, name, time.perf_counter())
+        return handler
+
+    def measure(stage, start_name):
+        async def handler(session, context, params):
+            start = getattr(context, start_name, None)
+            if start is not None:
+                metrics.observe(stage, time.perf_counter() - start, context_province(context))
+        return handler
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(mark('request_start'))
+    trace_config.on_request_end.append(measure('ttfb', 'request_start'))
+    trace_config.on_dns_resolvehost_start.append(mark('dns_start'))
+    trace_config.on_dns_resolvehost_end.append(measure('dns', 'dns_start'))
+    trace_config.on_connection_create_start.append(mark('connect_start'))
+    trace_config.on_connection_create_end.append(measure('connect', 'connect_start'))
+    return trace_config
+
+
+class MetricsExporter:
+    """Xuất metrics định kỳ ra file JSON và/hoặc phục vụ /metrics cho Prometheus"""
+
+    def __init__(self, metrics, counters=None, gauges=None, path=None, interval=15.0, port=None):
+        self.metrics = metrics
+        self.counters = counters or dict  # Hàm trả về dict bộ đếm hiện tại
+        self.gauges = gauges or dict
+        self.path = path
+        self.interval = interval
+        self.port = port
+        self._stop = threading.Event()
+        self._thread = None
+        self._server = None
+
+    def start(self):
+        if self.path:
+            self._thread = threading.Thread(target=self._run, name='sap-nhap-metrics', daemon=True)
+            self._thread.start()
+            print(f"📈 Metrics JSON: {self.path} (mỗi {self.interval:g}s)")
+        if self.port is not None:
+            self._server = ThreadingHTTPServer(('0.0.0.0', self.port), self._handler())
+            self._server.daemon_threads = True
+            threading.Thread(target=self._server.serve_forever, name='sap-nhap-metrics-http', daemon=True).start()
+            print(f"📈 Prometheus metrics: http://0.0.0.0:{self.port}/metrics")
+        return self
+
+    def stop(self):
+        """Dừng và ghi file lần cuối"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self.write()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def write(self):
+        data = self.metrics.to_dict(self.counters(), self.gauges())
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def _handler(self):
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = exporter.metrics.to_prometheus(exporter.counters(), exporter.gauges()).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Không in access log mỗi lần Prometheus scrape
+
+        return Handler
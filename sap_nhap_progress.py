@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Báo cáo tiến độ cho các lần crawl dài
+
+Đếm số xã/phường đã tìm thấy / đã xong / lỗi, tính tốc độ trung bình trượt
+(mặc định 5 phút gần nhất), tỷ lệ lỗi và thời gian ước tính còn lại. Một thread
+nền in một dòng tiến độ mỗi `interval` giây và/hoặc ghi file trạng thái JSON;
+vòng crawl chỉ tăng bộ đếm nên gần như không tốn gì.
+
+Khi chưa liệt kê hết các tỉnh, tổng số xã/phường được ngoại suy theo số
+xã/phường trung bình của các tỉnh đã liệt kê.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+
+def format_duration(seconds):
+    """Số giây -> 'H:MM:SS'"""
+    return str(timedelta(seconds=int(seconds)))
+
+
+class ProgressReporter:
+    def __init__(self, interval=30.0, status_file=None, window=300.0, extra=None):
+        self.interval = interval
+        self.status_file = status_file
+        self.window = window  # Giây, cửa sổ tính tốc độ và tỷ lệ lỗi
+        self.extra = extra or dict  # Hàm trả về dict thông tin thêm (vd. tốc độ rate limiter)
+        self.total_provinces = 0
+        self.listed_provinces = 0
+        self.discovered = 0  # Xã/phường cần crawl (không tính phần đã có trong journal)
+        self.skipped = 0  # Xã/phường đã có trong journal
+        self.completed = 0
+        self.failed = 0
+        self.started_at = None
+        self._samples = deque()  # (thời điểm, completed, failed) ở mỗi lần báo cáo
+        self._stop = threading.Event()
+        self._thread = None
+
+    def set_provinces(self, count):
+        self.total_provinces = count
+
+    def discover(self, count, skipped=0):
+        """Đã liệt kê xong một tỉnh: count xã/phường cần crawl, skipped xã/phường đã có"""
+        self.listed_provinces += 1
+        self.discovered += count
+        self.skipped += skipped
+
+    def unit_done(self, ok=True):
+        if ok:
+            self.completed += 1
+        else:
+            self.failed += 1
+
+    @property
+    def done(self):
+        return self.completed + self.failed
+
+    def estimated_total(self):
+        """Tổng số xã/phường cần crawl, ngoại suy cho các tỉnh chưa liệt kê"""
+        remaining_provinces = self.total_provinces - self.listed_provinces
+        if remaining_provinces <= 0 or not self.listed_provinces:
+            return self.discovered
+        return self.discovered + round(remaining_provinces * self.discovered / self.listed_provinces)
+
+    def _window_start(self, now):
+        """Mẫu cũ nhất còn trong cửa sổ (hoặc lúc bắt đầu)"""
+        while len(self._samples) > 1 and now - self._samples[1][0] >= self.window:
+            self._samples.popleft()
+        return self._samples[0] if self._samples else (self.started_at, 0, 0)
+
+    def snapshot(self):
+        now = time.monotonic()
+        since, completed_before, failed_before = self._window_start(now)
+        completed, failed = self.completed, self.failed
+        elapsed = now - since
+
+        finished = (completed - completed_before) + (failed - failed_before)
+        rate = finished / elapsed if elapsed > 0 else 0.0
+        error_rate = (failed - failed_before) / finished if finished else 0.0
+
+        total = self.estimated_total()
+        remaining = max(0, total - completed - failed)
+        eta = remaining / rate if rate > 0 else None
+
+        self._samples.append((now, completed, failed))
+        return dict({
+            'updated_at': datetime.now().isoformat(timespec='seconds'),
+            'elapsed_s': round(now - self.started_at, 1),
+            'provinces_listed': self.listed_provinces,
+            'provinces_total': self.total_provinces,
+            'discovered': self.discovered,
+            'estimated_total': total,
+            'skipped': self.skipped,
+            'completed': completed,
+            'failed': failed,
+            'percent': round((completed + failed) / total * 100, 2) if total else 0.0,
+            'rate_per_s': round(rate, 3),
+            'error_rate': round(error_rate, 4),
+            'eta_s': round(eta) if eta is not None else None,
+        }, **self.extra())
+
+    def report(self):
+        status = self.snapshot()
+        eta = format_duration(status['eta_s']) if status['eta_s'] is not None else '?'
+        approx = '~' if status['provinces_listed'] < status['provinces_total'] else ''
+        print(f"⏱️  [{status['updated_at'][11:]}] {status['completed'] + status['failed']}/{approx}{status['estimated_total']} "
+              f"xã/phường ({status['percent']:.1f}%) | tỉnh {status['provinces_listed']}/{status['provinces_total']} | "
+              f"{status['rate_per_s']:.2f} xã/s | lỗi {status['error_rate']:.1%} | còn lại ~{eta}", flush=True)
+
+        if self.status_file:
+            tmp_path = f'{self.status_file}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(status, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.status_file)
+        return status
+
+    def start(self):
+        self.started_at = time.monotonic()
+        self._samples.append((self.started_at, 0, 0))
+        if self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name='sap-nhap-progress', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Dừng thread nền và báo cáo lần cuối"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        status = self.report()
+        print(f"🏁 Xong {status['completed']} xã/phường, lỗi {status['failed']}, bỏ qua (đã có) {status['skipped']} "
+              f"trong {format_duration(status['elapsed_s'])}")
+        return status
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.report()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Rate limiter dùng chung cho mọi request của crawler
+
+Token bucket với tốc độ (request/giây) tự điều chỉnh:
+- Tăng dần khi các response trả về bình thường
+- Giảm một nửa và tạm dừng toàn bộ khi gặp 429 / Retry-After
+"""
+
+import asyncio
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+
+def parse_retry_after(value):
+    """Đọc header Retry-After (số giây hoặc HTTP date), trả về số giây hoặc None"""
+    if not value:
+        return None
+
+    value = str(value).strip()
+    if value.isdigit():
+        return float(value)
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class AdaptiveRateLimiter:
+    def __init__(self, rate=0.8, min_rate=0.2, max_rate=10.0, burst=1,
+                 increase_step=0.05, decrease_factor=0.5, backoff=5.0):
+        self.rate = rate  # request/giây hiện tại
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.backoff = backoff  # Thời gian tạm dừng khi 429 không có Retry-After
+
+        self.throttle_count = 0  # Số lần bị 429
+        self._next_time = 0.0
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        """Giữ chỗ một token, trả về số giây cần chờ trước khi gửi request"""
+        with self._lock:
+            now = time.monotonic()
+            interval = 1.0 / self.rate
+            # Cho phép tích lũy tối đa `burst` token khi rảnh
+            slot = max(self._next_time, now - (self.burst - 1) * interval, self._paused_until)
+            self._next_time = slot + interval
+            return max(0.0, slot - now)
+
+    def _pause_remaining(self):
+        with self._lock:
+            return max(0.0, self._paused_until - time.monotonic())
+
+    def acquire(self):
+        """Chờ (blocking) tới lượt gửi request"""
+        wait = self._reserve()
+        while wait > 0:
+            time.sleep(wait)
+            # Có thể đã bị tạm dừng thêm trong lúc chờ
+            wait = self._pause_remaining()
+
+    async def acquire_async(self):
+        """Bản async của acquire()"""
+        wait = self._reserve()
+        while wait > 0:
+            await asyncio.sleep(wait)
+            wait = self._pause_remaining()
+
+    def on_success(self):
+        """Response bình thường: tăng dần tốc độ"""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+    def on_rate_limited(self, retry_after=None):
+        """Gặp 429: giảm tốc độ và tạm dừng mọi request, trả về số giây tạm dừng"""
+        pause = parse_retry_after(retry_after)
+        if pause is None:
+            pause = self.backoff
+
+        with self._lock:
+            now = time.monotonic()
+            self.throttle_count += 1
+            # Các 429 của những request đang bay cùng lúc chỉ giảm tốc một lần
+            if now >= self._paused_until:
+                self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+            self._paused_until = max(self._paused_until, now + pause)
+            self._next_time = max(self._next_time, self._paused_until)
+
+        return pause
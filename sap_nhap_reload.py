@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Nạp lại dữ liệu API khi file dữ liệu thay đổi, không cần khởi động lại
+
+Một thread nền kiểm tra file theo chu kỳ (mtime, kích thước). Khi file đổi
+và đã ghi xong (hai lần kiểm tra liên tiếp giống nhau), dữ liệu và index mới
+được dựng hoàn toàn trong thread nền rồi mới đổi vào bằng một phép gán tham
+chiếu. Request đang chạy vẫn dùng bản cũ đến hết, không request nào phải chờ.
+"""
+
+import os
+import threading
+import time
+
+
+def file_signature(path):
+    """(mtime, kích thước) của file, None nếu file chưa có"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class DatasetWatcher:
+    def __init__(self, path, loader, on_swap, interval=10.0):
+        self.path = path
+        self.loader = loader  # path -> dữ liệu mới (chạy trong thread nền)
+        self.on_swap = on_swap  # dữ liệu mới -> None (đổi vào app)
+        self.interval = interval
+        self.reloads = 0
+        self.last_error = None
+
+        self._loaded = file_signature(path)
+        self._seen = self._loaded
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='sap-nhap-reload', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def check(self):
+        """Kiểm tra một lần; trả về True nếu đã nạp và đổi sang dữ liệu mới"""
+        signature = file_signature(self.path)
+        stable = signature == self._seen
+        self._seen = signature
+
+        # Chỉ nạp khi file đã khác bản đang dùng và không còn đang được ghi
+        if signature is None or signature == self._loaded or not stable:
+            return False
+
+        start = time.perf_counter()
+        try:
+            data = self.loader(self.path)
+        except Exception as e:
+            # Giữ bản cũ; chỉ thử lại khi file thay đổi lần nữa
+            self.last_error = f"{type(e).__name__}: {e}"
+            self._loaded = signature
+            print(f"❌ Không nạp được {self.path}, tiếp tục dùng dữ liệu cũ: {self.last_error}")
+            return False
+
+        self._loaded = signature
+        self.last_error = None
+        self.reloads += 1
+        self.on_swap(data)
+        print(f"🔄 Đã nạp lại {self.path} ({time.perf_counter() - start:.2f} s)")
+        return True
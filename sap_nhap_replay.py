@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Server replay cục bộ cho benchmark crawler (không gửi request nào tới thuvienphapluat.vn)
+
+Các trang được tổng hợp từ trang đã lưu (debug_main_page.html, debug_page.html):
+giữ nguyên bố cục, chỉ thay option của select tỉnh / xã và các dòng bảng sáp nhập
+bằng dữ liệu sinh sẵn cho N tỉnh x M xã/phường, nên chi phí parse giống trang thật.
+
+Lỗi giả lập (trừ trang chính, để lần chạy nào cũng tìm được danh sách tỉnh):
+- latency: độ trễ mỗi response (trung bình, độ lệch)
+- rate_429: tỷ lệ response 429 kèm Retry-After
+- timeout_rate: tỷ lệ request bị treo `hang` giây (client timeout)
+- outage_after / outage_duration: sau N request, mọi request trả 503 trong một khoảng thời gian
+
+Chạy riêng để thử bằng tay:
+    python sap_nhap_replay.py --port 8765 --latency-ms 50 --rate-429 0.02
+"""
+
+import argparse
+import asyncio
+import html
+import os
+import random
+import re
+import socket
+import time
+
+from aiohttp import web
+
+SEARCH_PATH = '/ma-so-thue/tra-cuu-thong-tin-sap-nhap-tinh'
+
+MAIN_PAGE_FILE = 'debug_main_page.html'
+DETAILS_PAGE_FILE = 'debug_page.html'
+
+_PROVINCE_SELECT = re.compile(r'(<select[^>]*id="tinh-cu"[^>]*>)(.*?)(</select>)', re.S)
+_XA_SELECT = re.compile(r'(<select[^>]*id="xa-cu"[^>]*>)(.*?)(</select>)', re.S)
+_TABLE = re.compile(r'<table.*?</table>', re.S)
+_TBODY = re.compile(r'(<tbody>)(.*?)(</tbody>)', re.S)
+_OPTION = re.compile(r'<option value="(\d+)">(.*?)</option>')
+
+# Dùng khi không có trang đã lưu: chỉ các phần crawler cần đọc
+_FALLBACK_PAGE = '''<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Tra cứu thông tin sáp nhập tỉnh</title></head><body>
+<select class="form-select" name="tinh-cu" id="tinh-cu"></select>
+<select class="form-select" name="xa-cu" id="xa-cu"></select>
+<table class="table table-bordered mt-2"><thead><tr><th></th><th>Trước sáp nhập</th><th>Sau sáp nhập</th></tr></thead>
+<tbody></tbody></table>
+</body></html>'''
+
+
+def _read_page(path):
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            return f.read()
+    return _FALLBACK_PAGE
+
+
+def _options(items, placeholder):
+    lines = [f'<option value="0">{placeholder}</option>']
+    lines.extend(f'<option value="{value}">{html.escape(text)}</option>' for value, text in items)
+    return '\n'.join(lines)
+
+
+def _merge_rows(truoc, sau, ten_tinh, ten_tinh_moi):
+    return f'''
+<tr><td>Phường/xã</td><td>{html.escape(truoc)}</td><td><div><strong>{html.escape(sau)}</strong>, {html.escape(ten_tinh_moi)}</div></td></tr>
+<tr><td>Tỉnh/thành phố</td><td><div>{html.escape(ten_tinh)}</div></td><td><strong class="text-primary">{html.escape(ten_tinh_moi)}</strong></td></tr>
+'''
+
+
+class ReplaySite:
+    """Dữ liệu tổng hợp và các trang HTML: trang chính, trang tỉnh, trang chi tiết xã/phường"""
+
+    def __init__(self, provinces=63, wards=20, seed=0):
+        main_page = _read_page(MAIN_PAGE_FILE)
+        self.details_page = _read_page(DETAILS_PAGE_FILE)
+
+        # Danh sách tỉnh lấy từ trang đã lưu, thiếu thì sinh thêm
+        match = _PROVINCE_SELECT.search(main_page)
+        recorded = [
+            (value, html.unescape(text)) for value, text in _OPTION.findall(match.group(2)) if value != '0'
+        ] if match else []
+        self.provinces = recorded[:provinces]
+        for i in range(len(self.provinces), provinces):
+            self.provinces.append((f'{i + 1:02d}', f'Tỉnh Giả Lập {i + 1}'))
+        self.province_names = dict(self.provinces)
+
+        rng = random.Random(seed)
+        self.wards = {}
+        for index, (ma_tinh, _) in enumerate(self.provinces):
+            self.wards[ma_tinh] = [
+                (f'{index * 1000 + j:05d}', f"{rng.choice(['Phường', 'Xã', 'Thị trấn'])} {j} (Huyện {rng.randint(1, 20)} cũ)")
+                for j in range(1, wards + 1)
+            ]
+
+        self.main_page = self._with_select(main_page, _PROVINCE_SELECT, _options(self.provinces, '-- Chọn tỉnh / TP --'))
+        # Select xã/phường của từng tỉnh dựng một lần, trang chi tiết chỉ thay bảng sáp nhập
+        self.province_pages = {
+            ma_tinh: self._with_select(self.details_page, _XA_SELECT, _options(wards, '-- Chọn phường / xã --'))
+            for ma_tinh, wards in self.wards.items()
+        }
+        self.ward_names = {(ma_tinh, ma_xa): ten_xa for ma_tinh, wards in self.wards.items() for ma_xa, ten_xa in wards}
+
+    @staticmethod
+    def _with_select(page, pattern, options):
+        return pattern.sub(lambda m: m.group(1) + options + m.group(3), page, count=1)
+
+    @staticmethod
+    def _with_merge_table(page, rows):
+        """Thay các dòng của bảng có header 'Trước sáp nhập'"""
+        def replace_table(match):
+            table = match.group(0)
+            if 'Trước sáp nhập' not in table:
+                return table
+            return _TBODY.sub(lambda m: m.group(1) + rows + m.group(3), table, count=1)
+        return _TABLE.sub(replace_table, page)
+
+    @property
+    def page_count(self):
+        """Số trang một lần auto-discovery sẽ tải: trang chính + mỗi tỉnh + mỗi xã/phường"""
+        return 1 + len(self.provinces) + len(self.ward_names)
+
+    def page(self, ma_tinh=None, ma_xa=None):
+        """HTML của URL tương ứng, None nếu không có"""
+        if not ma_tinh:
+            return self.main_page
+        if ma_tinh not in self.province_pages:
+            return None
+
+        ten_tinh = self.province_names[ma_tinh]
+        ten_tinh_moi = self.provinces[int(ma_tinh) % len(self.provinces)][1]
+        if not ma_xa:
+            return self._with_merge_table(self.province_pages[ma_tinh], _merge_rows(ten_tinh, ten_tinh_moi, ten_tinh, ten_tinh_moi))
+
+        ten_xa = self.ward_names.get((ma_tinh, ma_xa))
+        if ten_xa is None:
+            return None
+        rows = _merge_rows(f'{ten_xa}, {ten_tinh}', ten_xa.split(' (')[0], ten_tinh, ten_tinh_moi)
+        return self._with_merge_table(self.province_pages[ma_tinh], rows)
+
+
+class FaultInjector:
+    """Quyết định độ trễ / 429 / treo cho từng request (seed cố định để các lần chạy so sánh được)"""
+
+    def __init__(self, latency=0.05, jitter=0.02, rate_429=0.0, timeout_rate=0.0, hang=30.0, retry_after=1, seed=0,
+                 outage_after=None, outage_duration=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.timeout_rate = timeout_rate
+        self.hang = hang
+        self.retry_after = retry_after
+        self.outage_after = outage_after  # Số request trước khi sự cố bắt đầu
+        self.outage_duration = outage_duration
+        self.outage_start = None
+        self.rng = random.Random(seed)
+        self.counts = {'requests': 0, 'ok': 0, 'rate_limited': 0, 'hung': 0, 'not_found': 0, 'outage': 0}
+
+    def in_outage(self):
+        if self.outage_after is None or self.counts['requests'] <= self.outage_after:
+            return False
+        if self.outage_start is None:
+            self.outage_start = time.monotonic()
+        return time.monotonic() - self.outage_start < self.outage_duration
+
+    def delay(self):
+        return max(0.0, self.rng.gauss(self.latency, self.jitter))
+
+    def fault(self):
+        """'429', 'hang' hoặc None"""
+        roll = self.rng.random()
+        if roll < self.rate_429:
+            return '429'
+        if roll < self.rate_429 + self.timeout_rate:
+            return 'hang'
+        return None
+
+
+def create_app(site, faults):
+    async def search(request):
+        faults.counts['requests'] += 1
+        ma_tinh = request.query.get('MaTinh')
+        ma_xa = request.query.get('MaXa')
+
+        await asyncio.sleep(faults.delay())
+        if ma_tinh and faults.in_outage():
+            faults.counts['outage'] += 1
+            raise web.HTTPServiceUnavailable()
+        fault = faults.fault() if ma_tinh else None
+        if fault == '429':
+            faults.counts['rate_limited'] += 1
+            return web.Response(status=429, headers={'Retry-After': str(faults.retry_after)})
+        if fault == 'hang':
+            faults.counts['hung'] += 1
+            await asyncio.sleep(faults.hang)
+
+        page = site.page(ma_tinh, ma_xa)
+        if page is None:
+            faults.counts['not_found'] += 1
+            raise web.HTTPNotFound()
+        faults.counts['ok'] += 1
+        return web.Response(text=page, content_type='text/html', charset='utf-8')
+
+    async def stats(request):
+        return web.json_response(dict(faults.counts, pages=site.page_count))
+
+    app = web.Application()
+    app.router.add_get(SEARCH_PATH, search)
+    app.router.add_get('/__stats', stats)
+    return app
+
+
+def serve(port=0, ready=None, provinces=63, wards=20, seed=0, **fault_options):
+    """Chạy server (blocking); ready: Queue nhận cổng thật khi server đã sẵn sàng"""
+    site = ReplaySite(provinces, wards, seed)
+    faults = FaultInjector(seed=seed, **fault_options)
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(('127.0.0.1', port))
+
+    async def run():
+        runner = web.AppRunner(create_app(site, faults), access_log=None)
+        await runner.setup()
+        await web.SockSite(runner, sock).start()
+        if ready is not None:
+            ready.put(sock.getsockname()[1])
+        await asyncio.Event().wait()
+
+    asyncio.run(run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Server replay cục bộ cho benchmark crawler")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--provinces', type=int, default=63, help="Số tỉnh (mặc định 63)")
+    parser.add_argument('--wards', type=int, default=20, help="Số xã/phường mỗi tỉnh (mặc định 20)")
+    parser.add_argument('--latency-ms', type=float, default=50, help="Độ trễ trung bình mỗi response (ms)")
+    parser.add_argument('--jitter-ms', type=float, default=20, help="Độ lệch chuẩn độ trễ (ms)")
+    parser.add_argument('--rate-429', type=float, default=0.0, help="Tỷ lệ response 429 (0-1)")
+    parser.add_argument('--timeout-rate', type=float, default=0.0, help="Tỷ lệ request bị treo (0-1)")
+    parser.add_argument('--hang', type=float, default=30.0, help="Số giây treo khi giả lập timeout")
+    parser.add_argument('--outage-after', type=int, help="Giả lập sự cố sau N request: mọi request trả 503")
+    parser.add_argument('--outage-seconds', type=float, default=60.0, help="Thời gian sự cố (giây)")
+    args = parser.parse_args()
+
+    print(f"🧪 Replay server: http://127.0.0.1:{args.port}{SEARCH_PATH} "
+          f"({args.provinces} tỉnh x {args.wards} xã/phường)")
+    serve(args.port, provinces=args.provinces, wards=args.wards,
+          latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+          rate_429=args.rate_429, timeout_rate=args.timeout_rate, hang=args.hang,
+          outage_after=args.outage_after, outage_duration=args.outage_seconds)
+
+
+if __name__ == "__main__":
+    main()
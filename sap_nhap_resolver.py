@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Chuyển địa chỉ cũ dạng chữ tự do sang địa chỉ sau sáp nhập
+
+- Bỏ dấu, mở rộng viết tắt (P. / Q. / TP / TX / TT / H. / X. / T.)
+- Tách phần tỉnh (phần cuối) và phần xã/phường (+ quận/huyện cũ)
+- So khớp mờ bằng hệ số Dice trên trigram với các bản ghi đã index,
+  chịu được gõ sai vài ký tự; trả về top-k kèm điểm
+"""
+
+import re
+
+from sap_nhap_index import Postings
+from sap_nhap_store import normalize_name
+
+# Viết tắt thường gặp trong địa chỉ (sau khi đã bỏ dấu, chữ thường)
+ABBREVIATIONS = {
+    'tp': 'thanh pho',
+    'tx': 'thi xa',
+    'tt': 'thi tran',
+    'p': 'phuong',
+    'q': 'quan',
+    'h': 'huyen',
+    'x': 'xa',
+    't': 'tinh',
+}
+
+# Tên tỉnh viết tắt
+PROVINCE_ALIASES = {
+    'tphcm': 'thanh pho ho chi minh',
+    'hcm': 'ho chi minh',
+    'hn': 'ha noi',
+}
+
+# Từ chỉ cấp hành chính: bỏ khi so khớp để tên riêng quyết định điểm
+LEVEL_WORDS = {'tinh', 'thanh', 'pho', 'quan', 'huyen', 'thi', 'xa', 'tran', 'phuong', 'cu'}
+
+# Trigram xuất hiện ở quá tỷ lệ này số bản ghi thì không dùng để sinh ứng viên
+COMMON_GRAM_RATIO = 0.1
+MAX_CANDIDATES = 300
+
+_DOTTED_ABBR = re.compile(r'\b(tp|tx|tt|p|q|h|x|t)\.\s*')
+_BARE_ABBR = re.compile(r'\b(tp|tx|tt)\b')
+_NUMBERED_ABBR = re.compile(r'\b(p|q)(\d+)\b')
+_PROVINCE_ALIAS = re.compile(r'\b(' + '|'.join(PROVINCE_ALIASES) + r')\b')
+
+
+def fold_address(text):
+    """Bỏ dấu, chữ thường và mở rộng viết tắt; giữ dấu phẩy để tách các phần"""
+    text = normalize_name(text)
+    text = _DOTTED_ABBR.sub(lambda m: ABBREVIATIONS[m.group(1)] + ' ', text)
+    text = _BARE_ABBR.sub(lambda m: ABBREVIATIONS[m.group(1)], text)
+    text = _NUMBERED_ABBR.sub(lambda m: f"{ABBREVIATIONS[m.group(1)]} {m.group(2)}", text)
+    text = _PROVINCE_ALIAS.sub(lambda m: PROVINCE_ALIASES[m.group(1)], text)
+    text = re.sub(r'[^\w,]+', ' ', text)
+    return re.sub(r'\s+', ' ', text).strip(' ,')
+
+
+def _key(text):
+    """Khóa so khớp: các từ tên riêng (bỏ từ chỉ cấp hành chính), số bỏ số 0 đầu ("01" -> "1")"""
+    return ' '.join(
+        str(int(word)) if word.isdigit() else word
+        for word in re.findall(r'\w+', text) if word not in LEVEL_WORDS
+    )
+
+
+def _grams(key):
+    padded = f' {key} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _dice(a, b):
+    if not a or not b:
+        return 0.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+def resolver_keys(records):
+    """Khóa tỉnh và khóa xã/phường (đã bỏ dấu, mở rộng viết tắt) của từng bản ghi"""
+    province_keys = []
+    ward_keys = []
+    for record in records:
+        ten_tinh = record['ten_tinh'] if isinstance(record['ten_tinh'], str) else ''
+        ten_xa = record['ten_xa'] if isinstance(record['ten_xa'], str) else ''
+        province_keys.append(_key(fold_address(ten_tinh)))
+        ward_keys.append(_key(fold_address(ten_xa)))
+    return province_keys, ward_keys
+
+
+class AddressResolver:
+    def __init__(self, records, province_keys=None, ward_keys=None, postings=None):
+        self.records = records
+        if province_keys is None or ward_keys is None:
+            province_keys, ward_keys = resolver_keys(records)
+        self.province_keys = province_keys
+        self.ward_keys = ward_keys
+
+        # Tỉnh cũ: khóa -> (tên tỉnh, trigram, id các bản ghi)
+        self.provinces = {}
+        for record_id, province_key in enumerate(province_keys):
+            if province_key not in self.provinces:
+                self.provinces[province_key] = (records[record_id]['ten_tinh'], _grams(province_key), [])
+            self.provinces[province_key][2].append(record_id)
+
+        # Trigram của xã/phường tính khi cần (nạp snapshot không phải tính lại cho mọi bản ghi)
+        self.ward_grams = [None] * len(ward_keys)
+        self.postings = postings if postings is not None else Postings.build(map(_grams, ward_keys))
+
+        self.common_limit = max(1, int(len(records) * COMMON_GRAM_RATIO))
+
+    def _match_province(self, text, threshold):
+        """Trả về (khóa tỉnh, điểm) khớp nhất với text, hoặc (None, 0)"""
+        grams = _grams(_key(text))
+        best_key, best_score = None, 0.0
+        for key, (_, province_grams, _) in self.provinces.items():
+            score = _dice(grams, province_grams)
+            if score > best_score:
+                best_key, best_score = key, score
+        if best_score < threshold:
+            return None, 0.0
+        return best_key, best_score
+
+    def parse(self, address):
+        """Tách địa chỉ thành (phần xã/phường, khóa tỉnh, điểm tỉnh)"""
+        folded = fold_address(address)
+        parts = [part.strip() for part in folded.split(',') if part.strip()]
+        if not parts:
+            return '', None, 0.0
+
+        # Có dấu phẩy: phần cuối là tỉnh
+        if len(parts) > 1:
+            province_key, province_score = self._match_province(parts[-1], 0.6)
+            if province_key is not None:
+                return ' '.join(parts[:-1]), province_key, province_score
+            return ' '.join(parts), None, 0.0
+
+        # Không có dấu phẩy: thử 1-4 từ cuối làm tên tỉnh
+        words = parts[0].split()
+        best = ('', None, 0.0)
+        for size in range(1, min(4, len(words) - 1) + 1):
+            province_key, province_score = self._match_province(' '.join(words[-size:]), 0.75)
+            if province_score > best[2]:
+                best = (' '.join(words[:-size]), province_key, province_score)
+        if best[1] is not None:
+            return best
+        return parts[0], None, 0.0
+
+    def _ward_grams(self, record_id):
+        grams = self.ward_grams[record_id]
+        if grams is None:
+            grams = self.ward_grams[record_id] = _grams(self.ward_keys[record_id])
+        return grams
+
+    def _candidates(self, grams):
+        """Sinh ứng viên từ các trigram hiếm nhất của truy vấn"""
+        candidates = set()
+        for gram in sorted(grams, key=self.postings.size):
+            size = self.postings.size(gram)
+            if size > self.common_limit or len(candidates) >= MAX_CANDIDATES:
+                break
+            if size:
+                candidates.update(self.postings.get(gram).tolist())
+        return candidates
+
+    def resolve(self, address, k=5):
+        """Top-k bản ghi khớp nhất với địa chỉ cũ, mỗi bản ghi kèm 'score' trong [0, 1]"""
+        ward_text, province_key, province_score = self.parse(address)
+        grams = _grams(_key(ward_text))
+
+        if province_key is not None:
+            candidates = self.provinces[province_key][2]
+        else:
+            candidates = self._candidates(grams)
+
+        scored = []
+        for record_id in candidates:
+            score = _dice(grams, self._ward_grams(record_id))
+            if province_key is not None:
+                score = 0.85 * score + 0.15 * province_score
+            scored.append((score, record_id))
+
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        results = []
+        for score, record_id in scored[:k]:
+            if score <= 0:
+                break
+            result = dict(self.records[record_id])
+            result['score'] = round(score, 3)
+            results.append(result)
+        return results
+
+    def province_name(self, province_key):
+        return self.provinces[province_key][0] if province_key is not None else None
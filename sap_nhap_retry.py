@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Thử lại ngay trong lúc crawl
+
+Xã/phường lỗi được đưa lại vào lịch crawl sau một khoảng chờ tăng dần (kèm
+jitter để các lần thử không dồn cùng lúc), chạy xen với việc mới thay vì
+đợi một lượt retry tuần tự sau khi crawl xong. Mỗi xã/phường có số lần thử tối
+đa; hết lượt mới ghi vào error_log.
+"""
+
+import heapq
+import itertools
+import random
+import time
+
+
+class RetryPolicy:
+    """Số lần thử tối đa và thời gian chờ trước lần thử thứ n+1"""
+
+    def __init__(self, max_attempts=4, base_delay=5.0, max_delay=300.0, jitter=0.5, seed=None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter  # Lệch ngẫu nhiên ±jitter (tỷ lệ) quanh thời gian chờ
+        self._random = random.Random(seed)
+
+    def delay(self, attempt):
+        """Số giây chờ sau lần thử thứ `attempt` (tính từ 1) bị lỗi"""
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return delay * self._random.uniform(1 - self.jitter, 1 + self.jitter)
+
+
+class RetryQueue:
+    """Hàng đợi theo thời điểm đến hạn (dùng cho vòng crawl tuần tự)"""
+
+    def __init__(self):
+        self._heap = []
+        self._order = itertools.count()  # Cùng thời điểm thì giữ thứ tự đưa vào
+
+    def push(self, delay, item):
+        heapq.heappush(self._heap, (time.monotonic() + delay, next(self._order), item))
+
+    def pop_due(self):
+        """Các item đã đến hạn, theo thứ tự đến hạn"""
+        now = time.monotonic()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due.append(heapq.heappop(self._heap)[2])
+        return due
+
+    def wait_time(self):
+        """Số giây tới item đến hạn sớm nhất (0 nếu đã có item đến hạn)"""
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - time.monotonic())
+
+    def __len__(self):
+        return len(self._heap)
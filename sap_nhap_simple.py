@@ -13,10 +13,48 @@ import os
 from bs4 import BeautifulSoup
 import re
 import html
+import asyncio
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
+from urllib.parse import urlsplit
+from sap_nhap_ratelimit import AdaptiveRateLimiter
+from sap_nhap_cache import PageCache
+from sap_nhap_journal import CrawlJournal, journal_key
+from sap_nhap_store import ResultStore
+from sap_nhap_export import open_sink, clean_dataframe, save_columnar
+from sap_nhap_metrics import CrawlMetrics, MetricsExporter, aiohttp_trace_config
+from sap_nhap_progress import ProgressReporter
+from sap_nhap_retry import RetryPolicy, RetryQueue
+from sap_nhap_breaker import CircuitBreaker
+
+try:
+    import aiohttp
+except ImportError:  # Chỉ cần cho chế độ crawl async
+    aiohttp = None
+
+try:
+    import sap_nhap_parser
+except ImportError:  # Không có lxml thì dùng html.parser của BeautifulSoup
+    sap_nhap_parser = None
+
+_worker_crawlers = {}
+
+
+def parse_details_in_worker(content, parser_backend='lxml'):
+    """Parse HTML trang chi tiết trong process con của parse pool, trả về (kết quả, thời gian từng bước)"""
+    crawler = _worker_crawlers.get(parser_backend)
+    if crawler is None:
+        crawler = SapNhapCrawlerSimple(use_cache=False, parser_backend=parser_backend)
+        _worker_crawlers[parser_backend] = crawler
+    timings = {}
+    sap_nhap_info = crawler.parse_details_html(content, timings)
+    return sap_nhap_info, timings
+
 
 class SapNhapCrawlerSimple:
-    def __init__(self):
+    def __init__(self, rate_limiter=None, page_cache=None, use_cache=True, parser_backend='lxml'):
         self.base_url = "https://thuvienphapluat.vn"
         self.search_url = "https://thuvienphapluat.vn/ma-so-thue/tra-cuu-thong-tin-sap-nhap-tinh"
         self.session = requests.Session()
@@ -26,18 +64,134 @@ class SapNhapCrawlerSimple:
             'Accept-Language': 'vi-VN,vi;q=0.9,en;q=0.8',
         })
         self.data = []
+        # 'lxml': parse nhanh chỉ các bảng/select cần thiết; 'html.parser': BeautifulSoup đầy đủ
+        if parser_backend == 'lxml' and sap_nhap_parser is None:
+            parser_backend = 'html.parser'
+        self.parser_backend = parser_backend
         self.provinces = []
+        self.request_timeout = 15  # Giây, cho mỗi lần gửi request
         self.xa_phuong_cache = {}
         self.error_log = []  # Lưu các lỗi để xử lý lại
+        self.journal = None  # Journal tiến trình để resume khi crash
+        self.sink = None  # Sink streaming: ghi thẳng ra file thay vì giữ trong self.data
+        self.store = None  # Kho SQLite chung: upsert theo (ma_tinh, ma_xa)
+        self.result_count = 0
+        self.completed_keys = set()  # Các (ma_tinh, ma_xa) đã crawl xong
+        # Mọi request đều đi qua rate limiter dùng chung (thay cho time.sleep cố định)
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter()
+        # Cache HTML trên đĩa: chạy lại (parse/export) không cần gửi request
+        self.page_cache = None
+        if use_cache:
+            self.page_cache = page_cache if page_cache is not None else PageCache()
+        # Histogram thời gian từng bước (mạng, parse, ghi kết quả, export), chung và theo tỉnh
+        self.metrics = CrawlMetrics()
+        # Tiến độ auto-discovery: in mỗi progress_interval giây (0 = chỉ in lúc kết thúc) và/hoặc ghi status_file
+        self.progress = None
+        self.progress_interval = 30.0
+        self.status_file = None
+        self.verbose = True  # In từng xã/phường; tắt khi đang có báo cáo tiến độ
+        # Auto-discovery: xã/phường lỗi được thử lại ngay trong lúc crawl, xen với việc mới
+        self.retry_policy = RetryPolicy()
+        self.retry_attempts = {}  # (ma_tinh, ma_xa) -> số lần đã thử
+        self.pending_errors = {}  # (ma_tinh, ma_xa) -> lỗi của các lần thử, chờ kết quả cuối mới vào error_log
+        # Circuit breaker theo host: website lỗi hàng loạt thì mọi worker dừng chờ thay vì gửi tiếp
+        self.breakers = {}
+        self.breaker_options = {}  # Tham số cho CircuitBreaker (failure_ratio, cooldown...)
+        self.parse_pool = None  # ProcessPoolExecutor của stage parse (chế độ async)
         self.stats = {
             'total_processed': 0,
             'success_count': 0,
             'error_count': 0,
             'rate_limit_count': 0,
             'timeout_count': 0,
-            'connection_error_count': 0
+            'connection_error_count': 0,
+            'cache_hit_count': 0,
+            'revalidate_count': 0,  # Số conditional GET đã gửi
+            'not_modified_count': 0,  # Số lần server trả 304
+            'parse_reused_count': 0,  # Số trang dùng lại kết quả parse cũ
+            'retry_count': 0,  # Số lần đưa xã/phường lỗi vào hàng đợi thử lại
+            'retry_success_count': 0  # Số xã/phường thành công sau khi thử lại
         }
     
+    def enable_journal(self, path='sap_nhap_journal.jsonl', resume=False):
+        """Bật journal tiến trình; resume=True nạp lại kết quả đã crawl và bỏ qua chúng"""
+        self.journal = CrawlJournal(path)
+        
+        if resume:
+            records = self.journal.load()
+            for record in records.values():
+                self._store_result(record)
+            self.completed_keys.update(records.keys())
+            print(f"📒 Resume từ {path}: đã có {len(records)} bản ghi, sẽ bỏ qua")
+        
+        self.journal.open(resume=resume)
+    
+    def is_completed(self, ma_tinh, ma_xa=None):
+        """Kiểm tra (ma_tinh, ma_xa) đã có trong journal chưa"""
+        return journal_key(ma_tinh, ma_xa) in self.completed_keys
+    
+    def enable_streaming(self, path):
+        """Bật chế độ streaming: mỗi bản ghi được ghi ngay ra file (.jsonl/.csv/.xlsx), bộ nhớ không tăng"""
+        self.sink = open_sink(path)
+        print(f"🌊 Streaming kết quả ra: {path}")
+    
+    def close_streaming(self):
+        """Đóng sink streaming, ghi các sheet thống kê từ bộ đếm chạy"""
+        with self.metrics.timer('export'):
+            filename = self.sink.close(self.crawl_stats_rows(), self.error_log)
+        self.sink = None
+        print(f"💾 Đã lưu: {filename}")
+        
+        self.print_statistics()
+        if self.error_log:
+            self.save_error_log()
+        
+        return filename
+    
+    def enable_store(self, path='sap_nhap_results.sqlite3'):
+        """Bật kho kết quả SQLite; mọi lần crawl / retry đều upsert vào cùng một file"""
+        self.store = ResultStore(path)
+        print(f"🗄️  Kho kết quả: {path} ({len(self.store)} bản ghi)")
+    
+    def _store_result(self, record):
+        """Giữ bản ghi trong self.data hoặc ghi thẳng ra sink nếu đang streaming"""
+        if self.sink is not None:
+            self.sink.write(record)
+        else:
+            self.data.append(record)
+        self.result_count += 1
+    
+    def add_result(self, record):
+        """Thêm một bản ghi kết quả và ghi ngay vào journal / kho kết quả"""
+        with self.metrics.timer('persist', record['ma_tinh']):
+            self._store_result(record)
+            
+            if self.store is not None:
+                self.store.upsert(record)
+            
+            if self.journal:
+                self.journal.append(record)
+                self.completed_keys.add(journal_key(record['ma_tinh'], record['ma_xa']))
+    
+    def start_progress(self, total_provinces):
+        """Bắt đầu báo cáo tiến độ định kỳ, tắt output từng xã/phường"""
+        self.progress = ProgressReporter(
+            interval=self.progress_interval,
+            status_file=self.status_file,
+            extra=lambda: {'rate_limit_rps': round(self.rate_limiter.rate, 3), 'results': self.result_count,
+                           'retries': self.stats['retry_count'],
+                           'circuit_open': any(breaker.is_open for breaker in self.breakers.values())},
+        )
+        self.progress.set_provinces(total_provinces)
+        self.verbose = False
+        return self.progress.start()
+    
+    def stop_progress(self):
+        if self.progress is not None:
+            self.progress.stop()
+            self.progress = None
+        self.verbose = True
+    
     def get_provinces_from_html(self):
         """Lấy danh sách tỉnh từ dropdown HTML"""
         print("🌐 Đang lấy danh sách tỉnh từ trang web...")
@@ -47,6 +201,28 @@ class SapNhapCrawlerSimple:
             print("❌ Không thể lấy trang chính")
             return []
         
+        return self.parse_provinces(content)
+    
+    def parse_provinces(self, content):
+        """Phân tích danh sách tỉnh từ HTML trang chính"""
+        if self.parser_backend == 'lxml':
+            provinces = sap_nhap_parser.parse_provinces_lxml(sap_nhap_parser.parse_html(content))
+        else:
+            provinces = self._parse_provinces_soup(content)
+        
+        print(f"📊 Tìm thấy {len(provinces)} tỉnh/thành phố")
+        
+        # Hiển thị một vài tỉnh đầu tiên
+        for i, province in enumerate(provinces[:5]):
+            print(f"  {i+1}. {province['ma_tinh']}: {province['ten_tinh']}")
+        
+        if len(provinces) > 5:
+            print(f"  ... và {len(provinces) - 5} tỉnh khác")
+        
+        return provinces
+    
+    def _parse_provinces_soup(self, content):
+        """Phân tích select tỉnh bằng BeautifulSoup (html.parser)"""
         soup = BeautifulSoup(content, 'html.parser')
         provinces = []
         
@@ -88,15 +264,6 @@ class SapNhapCrawlerSimple:
                 
                 break  # Đã tìm thấy select tỉnh
         
-        print(f"📊 Tìm thấy {len(provinces)} tỉnh/thành phố")
-        
-        # Hiển thị một vài tỉnh đầu tiên
-        for i, province in enumerate(provinces[:5]):
-            print(f"  {i+1}. {province['ma_tinh']}: {province['ten_tinh']}")
-        
-        if len(provinces) > 5:
-            print(f"  ... và {len(provinces) - 5} tỉnh khác")
-        
         return provinces
     
     def get_xa_phuong_from_province(self, ma_tinh, ten_tinh=''):
@@ -115,6 +282,20 @@ class SapNhapCrawlerSimple:
         if not content:
             return []
         
+        xa_phuong_list = self.parse_xa_phuong_list(content, ma_tinh)
+        
+        print(f"    📍 Tìm thấy {len(xa_phuong_list)} xã/phường")
+        
+        # Cache kết quả
+        self.xa_phuong_cache[ma_tinh] = xa_phuong_list
+        
+        return xa_phuong_list
+    
+    def parse_xa_phuong_list(self, content, ma_tinh):
+        """Phân tích danh sách xã/phường từ HTML trang tỉnh"""
+        if self.parser_backend == 'lxml':
+            return sap_nhap_parser.parse_xa_phuong_list_lxml(sap_nhap_parser.parse_html(content), ma_tinh)
+        
         soup = BeautifulSoup(content, 'html.parser')
         xa_phuong_list = []
         
@@ -169,24 +350,30 @@ class SapNhapCrawlerSimple:
                                 'ten_xa': text
                             })
         
-        print(f"    📍 Tìm thấy {len(xa_phuong_list)} xã/phường")
-        
-        # Cache kết quả
-        self.xa_phuong_cache[ma_tinh] = xa_phuong_list
-        
         return xa_phuong_list
-        """Lấy nội dung trang web"""
-        try:
-            response = self.session.get(url, timeout=30)
-            response.raise_for_status()
-            response.encoding = 'utf-8'
-            return response.text
-        except Exception as e:
-            print(f"❌ Lỗi truy cập {url}: {e}")
-            return None
+    
+    def parse_details_html(self, content, timings=None):
+        """Parse HTML trang chi tiết bằng backend đã chọn, trả về cấu trúc như parse_sap_nhap_info
+        
+        timings: dict nhận thời gian (giây) của bước dựng cây HTML ('parse_html') và bước trích thông tin ('extract')
+        """
+        start = time.perf_counter()
+        if self.parser_backend == 'lxml':
+            document = sap_nhap_parser.parse_html(content)
+            parsed = time.perf_counter()
+            sap_nhap_info = sap_nhap_parser.parse_sap_nhap_info_lxml(document)
+        else:
+            soup = BeautifulSoup(content, 'html.parser')
+            parsed = time.perf_counter()
+            sap_nhap_info = self.parse_sap_nhap_info(soup)
+        
+        if timings is not None:
+            timings['parse_html'] = parsed - start
+            timings['extract'] = time.perf_counter() - parsed
+        return sap_nhap_info
     
     def parse_sap_nhap_info(self, soup):
-        """Phân tích thông tin sáp nhập từ trang"""
+        """Phân tích thông tin sáp nhập từ trang (một lượt qua các dòng, dừng ở bảng đầu tiên khớp)"""
         info = {
             'truoc_sap_nhap': '',
             'sau_sap_nhap': '',
@@ -194,51 +381,62 @@ class SapNhapCrawlerSimple:
         }
         
         # Tìm bảng có thông tin sáp nhập
-        tables = soup.find_all('table')
-        
-        for table in tables:
-            rows = table.find_all('tr')
+        for table in soup.find_all('table'):
+            columns = None  # (cột trước, cột sau) sau khi gặp dòng header
             
-            for i, row in enumerate(rows):
-                cells = row.find_all(['td', 'th'])
-                if len(cells) >= 2:
-                    cell_texts = [cell.get_text(strip=True).lower() for cell in cells]
-                    
-                    # Kiểm tra nếu có header trước/sau sáp nhập
-                    has_truoc = any('trước sáp nhập' in text for text in cell_texts)
-                    has_sau = any('sau sáp nhập' in text for text in cell_texts)
+            for row in table.find_all('tr'):
+                if columns is None:
+                    columns = self._find_sap_nhap_columns(row)
+                    continue
+                
+                # Chỉ lấy đủ số ô cần thiết của dòng dữ liệu
+                truoc_col, sau_col = columns
+                data_cells = row.find_all(['td', 'th'], limit=max(truoc_col, sau_col) + 1)
+                
+                if len(data_cells) > max(truoc_col, sau_col):
+                    truoc_text = html.unescape(data_cells[truoc_col].get_text(strip=True))
+                    sau_text = html.unescape(data_cells[sau_col].get_text(strip=True))
                     
-                    if has_truoc and has_sau:
-                        # Tìm vị trí cột
-                        truoc_col = next((j for j, text in enumerate(cell_texts) if 'trước sáp nhập' in text), 0)
-                        sau_col = next((j for j, text in enumerate(cell_texts) if 'sau sáp nhập' in text), 1)
-                        
-                        # Lấy dữ liệu từ các row tiếp theo
-                        for j in range(i + 1, len(rows)):
-                            data_row = rows[j]
-                            data_cells = data_row.find_all(['td', 'th'])
-                            
-                            if len(data_cells) > max(truoc_col, sau_col):
-                                truoc_text = html.unescape(data_cells[truoc_col].get_text(strip=True))
-                                sau_text = html.unescape(data_cells[sau_col].get_text(strip=True))
-                                
-                                if truoc_text and sau_text and len(truoc_text) > 5 and len(sau_text) > 5:
-                                    info['chi_tiet'].append({
-                                        'truoc': truoc_text,
-                                        'sau': sau_text
-                                    })
-                                    
-                                    # Lấy thông tin tổng quan (dòng đầu tiên)
-                                    if not info['truoc_sap_nhap']:
-                                        info['truoc_sap_nhap'] = truoc_text
-                                    if not info['sau_sap_nhap']:
-                                        info['sau_sap_nhap'] = sau_text
-                        break
+                    if truoc_text and sau_text and len(truoc_text) > 5 and len(sau_text) > 5:
+                        info['chi_tiet'].append({
+                            'truoc': truoc_text,
+                            'sau': sau_text
+                        })
+            
+            if columns is not None:
+                break  # Đã xử lý bảng sáp nhập
+        
+        # Lấy thông tin tổng quan (dòng đầu tiên)
+        if info['chi_tiet']:
+            info['truoc_sap_nhap'] = info['chi_tiet'][0]['truoc']
+            info['sau_sap_nhap'] = info['chi_tiet'][0]['sau']
         
         return info
     
+    def _find_sap_nhap_columns(self, row):
+        """Trả về (cột trước, cột sau) nếu row là header trước/sau sáp nhập, ngược lại None"""
+        # Lọc nhanh bằng text cả dòng trước khi tách từng ô
+        row_text = row.get_text(strip=True).lower()
+        if 'trước sáp nhập' not in row_text or 'sau sáp nhập' not in row_text:
+            return None
+        
+        cells = row.find_all(['td', 'th'])
+        if len(cells) < 2:
+            return None
+        
+        cell_texts = [cell.get_text(strip=True).lower() for cell in cells]
+        truoc_col = next((j for j, text in enumerate(cell_texts) if 'trước sáp nhập' in text), None)
+        sau_col = next((j for j, text in enumerate(cell_texts) if 'sau sáp nhập' in text), None)
+        
+        if truoc_col is None or sau_col is None:
+            return None
+        return truoc_col, sau_col
+    
     def log_error(self, error_type, url, message, ma_tinh=None, ma_xa=None, ten_tinh=None, ten_xa=None):
-        """Ghi log lỗi để có thể xử lý lại sau"""
+        """Ghi log lỗi để có thể xử lý lại sau
+        
+        Xã/phường đang trong vòng thử lại: lỗi được giữ riêng, chỉ vào error_log (và error_count) khi hết lượt
+        """
         error_entry = {
             'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             'error_type': error_type,
@@ -249,31 +447,194 @@ class SapNhapCrawlerSimple:
             'ten_tinh': ten_tinh,
             'ten_xa': ten_xa
         }
+        pending = self.pending_errors.get((ma_tinh, ma_xa))
+        if pending is not None:
+            pending.append(error_entry)
+            return
+        self._record_error(error_entry)
+    
+    def _record_error(self, error_entry):
         self.error_log.append(error_entry)
         
         # Cập nhật stats
+        error_type = error_entry['error_type']
         self.stats['error_count'] += 1
-        if error_type == 'rate_limit':
-            self.stats['rate_limit_count'] += 1
-        elif error_type == 'timeout':
+        if error_type == 'timeout':
             self.stats['timeout_count'] += 1
         elif error_type == 'connection_error':
             self.stats['connection_error_count'] += 1
 
-    def get_page_content(self, url, ma_tinh=None, ma_xa=None, ten_tinh=None, ten_xa=None):
-        """Lấy nội dung trang web với retry logic"""
-        max_retries = 3
+    def circuit_breaker(self, url):
+        """Circuit breaker của host trong url"""
+        host = urlsplit(url).netloc
+        breaker = self.breakers.get(host)
+        if breaker is None:
+            breaker = self.breakers[host] = CircuitBreaker(name=host, **self.breaker_options)
+        return breaker
+    
+    def circuit_downtime(self):
+        """Tổng số giây các host bị ngắt mạch"""
+        return sum(breaker.downtime() for breaker in self.breakers.values())
+    
+    def backoff_sleep(self, breaker, wait_time):
+        """Chờ trước khi thử lại tại chỗ; mạch đã ngắt thì breaker tự giữ request lại, không chờ thêm"""
+        if not breaker.is_open:
+            time.sleep(wait_time)
+    
+    async def backoff_sleep_async(self, breaker, wait_time):
+        if not breaker.is_open:
+            await asyncio.sleep(wait_time)
+    
+    def plan_retry(self, ma_tinh, ma_xa):
+        """Một lần thử xã/phường bị lỗi: trả về số giây chờ trước lần thử tiếp, None nếu đã hết lượt"""
+        key = (ma_tinh, ma_xa)
+        attempt = self.retry_attempts.get(key, 1)
+        if attempt >= self.retry_policy.max_attempts:
+            self.unit_finished(ma_tinh, ma_xa, ok=False)
+            return None
+        
+        self.retry_attempts[key] = attempt + 1
+        self.stats['retry_count'] += 1
+        return self.retry_policy.delay(attempt)
+    
+    def unit_started(self, ma_tinh, ma_xa):
+        """Bắt đầu thử một xã/phường: lỗi của nó chờ kết quả cuối (unit_finished) mới ghi vào error_log"""
+        self.pending_errors.setdefault((ma_tinh, ma_xa), [])
+    
+    def unit_finished(self, ma_tinh, ma_xa, ok=True):
+        """Một xã/phường đã xong (ok: bỏ lỗi của các lần thử trước) hoặc đã hết lượt thử (ghi lỗi vào error_log)"""
+        errors = self.pending_errors.pop((ma_tinh, ma_xa), [])
+        if ok and (ma_tinh, ma_xa) in self.retry_attempts:
+            self.stats['retry_success_count'] += 1
+        if not ok:
+            for error_entry in errors:
+                self._record_error(error_entry)
+        if self.progress is not None:
+            self.progress.unit_done(ok)
+    
+    def settle_pending_errors(self):
+        """Crawl dừng giữa chừng: lỗi của các xã/phường chưa có kết quả cuối vào error_log để retry lần sau"""
+        for ma_tinh, ma_xa in list(self.pending_errors):
+            self.unit_finished(ma_tinh, ma_xa, ok=False)
+    
+    def crawl_unit(self, retry_queue, ma_tinh, ma_xa, ten_tinh, ten_xa):
+        """Crawl một xã/phường (vòng tuần tự); lỗi thì đưa vào retry_queue nếu còn lượt"""
+        self.unit_started(ma_tinh, ma_xa)
+        xa_info = self.get_sap_nhap_details(ma_tinh, ma_xa, ten_tinh, ten_xa, max_retries=1)
+        if xa_info:
+            self.add_result(xa_info)
+            self.unit_finished(ma_tinh, ma_xa)
+            return True
+        
+        delay = self.plan_retry(ma_tinh, ma_xa)
+        if delay is not None:
+            retry_queue.push(delay, (ma_tinh, ma_xa, ten_tinh, ten_xa))
+        return False
+    
+    def run_due_retries(self, retry_queue):
+        """Crawl các xã/phường trong retry_queue đã đến hạn, trả về số bản ghi thu được"""
+        return sum(self.crawl_unit(retry_queue, *item) for item in retry_queue.pop_due())
+    
+    def drain_retries(self, retry_queue):
+        """Hết việc mới: chờ và crawl nốt các xã/phường còn trong retry_queue"""
+        added = 0
+        while retry_queue:
+            time.sleep(retry_queue.wait_time())
+            added += self.run_due_retries(retry_queue)
+        return added
+    
+    def handle_rate_limited(self, retry_after=None):
+        """Báo 429 cho rate limiter dùng chung - mọi request sẽ cùng giảm tốc"""
+        pause = self.rate_limiter.on_rate_limited(retry_after)
+        self.stats['rate_limit_count'] = self.rate_limiter.throttle_count
+        print(f"    ⏳ Rate limited. Giảm còn {self.rate_limiter.rate:.2f} req/s, tạm dừng {pause:.0f}s...")
+
+    def get_cached_page(self, url):
+        """Lấy trang từ cache trên đĩa nếu còn hạn"""
+        if self.page_cache is None:
+            return None
+        
+        content = self.page_cache.get(url)
+        if content is not None:
+            self.stats['cache_hit_count'] += 1
+        return content
+    
+    def put_cached_page(self, url, content, headers=None):
+        """Lưu trang vừa tải vào cache trên đĩa kèm ETag / Last-Modified"""
+        if self.page_cache is not None:
+            headers = headers or {}
+            self.page_cache.put(url, content, headers.get('ETag'), headers.get('Last-Modified'))
+    
+    def get_revalidation_headers(self, url):
+        """Header If-None-Match / If-Modified-Since cho trang đã cache nhưng hết hạn"""
+        if self.page_cache is None:
+            return {}
+        
+        etag, last_modified = self.page_cache.get_validators(url)
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        
+        if headers:
+            self.stats['revalidate_count'] += 1
+        return headers
+    
+    def handle_not_modified(self, url):
+        """Server trả 304: dùng lại trang trong cache và gia hạn TTL"""
+        content = self.page_cache.get_stale(url)
+        if content is not None:
+            self.page_cache.touch(url)
+            self.stats['not_modified_count'] += 1
+        return content
+
+    def get_page_content(self, url, ma_tinh=None, ma_xa=None, ten_tinh=None, ten_xa=None, max_retries=3):
+        """Lấy nội dung trang web với retry logic (max_retries=1: không thử lại tại chỗ, để hàng đợi thử lại lo)"""
         retry_delay = 2  # Start with 2 seconds
         
+        cached = self.get_cached_page(url)
+        if cached is not None:
+            return cached
+        
+        conditional_headers = self.get_revalidation_headers(url)
+        
+        with self.metrics.timer('page', ma_tinh):  # Cả lần lấy trang, kể cả retry
+            return self._fetch_page(url, conditional_headers, max_retries, retry_delay, ma_tinh, ma_xa, ten_tinh, ten_xa)
+    
+    def _fetch_page(self, url, conditional_headers, max_retries, retry_delay, ma_tinh, ma_xa, ten_tinh, ten_xa):
+        """Vòng retry của get_page_content"""
+        breaker = self.circuit_breaker(url)
+        
         for attempt in range(max_retries):
             try:
-                response = self.session.get(url, timeout=15)
+                with self.metrics.timer('circuit_wait', ma_tinh):
+                    breaker.before_request()
+                with self.metrics.timer('rate_wait', ma_tinh):
+                    self.rate_limiter.acquire()
+                start = time.perf_counter()
+                response = self.session.get(url, timeout=self.request_timeout, headers=conditional_headers)
+                # Server có trả lời (kể cả 304 / 429 / 4xx) là host còn sống; 5xx tính là lỗi
+                if response.status_code >= 500:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                # requests không tách DNS/connect: elapsed là tới khi nhận xong header (TTFB), phần còn lại là tải body
+                ttfb = response.elapsed.total_seconds()
+                self.metrics.observe('ttfb', ttfb, ma_tinh)
+                self.metrics.observe('download', max(0.0, time.perf_counter() - start - ttfb), ma_tinh)
+                
+                if response.status_code == 304:  # Not Modified
+                    self.rate_limiter.on_success()
+                    content = self.handle_not_modified(url)
+                    if content is not None:
+                        return content
+                    # Trang cũ đã bị xóa khỏi cache: tải lại đầy đủ ngay, lần thử này chưa tính
+                    return self._fetch_page(url, {}, max_retries - attempt, retry_delay, ma_tinh, ma_xa, ten_tinh, ten_xa)
                 
                 if response.status_code == 429:  # Too Many Requests
+                    self.handle_rate_limited(response.headers.get('Retry-After'))
                     if attempt < max_retries - 1:
-                        wait_time = retry_delay * (2 ** attempt)  # Exponential backoff
-                        print(f"    ⏳ Rate limited. Chờ {wait_time}s rồi thử lại...")
-                        time.sleep(wait_time)
                         continue
                     else:
                         print(f"    ❌ Bị rate limit sau {max_retries} lần thử")
@@ -281,14 +642,17 @@ class SapNhapCrawlerSimple:
                         return None
                 
                 response.raise_for_status()
+                self.rate_limiter.on_success()
                 response.encoding = 'utf-8'
+                self.put_cached_page(url, response.text, response.headers)
                 return response.text
                 
             except requests.exceptions.Timeout as e:
+                breaker.record_failure()
                 if attempt < max_retries - 1:
                     wait_time = retry_delay * (2 ** attempt)
                     print(f"    ⏳ Timeout, chờ {wait_time}s rồi thử lại...")
-                    time.sleep(wait_time)
+                    self.backoff_sleep(breaker, wait_time)
                     continue
                 else:
                     print(f"    ❌ Timeout sau {max_retries} lần thử")
@@ -296,10 +660,11 @@ class SapNhapCrawlerSimple:
                     return None
                     
             except requests.exceptions.ConnectionError as e:
+                breaker.record_failure()
                 if attempt < max_retries - 1:
                     wait_time = retry_delay * (2 ** attempt)
                     print(f"    ⏳ Lỗi kết nối, chờ {wait_time}s rồi thử lại...")
-                    time.sleep(wait_time)
+                    self.backoff_sleep(breaker, wait_time)
                     continue
                 else:
                     print(f"    ❌ Lỗi kết nối sau {max_retries} lần thử")
@@ -307,10 +672,12 @@ class SapNhapCrawlerSimple:
                     return None
                     
             except requests.exceptions.RequestException as e:
+                if e.response is None:  # Lỗi HTTP status đã được tính lúc nhận response
+                    breaker.record_failure()
                 if attempt < max_retries - 1:
                     wait_time = retry_delay * (2 ** attempt)
                     print(f"    ⏳ Lỗi request, chờ {wait_time}s rồi thử lại...")
-                    time.sleep(wait_time)
+                    self.backoff_sleep(breaker, wait_time)
                     continue
                 else:
                     print(f"    ❌ Lỗi request sau {max_retries} lần thử: {e}")
@@ -319,34 +686,62 @@ class SapNhapCrawlerSimple:
         
         return None
     
-    def get_sap_nhap_details(self, ma_tinh, ma_xa=None, ten_tinh='', ten_xa=''):
-        """Lấy chi tiết thông tin sáp nhập"""
+    def build_details_url(self, ma_tinh, ma_xa=None):
+        """Tạo URL trang chi tiết sáp nhập của tỉnh hoặc xã/phường"""
         if ma_xa:
-            url = f"{self.search_url}?MaTinh={ma_tinh}&MaXa={ma_xa}"
-            cap_hanh_chinh = 'Xã/Phường'
-        else:
-            url = f"{self.search_url}?MaTinh={ma_tinh}"
-            cap_hanh_chinh = 'Tỉnh/Thành phố'
+            return f"{self.search_url}?MaTinh={ma_tinh}&MaXa={ma_xa}"
+        return f"{self.search_url}?MaTinh={ma_tinh}"
+    
+    def get_sap_nhap_details(self, ma_tinh, ma_xa=None, ten_tinh='', ten_xa='', max_retries=3):
+        """Lấy chi tiết thông tin sáp nhập"""
+        url = self.build_details_url(ma_tinh, ma_xa)
         
-        print(f"  📄 Đang lấy: {ten_xa or ten_tinh}")
+        if self.verbose:
+            print(f"  📄 Đang lấy: {ten_xa or ten_tinh}")
         
         self.stats['total_processed'] += 1
         
-        content = self.get_page_content(url, ma_tinh, ma_xa, ten_tinh, ten_xa)
+        content = self.get_page_content(url, ma_tinh, ma_xa, ten_tinh, ten_xa, max_retries=max_retries)
         if not content:
             return None
         
-        soup = BeautifulSoup(content, 'html.parser')
-        sap_nhap_info = self.parse_sap_nhap_info(soup)
+        return self.build_details_result(content, url, ma_tinh, ma_xa, ten_tinh, ten_xa)
+    
+    def get_reused_parse(self, url, content):
+        """Trang không đổi (304 hoặc cache còn hạn): trả về kết quả parse lần trước"""
+        if self.page_cache is None:
+            return None
+        
+        sap_nhap_info = self.page_cache.get_parsed(url, content)
+        if sap_nhap_info is not None:
+            self.stats['parse_reused_count'] += 1
+        return sap_nhap_info
+    
+    def remember_parse(self, url, content, sap_nhap_info):
+        """Lưu kết quả parse để lần crawl sau dùng lại nếu trang không đổi"""
+        if self.page_cache is not None:
+            self.page_cache.put_parsed(url, content, sap_nhap_info)
+    
+    def build_details_result(self, content, url, ma_tinh, ma_xa=None, ten_tinh='', ten_xa='', sap_nhap_info=None):
+        """Phân tích HTML trang chi tiết thành bản ghi kết quả (bỏ qua parse nếu đã có sap_nhap_info)"""
+        cap_hanh_chinh = 'Xã/Phường' if ma_xa else 'Tỉnh/Thành phố'
+        
+        if sap_nhap_info is None:
+            sap_nhap_info = self.get_reused_parse(url, content)
+        if sap_nhap_info is None:
+            timings = {}
+            sap_nhap_info = self.parse_details_html(content, timings)
+            self.metrics.observe_many(timings, ma_tinh)
+            self.remember_parse(url, content, sap_nhap_info)
         
         # Kiểm tra xem có thông tin không
         has_info = bool(sap_nhap_info['truoc_sap_nhap'] or sap_nhap_info['sau_sap_nhap'] or sap_nhap_info['chi_tiet'])
         
         if has_info:
-            print(f"    ✅ Có thông tin sáp nhập!")
             self.stats['success_count'] += 1
-        else:
-            print(f"    ⚪ Không có thông tin sáp nhập")
+        
+        if self.verbose:
+            print("    ✅ Có thông tin sáp nhập!" if has_info else "    ⚪ Không có thông tin sáp nhập")
         
         result = {
             'ma_tinh': ma_tinh,
@@ -383,50 +778,382 @@ class SapNhapCrawlerSimple:
         print(f"\n🏛️  Sẽ xử lý {len(provinces)} tỉnh")
         
         total_processed = 0
+        retry_queue = RetryQueue()
+        progress = self.start_progress(len(provinces))
         
-        for i, province in enumerate(provinces, 1):
-            ma_tinh = province['ma_tinh']
-            ten_tinh = province['ten_tinh']
+        try:
+            for i, province in enumerate(provinces, 1):
+                ma_tinh = province['ma_tinh']
+                ten_tinh = province['ten_tinh']
+                
+                print(f"\n📍 [{i}/{len(provinces)}] Tỉnh: {ten_tinh} (Mã: {ma_tinh})")
+                
+                # Lấy danh sách xã/phường
+                xa_phuong_list = self.get_xa_phuong_from_province(ma_tinh, ten_tinh)
+                pending = [xa for xa in xa_phuong_list if not self.is_completed(ma_tinh, xa['ma_xa'])]
+                progress.discover(len(pending), skipped=len(xa_phuong_list) - len(pending))
+                
+                if not xa_phuong_list:
+                    print(f"  ⚠️  Không có xã/phường nào cho tỉnh {ten_tinh}")
+                    continue
+                
+                # Xử lý từng xã/phường (tiến độ do ProgressReporter in định kỳ),
+                # xen với các xã/phường lỗi đã đến hạn thử lại
+                for xa in pending:
+                    total_processed += self.run_due_retries(retry_queue)
+                    total_processed += self.crawl_unit(retry_queue, ma_tinh, xa['ma_xa'], ten_tinh, xa['ten_xa'])
+                
+                print(f"  ✅ Hoàn thành tỉnh {ten_tinh}: {len(xa_phuong_list)} xã/phường "
+                      f"(tốc độ hiện tại {self.rate_limiter.rate:.2f} req/s)")
+            
+            if retry_queue:
+                print(f"\n🔁 Còn {len(retry_queue)} xã/phường chờ thử lại...")
+            total_processed += self.drain_retries(retry_queue)
+        finally:
+            self.settle_pending_errors()
+            self.stop_progress()
+        
+        print(f"\n🎉 AUTO-DISCOVERY HOÀN THÀNH!")
+        print(f"📊 Tổng cộng xử lý: {total_processed} bản ghi từ {len(provinces)} tỉnh")
+        
+        return self.data
+
+    def crawl_all_autodiscovery_async(self, max_provinces=None, concurrency=8, parse_workers=None):
+        """Auto-discovery song song: chạy tối đa `concurrency` request cùng lúc
+        
+        parse_workers: số process parse HTML (mặc định = số CPU, 0 = parse ngay trong event loop)
+        """
+        if aiohttp is None:
+            print("❌ Chưa cài aiohttp (pip install aiohttp). Chạy chế độ tuần tự.")
+            return self.crawl_all_autodiscovery(max_provinces=max_provinces)
+        
+        if parse_workers is None:
+            parse_workers = os.cpu_count() or 1
+        
+        if parse_workers <= 0:
+            return asyncio.run(self._crawl_all_autodiscovery_async(max_provinces, concurrency, 0))
+        
+        self.parse_pool = ProcessPoolExecutor(max_workers=parse_workers)
+        try:
+            return asyncio.run(self._crawl_all_autodiscovery_async(max_provinces, concurrency, parse_workers))
+        finally:
+            self.parse_pool.shutdown()
+            self.parse_pool = None
+    
+    def restart_parse_pool(self, broken_pool):
+        """Process parse chết (BrokenProcessPool): tạo pool mới, một lần cho mỗi pool hỏng"""
+        if self.parse_pool is not broken_pool:
+            return  # Task parse khác đã tạo lại rồi
+        print("⚠️  Parse pool bị hỏng, tạo lại pool mới")
+        broken_pool.shutdown(wait=False)
+        self.parse_pool = ProcessPoolExecutor(max_workers=broken_pool._max_workers)
+    
+    async def _crawl_all_autodiscovery_async(self, max_provinces, concurrency, parse_workers):
+        """Điều phối crawl async theo pipeline:
+        producer tìm xã/phường -> worker tải HTML -> queue giới hạn -> stage parse (process pool)
+        """
+        print(f"\n⚡ === BẮT ĐẦU AUTO-DISCOVERY ASYNC ({concurrency} luồng tải, {parse_workers} process parse) ===")
+        start_time = time.time()
+        
+        async with self.create_async_session(concurrency) as http:
+            # Bước 1: Lấy danh sách tỉnh
+            print("🌐 Đang lấy danh sách tỉnh từ trang web...")
+            content = await self.async_get_page_content(http, self.search_url)
+            provinces = self.parse_provinces(content) if content else []
             
-            print(f"\n📍 [{i}/{len(provinces)}] Tỉnh: {ten_tinh} (Mã: {ma_tinh})")
+            if not provinces:
+                print("❌ Không tìm thấy tỉnh nào.")
+                return self.data
             
-            # Lấy danh sách xã/phường
-            xa_phuong_list = self.get_xa_phuong_from_province(ma_tinh, ten_tinh)
+            if max_provinces and max_provinces < len(provinces):
+                provinces = provinces[:max_provinces]
+                print(f"⚠️  Giới hạn xử lý {max_provinces} tỉnh đầu tiên")
             
-            if not xa_phuong_list:
-                print(f"  ⚠️  Không có xã/phường nào cho tỉnh {ten_tinh}")
-                continue
+            print(f"\n🏛️  Sẽ xử lý {len(provinces)} tỉnh")
+            progress = self.start_progress(len(provinces))
             
-            print(f"  📊 Tìm thấy {len(xa_phuong_list)} xã/phường")
+            # Queue có giới hạn để producer không chạy quá xa worker
+            queue = asyncio.Queue(maxsize=concurrency * 4)
+            # Mỗi process parse có 2 job đang chạy/chờ để pool luôn có việc
+            parse_tasks = max(1, parse_workers * 2)
+            # Queue HTML chờ parse: đầy thì worker tải phải chờ (backpressure)
+            parse_queue = asyncio.Queue(maxsize=parse_tasks * 2)
+            retry_tasks = set()  # Các xã/phường lỗi đang chờ tới hạn để vào lại queue
+            workers = [
+                asyncio.create_task(self._async_details_worker(http, queue, parse_queue, retry_tasks))
+                for _ in range(concurrency)
+            ]
+            parsers = [
+                asyncio.create_task(self._async_parse_worker(queue, parse_queue, retry_tasks))
+                for _ in range(parse_tasks)
+            ]
             
-            # Xử lý từng xã/phường
-            for j, xa in enumerate(xa_phuong_list, 1):
-                ma_xa = xa['ma_xa']
-                ten_xa = xa['ten_xa']
+            try:
+                # Bước 2: Tìm xã/phường từng tỉnh và đẩy vào queue
+                for i, province in enumerate(provinces, 1):
+                    ma_tinh = province['ma_tinh']
+                    ten_tinh = province['ten_tinh']
+                    
+                    print(f"\n📍 [{i}/{len(provinces)}] Tỉnh: {ten_tinh} (Mã: {ma_tinh})")
+                    xa_phuong_list = await self.async_get_xa_phuong_from_province(http, ma_tinh, ten_tinh)
+                    pending = [xa for xa in xa_phuong_list if not self.is_completed(ma_tinh, xa['ma_xa'])]
+                    progress.discover(len(pending), skipped=len(xa_phuong_list) - len(pending))
+                    
+                    if not xa_phuong_list:
+                        print(f"  ⚠️  Không có xã/phường nào cho tỉnh {ten_tinh}")
+                        continue
+                    
+                    for xa in pending:
+                        await queue.put((ma_tinh, xa['ma_xa'], ten_tinh, xa['ten_xa']))
+                
+                # Chờ cả hai stage xong và không còn xã/phường nào chờ thử lại
+                # (stage parse lỗi cũng đưa xã/phường vào lại queue tải)
+                while True:
+                    await queue.join()
+                    await parse_queue.join()
+                    if not retry_tasks:
+                        break
+                    await asyncio.wait(set(retry_tasks))
+                
+                # Báo cho các worker dừng lại, sau đó tới stage parse
+                for _ in workers:
+                    await queue.put(None)
+                await asyncio.gather(*workers)
+                
+                for _ in parsers:
+                    await parse_queue.put(None)
+                await asyncio.gather(*parsers)
+            finally:
+                self.settle_pending_errors()
+                self.stop_progress()
+        
+        elapsed = time.time() - start_time
+        print("\n🎉 AUTO-DISCOVERY ASYNC HOÀN THÀNH!")
+        print(f"📊 Tổng cộng: {self.result_count} bản ghi từ {len(provinces)} tỉnh trong {elapsed:.0f}s")
+        
+        return self.data
+    
+    async def _async_details_worker(self, http, queue, parse_queue, retry_tasks):
+        """Stage tải: lấy HTML cho từng (ma_tinh, ma_xa) trong queue rồi chuyển sang stage parse
+        
+        Lỗi bất ngờ khi tải (giải mã trang, ghi cache...) không làm dừng worker: xã/phường đó
+        được ghi lỗi và đưa vào hàng đợi thử lại
+        """
+        while True:
+            item = await queue.get()
+            try:
+                if item is None:
+                    return
+                
+                ma_tinh, ma_xa, ten_tinh, ten_xa = item
+                url = self.build_details_url(ma_tinh, ma_xa)
+                self.unit_started(ma_tinh, ma_xa)
                 
-                if j <= 3 or j % 10 == 0:  # Hiển thị progress
-                    print(f"    [{j}/{len(xa_phuong_list)}] {ten_xa}")
+                if self.verbose:
+                    print(f"  📄 Đang lấy: {ten_xa or ten_tinh}")
+                self.stats['total_processed'] += 1
                 
-                # Lấy thông tin sáp nhập
-                xa_info = self.get_sap_nhap_details(ma_tinh, ma_xa, ten_tinh, ten_xa)
+                try:
+                    content = await self.async_get_page_content(http, url, ma_tinh, ma_xa, ten_tinh, ten_xa, max_retries=1)
+                except Exception as e:
+                    print(f"    ❌ Lỗi tải {ten_xa or ten_tinh}: {e!r}")
+                    self.log_error('request_error', url, repr(e), ma_tinh, ma_xa, ten_tinh, ten_xa)
+                    content = None
+                if content:
+                    await parse_queue.put((item, url, content))
+                else:
+                    self._async_retry_later(queue, item, retry_tasks)
+            finally:
+                queue.task_done()
+    
+    def _async_retry_later(self, queue, item, retry_tasks):
+        """Đưa xã/phường lỗi vào lại queue sau thời gian chờ (nếu còn lượt); worker rảnh tay làm việc khác"""
+        delay = self.plan_retry(item[0], item[1])
+        if delay is None:
+            return
+        
+        async def requeue():
+            await asyncio.sleep(delay)
+            await queue.put(item)
+        
+        task = asyncio.create_task(requeue())
+        retry_tasks.add(task)
+        task.add_done_callback(retry_tasks.discard)
+    
+    async def _async_parse_worker(self, queue, parse_queue, retry_tasks):
+        """Stage parse: parse HTML trong process pool (hoặc ngay tại chỗ nếu không có pool)
+        
+        Lỗi parse / ghi kết quả của một trang không làm dừng stage: xã/phường đó được ghi lỗi
+        và đưa vào hàng đợi thử lại như lỗi tải trang
+        """
+        while True:
+            job = await parse_queue.get()
+            try:
+                if job is None:
+                    return
                 
-                if xa_info:
-                    self.data.append(xa_info)
-                    total_processed += 1
+                item, url, content = job
+                ma_tinh, ma_xa, ten_tinh, ten_xa = item
+                try:
+                    sap_nhap_info = await self._async_parse_details(url, content, ma_tinh)
+                    result = self.build_details_result(content, url, ma_tinh, ma_xa, ten_tinh, ten_xa,
+                                                       sap_nhap_info=sap_nhap_info)
+                    self.add_result(result)
+                except Exception as e:
+                    print(f"    ❌ Lỗi xử lý {ten_xa or ten_tinh}: {e!r}")
+                    self.log_error('parse_error', url, repr(e), ma_tinh, ma_xa, ten_tinh, ten_xa)
+                    self._async_retry_later(queue, item, retry_tasks)
+                    continue
+                self.unit_finished(ma_tinh, ma_xa)
+            finally:
+                parse_queue.task_done()
+    
+    async def _async_parse_details(self, url, content, ma_tinh):
+        """Parse trang chi tiết (dùng lại kết quả cũ nếu trang không đổi); pool hỏng thì tạo lại và thử thêm một lần"""
+        sap_nhap_info = self.get_reused_parse(url, content)
+        if sap_nhap_info is not None:
+            return sap_nhap_info
+        
+        if self.parse_pool is None:
+            timings = {}
+            sap_nhap_info = self.parse_details_html(content, timings)
+        else:
+            loop = asyncio.get_running_loop()
+            pool = self.parse_pool
+            try:
+                sap_nhap_info, timings = await loop.run_in_executor(
+                    pool, parse_details_in_worker, content, self.parser_backend)
+            except BrokenProcessPool:
+                self.restart_parse_pool(pool)
+                sap_nhap_info, timings = await loop.run_in_executor(
+                    self.parse_pool, parse_details_in_worker, content, self.parser_backend)
+        
+        self.metrics.observe_many(timings, ma_tinh)
+        self.remember_parse(url, content, sap_nhap_info)
+        return sap_nhap_info
+    
+    def create_async_session(self, concurrency=8):
+        """Tạo aiohttp session dùng chung header với requests session"""
+        connector = aiohttp.TCPConnector(limit=concurrency + 1, ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(total=self.request_timeout)
+        return aiohttp.ClientSession(
+            headers=dict(self.session.headers),
+            connector=connector,
+            timeout=timeout,
+            trace_configs=[aiohttp_trace_config(self.metrics)]  # Đo DNS / connect / TTFB
+        )
+    
+    async def async_get_xa_phuong_from_province(self, http, ma_tinh, ten_tinh=''):
+        """Bản async của get_xa_phuong_from_province"""
+        if ma_tinh in self.xa_phuong_cache:
+            return self.xa_phuong_cache[ma_tinh]
+        
+        url = f"{self.search_url}?MaTinh={ma_tinh}"
+        content = await self.async_get_page_content(http, url, ma_tinh=ma_tinh, ten_tinh=ten_tinh)
+        
+        if not content:
+            return []
+        
+        xa_phuong_list = self.parse_xa_phuong_list(content, ma_tinh)
+        print(f"    📍 Tìm thấy {len(xa_phuong_list)} xã/phường")
+        
+        self.xa_phuong_cache[ma_tinh] = xa_phuong_list
+        return xa_phuong_list
+    
+    async def async_get_page_content(self, http, url, ma_tinh=None, ma_xa=None, ten_tinh=None, ten_xa=None, max_retries=3):
+        """Bản async của get_page_content với cùng retry logic"""
+        retry_delay = 2
+        
+        cached = self.get_cached_page(url)
+        if cached is not None:
+            return cached
+        
+        conditional_headers = self.get_revalidation_headers(url)
+        
+        with self.metrics.timer('page', ma_tinh):
+            return await self._async_fetch_page(http, url, conditional_headers, max_retries, retry_delay,
+                                                ma_tinh, ma_xa, ten_tinh, ten_xa)
+    
+    async def _async_fetch_page(self, http, url, conditional_headers, max_retries, retry_delay,
+                                ma_tinh, ma_xa, ten_tinh, ten_xa):
+        """Vòng retry của async_get_page_content"""
+        trace_context = {'ma_tinh': ma_tinh}
+        breaker = self.circuit_breaker(url)
+        
+        for attempt in range(max_retries):
+            wait_time = retry_delay * (2 ** attempt)
+            last_try = attempt == max_retries - 1
+            
+            try:
+                with self.metrics.timer('circuit_wait', ma_tinh):
+                    await breaker.before_request_async()
+                with self.metrics.timer('rate_wait', ma_tinh):
+                    await self.rate_limiter.acquire_async()
+                async with http.get(url, headers=conditional_headers, trace_request_ctx=trace_context) as response:
+                    # 2xx chỉ tính thành công khi đã tải xong body (timeout có thể xảy ra lúc tải)
+                    if response.status >= 500:
+                        breaker.record_failure()
+                    elif response.status >= 300:
+                        breaker.record_success()
+                    
+                    if response.status == 304:
+                        self.rate_limiter.on_success()
+                        content = self.handle_not_modified(url)
+                        if content is not None:
+                            return content
+                        # Trang cũ đã bị xóa khỏi cache: trả kết nối rồi tải lại đầy đủ ngay, lần thử này chưa tính
+                        response.release()
+                        return await self._async_fetch_page(http, url, {}, max_retries - attempt, retry_delay,
+                                                            ma_tinh, ma_xa, ten_tinh, ten_xa)
+                    
+                    if response.status == 429:
+                        self.handle_rate_limited(response.headers.get('Retry-After'))
+                        if not last_try:
+                            continue
+                        print(f"    ❌ Bị rate limit sau {max_retries} lần thử")
+                        self.log_error('rate_limit', url, 'Too Many Requests after retries', ma_tinh, ma_xa, ten_tinh, ten_xa)
+                        return None
+                    
+                    response.raise_for_status()
+                    self.rate_limiter.on_success()
+                    with self.metrics.timer('download', ma_tinh):
+                        content = await response.text(encoding='utf-8')
+                    breaker.record_success()
+                    self.put_cached_page(url, content, response.headers)
+                    return content
                 
-                # Delay để tránh bị block - tăng delay cho auto-discovery
-                time.sleep(1.2)  # Tăng từ 0.6s lên 1.2s
+            except asyncio.TimeoutError as e:
+                breaker.record_failure()
+                if not last_try:
+                    print(f"    ⏳ Timeout, chờ {wait_time}s rồi thử lại...")
+                    await self.backoff_sleep_async(breaker, wait_time)
+                    continue
+                print(f"    ❌ Timeout sau {max_retries} lần thử")
+                self.log_error('timeout', url, str(e) or 'Timeout', ma_tinh, ma_xa, ten_tinh, ten_xa)
+                return None
             
-            print(f"  ✅ Hoàn thành tỉnh {ten_tinh}: {len(xa_phuong_list)} xã/phường")
+            except aiohttp.ClientConnectionError as e:
+                breaker.record_failure()
+                if not last_try:
+                    print(f"    ⏳ Lỗi kết nối, chờ {wait_time}s rồi thử lại...")
+                    await self.backoff_sleep_async(breaker, wait_time)
+                    continue
+                print(f"    ❌ Lỗi kết nối sau {max_retries} lần thử")
+                self.log_error('connection_error', url, str(e), ma_tinh, ma_xa, ten_tinh, ten_xa)
+                return None
             
-            # Delay giữa các tỉnh - tăng delay
-            if i < len(provinces):
-                time.sleep(3)  # Tăng từ 1.5s lên 3s
-        
-        print(f"\n🎉 AUTO-DISCOVERY HOÀN THÀNH!")
-        print(f"📊 Tổng cộng xử lý: {total_processed} bản ghi từ {len(provinces)} tỉnh")
+            except aiohttp.ClientError as e:
+                if not isinstance(e, aiohttp.ClientResponseError):  # Lỗi HTTP status đã được tính ở trên
+                    breaker.record_failure()
+                if not last_try:
+                    print(f"    ⏳ Lỗi request, chờ {wait_time}s rồi thử lại...")
+                    await self.backoff_sleep_async(breaker, wait_time)
+                    continue
+                print(f"    ❌ Lỗi request sau {max_retries} lần thử: {e}")
+                self.log_error('request_error', url, str(e), ma_tinh, ma_xa, ten_tinh, ten_xa)
+                return None
         
-        return self.data
+        return None
 
     def save_error_log(self, filename=None):
         """Lưu danh sách lỗi ra file để xử lý lại"""
@@ -471,47 +1198,42 @@ class SapNhapCrawlerSimple:
             return csv_filename
 
     def retry_failed_requests(self):
-        """Thử lại các request bị lỗi"""
+        """Thử lại các xã/phường còn trong error_log (vd. nạp từ lần crawl trước) qua hàng đợi thử lại
+        
+        Mỗi xã/phường có lại đủ lượt thử của retry_policy, lần thử sau chờ theo backoff + jitter
+        """
         if not self.error_log:
             print("📋 Không có lỗi nào để retry")
             return []
         
-        print(f"\n🔄 === BẮT ĐẦU RETRY {len(self.error_log)} LỖI ===")
-        
-        retry_data = []
-        success_retry = 0
-        
-        # Lấy danh sách unique URLs cần retry
+        # Lấy danh sách unique (ma_tinh, ma_xa) cần retry
         unique_errors = {}
         for error in self.error_log:
             key = (error['ma_tinh'], error['ma_xa'])
             if key not in unique_errors:
                 unique_errors[key] = error
         
-        for i, (key, error) in enumerate(unique_errors.items(), 1):
-            ma_tinh = error['ma_tinh']
-            ma_xa = error['ma_xa']
+        print(f"\n🔄 === BẮT ĐẦU RETRY {len(unique_errors)} XÃ/PHƯỜNG LỖI ===")
+        
+        self.error_log = []
+        retry_queue = RetryQueue()
+        first_record = len(self.data)
+        
+        for (ma_tinh, ma_xa), error in unique_errors.items():
+            self.retry_attempts.pop((ma_tinh, ma_xa), None)
             ten_tinh = error['ten_tinh'] or f"Tỉnh {ma_tinh}"
             ten_xa = error['ten_xa'] or f"Xã {ma_xa}"
-            
-            print(f"\n🔄 [{i}/{len(unique_errors)}] Retry: {ten_xa}")
-            
-            # Thử lại với delay lớn hơn
-            time.sleep(2)
-            
-            xa_info = self.get_sap_nhap_details(ma_tinh, ma_xa, ten_tinh, ten_xa)
-            
-            if xa_info:
-                retry_data.append(xa_info)
-                success_retry += 1
-                print(f"    ✅ Retry thành công!")
-            else:
-                print(f"    ❌ Retry vẫn lỗi")
+            retry_queue.push(0, (ma_tinh, ma_xa, ten_tinh, ten_xa))
+        
+        try:
+            success_retry = self.drain_retries(retry_queue)
+        finally:
+            self.settle_pending_errors()
         
         print(f"\n🎉 RETRY HOÀN THÀNH!")
         print(f"📊 Thành công: {success_retry}/{len(unique_errors)}")
         
-        return retry_data
+        return self.data[first_record:]
 
     def print_statistics(self):
         """In thống kê chi tiết"""
@@ -519,6 +1241,29 @@ class SapNhapCrawlerSimple:
         print(f"📈 Tổng số request: {self.stats['total_processed']}")
         print(f"✅ Thành công: {self.stats['success_count']}")
         print(f"❌ Lỗi: {self.stats['error_count']}")
+        print(f"🚦 Tốc độ cuối: {self.rate_limiter.rate:.2f} req/s, bị 429: {self.stats['rate_limit_count']} lần")
+        print(f"💽 Lấy từ cache: {self.stats['cache_hit_count']}")
+        
+        if self.stats['revalidate_count'] > 0:
+            hit_rate = (self.stats['not_modified_count'] / self.stats['revalidate_count']) * 100
+            print(f"🔁 Revalidate: {self.stats['revalidate_count']} request, "
+                  f"304 Not Modified: {self.stats['not_modified_count']} ({hit_rate:.1f}%)")
+            print(f"♻️  Dùng lại kết quả parse: {self.stats['parse_reused_count']}")
+        
+        if self.stats['retry_count'] > 0:
+            print(f"🔁 Thử lại trong lúc crawl: {self.stats['retry_count']} lần, "
+                  f"thành công sau khi thử lại: {self.stats['retry_success_count']}")
+        
+        for breaker in self.breakers.values():
+            if breaker.trip_count:
+                print(f"🔌 Ngắt mạch {breaker.name}: {breaker.trip_count} lần, "
+                      f"tổng thời gian tạm dừng {breaker.downtime():.0f}s")
+        
+        stage_rows = self.metrics.summary_rows()
+        if stage_rows:
+            print("\n⏱️  Thời gian từng bước:")
+            for stage, count, p50, p99, total in stage_rows:
+                print(f"  {stage:12s}: {count:6d} lần, p50 {p50 * 1000:8.1f} ms, p99 {p99 * 1000:8.1f} ms, tổng {total:8.1f}s")
         
         if self.stats['error_count'] > 0:
             print(f"\n📋 Chi tiết lỗi:")
@@ -545,11 +1290,14 @@ class SapNhapCrawlerSimple:
             ma_tinh = province['ma_tinh']
             ten_tinh = province['ten_tinh']
             
+            if self.is_completed(ma_tinh):
+                continue
+            
             print(f"\n📍 {ten_tinh} (Mã: {ma_tinh})")
             tinh_info = self.get_sap_nhap_details(ma_tinh, ten_tinh=ten_tinh)
             
             if tinh_info:
-                self.data.append(tinh_info)
+                self.add_result(tinh_info)
         
         # Lấy thông tin cấp xã/phường
         print(f"\n🏘️  === THÔNG TIN CẤP XÃ/PHƯỜNG ===")
@@ -562,18 +1310,55 @@ class SapNhapCrawlerSimple:
             ma_xa = item['ma_xa']
             ten_xa = item['ten_xa']
             
+            if self.is_completed(ma_tinh, ma_xa):
+                continue
+            
             print(f"\n📍 [{i}/{len(items_to_process)}] {ten_xa}")
             
             xa_info = self.get_sap_nhap_details(ma_tinh, ma_xa, ten_tinh, ten_xa)
             
             if xa_info:
-                self.data.append(xa_info)
-            
-            time.sleep(0.5)  # Delay để tránh bị block
+                self.add_result(xa_info)
         
-        print(f"\n🎉 Hoàn thành! Tổng cộng: {len(self.data)} bản ghi")
+        print(f"\n🎉 Hoàn thành! Tổng cộng: {self.result_count} bản ghi")
         return self.data
     
+    def crawl_stats_rows(self):
+        """Các dòng thống kê crawling cho sheet Thống kê"""
+        stats = []
+        stats.append({'Loại': 'Tổng request', 'Giá trị': '', 'Số lượng': self.stats['total_processed']})
+        stats.append({'Loại': 'Request thành công', 'Giá trị': '', 'Số lượng': self.stats['success_count']})
+        stats.append({'Loại': 'Request lỗi', 'Giá trị': '', 'Số lượng': self.stats['error_count']})
+        
+        if self.stats['total_processed'] > 0:
+            success_rate = (self.stats['success_count'] / self.stats['total_processed']) * 100
+            stats.append({'Loại': 'Tỷ lệ thành công (%)', 'Giá trị': '', 'Số lượng': round(success_rate, 1)})
+        
+        # Thống kê cache / conditional GET
+        stats.append({'Loại': 'Lấy từ cache', 'Giá trị': '', 'Số lượng': self.stats['cache_hit_count']})
+        if self.stats['revalidate_count'] > 0:
+            hit_rate = (self.stats['not_modified_count'] / self.stats['revalidate_count']) * 100
+            stats.append({'Loại': 'Conditional GET', 'Giá trị': '', 'Số lượng': self.stats['revalidate_count']})
+            stats.append({'Loại': '304 Not Modified', 'Giá trị': '', 'Số lượng': self.stats['not_modified_count']})
+            stats.append({'Loại': 'Tỷ lệ 304 (%)', 'Giá trị': '', 'Số lượng': round(hit_rate, 1)})
+        
+        # Chi tiết lỗi
+        if self.stats['retry_count'] > 0:
+            stats.append({'Loại': 'Thử lại trong lúc crawl', 'Giá trị': '', 'Số lượng': self.stats['retry_count']})
+            stats.append({'Loại': 'Thành công sau khi thử lại', 'Giá trị': '', 'Số lượng': self.stats['retry_success_count']})
+        
+        trips = sum(breaker.trip_count for breaker in self.breakers.values())
+        if trips:
+            stats.append({'Loại': 'Số lần ngắt mạch', 'Giá trị': '', 'Số lượng': trips})
+            stats.append({'Loại': 'Thời gian ngắt mạch (giây)', 'Giá trị': '', 'Số lượng': round(self.circuit_downtime())})
+        
+        if self.stats['error_count'] > 0:
+            stats.append({'Loại': 'Rate limit errors', 'Giá trị': '', 'Số lượng': self.stats['rate_limit_count']})
+            stats.append({'Loại': 'Timeout errors', 'Giá trị': '', 'Số lượng': self.stats['timeout_count']})
+            stats.append({'Loại': 'Connection errors', 'Giá trị': '', 'Số lượng': self.stats['connection_error_count']})
+        
+        return stats
+    
     def save_to_excel(self, filename=None):
         """Lưu dữ liệu ra file Excel"""
         if not self.data:
@@ -587,14 +1372,10 @@ class SapNhapCrawlerSimple:
         df = pd.DataFrame(self.data)
         
         # Làm sạch dữ liệu
-        for col in df.columns:
-            if df[col].dtype == 'object':
-                df[col] = df[col].astype(str).apply(lambda x: re.sub(r'[^\x20-\x7E\u00A0-\uFFFF]', '', str(x)))
-                df[col] = df[col].apply(lambda x: x[:32767] if len(str(x)) > 32767 else x)
-                df[col] = df[col].fillna('')
+        df = clean_dataframe(df)
         
         try:
-            with pd.ExcelWriter(filename, engine='openpyxl') as writer:
+            with self.metrics.timer('export'), pd.ExcelWriter(filename, engine='openpyxl') as writer:
                 # Sheet dữ liệu chính
                 df.to_excel(writer, sheet_name='Dữ liệu sáp nhập', index=False)
                 
@@ -617,19 +1398,7 @@ class SapNhapCrawlerSimple:
                     stats.append({'Loại': 'Tổng số thay đổi', 'Giá trị': '', 'Số lượng': total_changes})
                 
                 # Thống kê crawling
-                stats.append({'Loại': 'Tổng request', 'Giá trị': '', 'Số lượng': self.stats['total_processed']})
-                stats.append({'Loại': 'Request thành công', 'Giá trị': '', 'Số lượng': self.stats['success_count']})
-                stats.append({'Loại': 'Request lỗi', 'Giá trị': '', 'Số lượng': self.stats['error_count']})
-                
-                if self.stats['total_processed'] > 0:
-                    success_rate = (self.stats['success_count'] / self.stats['total_processed']) * 100
-                    stats.append({'Loại': 'Tỷ lệ thành công (%)', 'Giá trị': '', 'Số lượng': round(success_rate, 1)})
-                
-                # Chi tiết lỗi
-                if self.stats['error_count'] > 0:
-                    stats.append({'Loại': 'Rate limit errors', 'Giá trị': '', 'Số lượng': self.stats['rate_limit_count']})
-                    stats.append({'Loại': 'Timeout errors', 'Giá trị': '', 'Số lượng': self.stats['timeout_count']})
-                    stats.append({'Loại': 'Connection errors', 'Giá trị': '', 'Số lượng': self.stats['connection_error_count']})
+                stats.extend(self.crawl_stats_rows())
                 
                 if stats:
                     stats_df = pd.DataFrame(stats)
@@ -664,9 +1433,61 @@ class SapNhapCrawlerSimple:
             filename = csv_filename
         
         return filename
+    
+    def save_columnar(self, filename=None, fmt='parquet'):
+        """Lưu dữ liệu ra file Parquet / Feather (kiểu cột chuẩn, đọc lại rất nhanh)"""
+        if not self.data:
+            print("❌ Không có dữ liệu để lưu")
+            return
+        
+        if not filename:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = f"sap_nhap_simple_{timestamp}.{fmt}"
+        
+        try:
+            with self.metrics.timer('export'):
+                save_columnar(self.data, filename)
+            print(f"💾 Đã lưu: {filename}")
+        except Exception as e:
+            print(f"❌ Lỗi lưu {fmt}: {e}")
+            return None
+        
+        return filename
 
 def main():
     """Hàm chính"""
+    parser = argparse.ArgumentParser(description="Tool kéo dữ liệu địa chỉ sáp nhập")
+    parser.add_argument('--resume', action='store_true',
+                        help="Tiếp tục lần crawl trước, bỏ qua các xã/phường đã có trong journal")
+    parser.add_argument('--journal', default='sap_nhap_journal.jsonl',
+                        help="File journal tiến trình (mặc định: sap_nhap_journal.jsonl)")
+    parser.add_argument('--stream', metavar='FILE',
+                        help="Ghi kết quả ngay khi crawl ra FILE (.jsonl/.csv/.xlsx/.parquet) thay vì giữ trong bộ nhớ")
+    parser.add_argument('--store', default='sap_nhap_results.sqlite3',
+                        help="Kho kết quả SQLite dùng chung, upsert theo (ma_tinh, ma_xa) (mặc định: sap_nhap_results.sqlite3)")
+    parser.add_argument('--no-store', action='store_true', help="Không ghi vào kho kết quả SQLite")
+    parser.add_argument('--columnar', choices=['parquet', 'feather', 'none'], default='parquet',
+                        help="Lưu thêm file dạng cột cạnh file Excel (mặc định: parquet)")
+    parser.add_argument('--metrics-file', metavar='FILE',
+                        help="Ghi định kỳ histogram thời gian từng bước (chung và theo tỉnh) ra FILE JSON")
+    parser.add_argument('--metrics-interval', type=float, default=15.0,
+                        help="Số giây giữa hai lần ghi --metrics-file (mặc định: 15)")
+    parser.add_argument('--metrics-port', type=int, metavar='PORT',
+                        help="Phục vụ metrics dạng Prometheus tại http://0.0.0.0:PORT/metrics")
+    parser.add_argument('--progress-interval', type=float, default=30.0,
+                        help="Số giây giữa hai lần in tiến độ / tốc độ / thời gian còn lại khi auto-discovery (mặc định: 30)")
+    parser.add_argument('--status-file', metavar='FILE',
+                        help="Ghi trạng thái tiến độ (JSON) ra FILE mỗi lần báo cáo")
+    parser.add_argument('--retry-attempts', type=int, default=4,
+                        help="Số lần thử tối đa cho mỗi xã/phường trước khi ghi vào error log (mặc định: 4)")
+    parser.add_argument('--retry-delay', type=float, default=5.0,
+                        help="Thời gian chờ trước lần thử lại đầu tiên, nhân đôi mỗi lần kèm jitter (mặc định: 5 giây)")
+    parser.add_argument('--breaker-ratio', type=float, default=0.5,
+                        help="Ngắt mạch khi tỷ lệ lỗi trong 20 request gần nhất đạt ngưỡng này (mặc định: 0.5)")
+    parser.add_argument('--breaker-cooldown', type=float, default=30.0,
+                        help="Số giây tạm dừng trước request thăm dò đầu tiên, gấp đôi nếu vẫn lỗi (mặc định: 30)")
+    args = parser.parse_args()
+    
     print("=== TOOL KÉO DỮ LIỆU ĐỊA CHỈ SÁP NHẬP - PHIÊN BẢN ĐƠN GIẢN ===")
     print("🌐 Website: https://thuvienphapluat.vn")
     print("🎯 Chiến lược: Auto-discovery hoặc dữ liệu mẫu")
@@ -678,11 +1499,42 @@ def main():
     print("3. 🌐 Auto-discovery: Tự động tìm tất cả tỉnh/xã")
     print("4. 🔍 Auto-discovery: Chỉ tìm một số tỉnh đầu tiên")
     print("5. 🔄 Retry các lỗi từ lần crawl trước")
+    print("6. ⚡ Auto-discovery song song (async, nhanh hơn nhiều)")
     
     try:
-        choice = input("\n➤ Nhập lựa chọn (1-5): ").strip()
+        choice = input("\n➤ Nhập lựa chọn (1-6): ").strip()
         
         crawler = SapNhapCrawlerSimple()
+        crawler.progress_interval = args.progress_interval
+        crawler.status_file = args.status_file
+        crawler.retry_policy = RetryPolicy(max_attempts=args.retry_attempts, base_delay=args.retry_delay)
+        crawler.breaker_options = {'failure_ratio': args.breaker_ratio, 'cooldown': args.breaker_cooldown}
+        
+        if args.metrics_file or args.metrics_port is not None:
+            exporter = MetricsExporter(
+                crawler.metrics,
+                counters=lambda: crawler.stats,
+                gauges=lambda: {
+                    'rate_limit_rps': crawler.rate_limiter.rate,
+                    'results': crawler.result_count,
+                    'circuit_open': int(any(breaker.is_open for breaker in crawler.breakers.values())),
+                    'circuit_downtime_seconds': round(crawler.circuit_downtime(), 1),
+                },
+                path=args.metrics_file,
+                interval=args.metrics_interval,
+                port=args.metrics_port,
+            ).start()
+        
+        if not args.no_store:
+            crawler.enable_store(args.store)
+        
+        # Streaming phải bật trước journal để bản ghi resume cũng được ghi ra file
+        if args.stream:
+            crawler.enable_streaming(args.stream)
+        
+        # Ghi journal cho mọi chế độ crawl (trừ retry) để có thể --resume khi bị dừng
+        if choice != "5":
+            crawler.enable_journal(args.journal, resume=args.resume)
         
         if choice == "1":
             data = crawler.crawl_known_data(max_items=5)
@@ -729,13 +1581,39 @@ def main():
                 print("❌ Không tìm thấy file error log nào")
                 data = []
             
+        elif choice == "6":
+            # Auto-discovery async
+            concurrency = input("➤ Số request song song (mặc định 8): ").strip()
+            try:
+                concurrency = int(concurrency) if concurrency else 8
+            except ValueError:
+                concurrency = 8
+            print(f"\n🚀 Bắt đầu auto-discovery async với {concurrency} request song song...")
+            data = crawler.crawl_all_autodiscovery_async(concurrency=concurrency)
+            
         else:
             print("⚠️  Lựa chọn không hợp lệ. Chạy test mặc định.")
             data = crawler.crawl_known_data(max_items=5)
         
         # Lưu kết quả
-        if data:
+        if crawler.sink is not None:
+            summary = crawler.sink.summary
+            filename = crawler.close_streaming()
+            
+            print("\n📊 === KẾT QUẢ CUỐI CÙNG ===")
+            print(f"📈 Tổng số bản ghi: {summary.record_count}")
+            print("\n🏛️  Phân loại theo cấp:")
+            for cap, count in summary.cap_counts.most_common():
+                print(f"   {cap}: {count}")
+            print(f"\n✅ Có thông tin sáp nhập: {summary.info_counts[True]}")
+            print(f"⚪ Không có thông tin: {summary.info_counts[False]}")
+            print(f"🔄 Tổng số thay đổi: {summary.total_changes}")
+            print(f"\n💾 File kết quả: {filename}")
+            
+        elif data:
             filename = crawler.save_to_excel()
+            if args.columnar != 'none':
+                crawler.save_columnar(os.path.splitext(filename)[0] + f'.{args.columnar}', fmt=args.columnar)
             
             print(f"\n📊 === KẾT QUẢ CUỐI CÙNG ===")
             df = pd.DataFrame(data)
@@ -765,7 +1643,9 @@ def main():
             
     except KeyboardInterrupt:
         print("\n\n🛑 Đã dừng theo yêu cầu người dùng")
-        if 'crawler' in locals() and crawler.data:
+        if 'crawler' in locals() and crawler.sink is not None:
+            crawler.close_streaming()
+        elif 'crawler' in locals() and crawler.data:
             print("💾 Đang lưu dữ liệu đã kéo được...")
             crawler.save_to_excel()
             
@@ -774,9 +1654,23 @@ def main():
         import traceback
         traceback.print_exc()
         
-        if 'crawler' in locals() and crawler.data:
+        if 'crawler' in locals() and crawler.sink is not None:
+            crawler.close_streaming()
+        elif 'crawler' in locals() and crawler.data:
             print("💾 Đang lưu dữ liệu đã kéo được...")
             crawler.save_to_excel()
+    
+    finally:
+        if 'exporter' in locals():
+            exporter.stop()
+            if args.metrics_file:
+                print(f"📈 Metrics: {args.metrics_file}")
+        if 'crawler' in locals() and crawler.store is not None:
+            print(f"🗄️  Kho kết quả: {crawler.store.path} ({len(crawler.store)} bản ghi)")
+            crawler.store.close()
+        if 'crawler' in locals() and crawler.journal:
+            crawler.journal.close()
+            print(f"📒 Journal tiến trình: {crawler.journal.path} (chạy lại với --resume để tiếp tục)")
 
 if __name__ == "__main__":
     main()
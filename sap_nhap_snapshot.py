@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Snapshot nhị phân cho API: biên dịch một lần, khởi động trong vài chục mili giây
+
+Một file .snapshot gồm header JSON và các bảng Arrow IPC (không nén):
+- records: các cột trả về của /tra-cuu kèm tên đã bỏ dấu và các khóa so khớp
+- xa_rows, provinces: danh sách xã/phường và tỉnh đã sắp sẵn
+- postings_*: index trigram dạng list<int32> (CSR)
+
+File được mở bằng mmap. Chỉ các mảng postings (index trigram) dùng thẳng vùng
+nhớ của file, nhiều worker cùng đọc một snapshot thì dùng chung page cache của
+hệ điều hành. Bản ghi thì mỗi worker vẫn dựng thành dict/DataFrame riêng (dict
+và DataFrame dùng chung các object chuỗi); snapshot giúp khởi động nhanh chứ
+không chia sẻ phần này.
+
+Cần pyarrow; không có pyarrow thì API đọc file dữ liệu gốc ghi trong header.
+
+Biên dịch:
+    python sap_nhap_snapshot.py sap_nhap_backup.xlsx -o sap_nhap.snapshot
+"""
+
+import argparse
+import gc
+import hashlib
+import json
+import os
+import struct
+import sys
+import time
+from datetime import datetime
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:  # API fallback về file dữ liệu gốc (xem api_sap_nhap.load_data)
+    pa = None
+
+from sap_nhap_batch import BatchConverter
+from sap_nhap_index import NAME_FIELDS, RESULT_COLUMNS, LookupIndex, NameSearchIndex, Postings
+from sap_nhap_resolver import AddressResolver
+
+MAGIC = b'SAPNHAP\x01'
+ALIGNMENT = 64  # Căn lề mỗi bảng để mảng numpy đọc zero-copy từ mmap
+
+
+def _name_column(field):
+    return f'{field}_norm'
+
+
+def _postings_table(postings):
+    ids = pa.ListArray.from_arrays(pa.array(postings.offsets, pa.int32()), pa.array(postings.ids, pa.int32()))
+    return pa.table({'gram': pa.array(postings.vocab, pa.string()), 'ids': ids})
+
+
+def _column(table, name):
+    """Một cột thành list Python (qua numpy, nhanh hơn to_pylist nhiều lần)"""
+    return table.column(name).to_numpy(zero_copy_only=False).tolist()
+
+
+def _columns(table, names=None):
+    return {name: _column(table, name) for name in (names or table.column_names)}
+
+
+def _rows(columns):
+    """{tên cột: list giá trị} thành list dict theo dòng"""
+    names = list(columns)
+    return [dict(zip(names, values)) for values in zip(*columns.values())]
+
+
+def _read_postings(table):
+    ids = table.column('ids').combine_chunks()
+    return Postings(_column(table, 'gram'), ids.offsets.to_numpy(), ids.values.to_numpy())
+
+
+def _ipc_bytes(table):
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _pad(length):
+    return (-length) % ALIGNMENT
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("Cần cài pyarrow để dùng snapshot: pip install pyarrow")
+
+
+def read_meta(path):
+    """Đọc header của snapshot (không cần pyarrow): meta gồm version, source, created_at, rows"""
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"Không phải file snapshot: {path}")
+        header_length = struct.unpack('<Q', f.read(8))[0]
+        return json.loads(f.read(header_length))['meta']
+
+
+def write_snapshot(data, path):
+    """Ghi snapshot từ ApiData đã dựng (ghi ra file tạm rồi đổi tên để không bao giờ đọc phải file dở)"""
+    _require_pyarrow()
+    lookup_index = data.lookup_index
+    records = pd.DataFrame(lookup_index.records, columns=RESULT_COLUMNS)
+    for field, name_index in zip(NAME_FIELDS, lookup_index.name_indexes):
+        records[_name_column(field)] = name_index.names
+    records['province_key'] = data.resolver.province_keys
+    records['ward_key'] = data.resolver.ward_keys
+    for col in ['code_key', 'name_key', 'short_name_key']:
+        records[col] = data.batch_converter.keys[col].values
+
+    tables = {
+        'records': pa.Table.from_pandas(records, preserve_index=False),
+        'xa_rows': pa.Table.from_pandas(pd.DataFrame(lookup_index.xa_rows), preserve_index=False),
+        'provinces': pa.Table.from_pandas(pd.DataFrame(lookup_index.provinces), preserve_index=False),
+        'postings_resolver': _postings_table(data.resolver.postings),
+    }
+    for field, name_index in zip(NAME_FIELDS, lookup_index.name_indexes):
+        tables[f'postings_{field}'] = _postings_table(name_index.postings)
+
+    blobs = {name: _ipc_bytes(table) for name, table in tables.items()}
+    version = hashlib.sha1(b''.join(blobs[name] for name in sorted(blobs))).hexdigest()[:12]
+    meta = {
+        'version': version,
+        'source': data.path,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'rows': len(records),
+    }
+
+    # Vị trí các bảng tính sau header; header có độ dài cố định khi đã biết vị trí
+    layout = {}
+    header = b''
+    for _ in range(2):
+        offset = len(MAGIC) + 8 + len(header)
+        offset += _pad(offset)
+        for name, blob in blobs.items():
+            layout[name] = [offset, len(blob)]
+            offset += len(blob) + _pad(len(blob))
+        header = json.dumps({'meta': meta, 'tables': layout}).encode('utf-8')
+
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC + struct.pack('<Q', len(header)) + header)
+        for name, blob in blobs.items():
+            f.write(b'\0' * (layout[name][0] - f.tell()))
+            f.write(blob)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+    return meta
+
+
+def read_snapshot(path):
+    """Mở snapshot bằng mmap, trả về dict các phần: df, lookup_index, resolver, batch_converter, meta"""
+    _require_pyarrow()
+    # Tạo hàng chục nghìn dict/list liên tục: tạm tắt gc để không quét lại cả heap nhiều lần
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _read_parts(path)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def _read_parts(path):
+    source = pa.memory_map(path, 'r')
+    if source.read(len(MAGIC)) != MAGIC:
+        raise ValueError(f"Không phải file snapshot: {path}")
+    header_length = struct.unpack('<Q', source.read(8))[0]
+    header = json.loads(source.read(header_length))
+
+    def table(name):
+        offset, length = header['tables'][name]
+        source.seek(offset)
+        return pa.ipc.open_file(source.read_buffer(length)).read_all()
+
+    records_table = table('records')
+    columns = _columns(records_table, RESULT_COLUMNS)
+    records = _rows(columns)
+
+    name_indexes = [
+        NameSearchIndex(_column(records_table, _name_column(field)),
+                        _read_postings(table(f'postings_{field}')))
+        for field in NAME_FIELDS
+    ]
+    lookup_index = LookupIndex.from_parts(
+        records, name_indexes, _rows(_columns(table('xa_rows'))), _rows(_columns(table('provinces')))
+    )
+
+    resolver = AddressResolver(
+        records,
+        _column(records_table, 'province_key'),
+        _column(records_table, 'ward_key'),
+        _read_postings(table('postings_resolver')),
+    )
+
+    # Dựng từ cùng các list cột với records: DataFrame trỏ tới các object chuỗi đã có, không tạo bản thứ hai
+    df = pd.DataFrame(columns)
+    keys = records_table.select(['code_key', 'name_key', 'short_name_key']).to_pandas()
+
+    return {
+        'df': df,
+        'lookup_index': lookup_index,
+        'resolver': resolver,
+        'batch_converter': BatchConverter(df, keys),
+        'meta': header['meta'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Biên dịch dữ liệu sáp nhập thành snapshot cho API")
+    parser.add_argument('input', help="File dữ liệu (.xlsx/.parquet/.feather)")
+    parser.add_argument('-o', '--output', default='sap_nhap.snapshot', help="File snapshot (mặc định sap_nhap.snapshot)")
+    args = parser.parse_args()
+
+    from api_sap_nhap import load_data
+
+    print(f"📂 Đọc và dựng index: {args.input}")
+    start = time.perf_counter()
+    data = load_data(args.input)
+    print(f"   {time.perf_counter() - start:.2f} s")
+
+    meta = write_snapshot(data, args.output)
+    size = os.path.getsize(args.output) / 1024 / 1024
+    print(f"💾 Đã lưu: {args.output} ({size:.1f} MB, {meta['rows']} bản ghi, phiên bản {meta['version']})")
+
+    start = time.perf_counter()
+    read_snapshot(args.output)
+    print(f"⚡ Nạp lại snapshot: {(time.perf_counter() - start) * 1000:.0f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
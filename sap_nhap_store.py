@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Kho kết quả crawl trên SQLite
+
+- Mỗi (ma_tinh, ma_xa) chỉ có một dòng: crawl lại / retry / crawl từng phần
+  đều upsert vào cùng một file thay vì nối list rồi dựng lại DataFrame
+- Có index theo mã và theo tên đã chuẩn hóa (bỏ dấu, chữ thường) để tra cứu nhanh
+- API có thể đọc trực tiếp cùng file này
+"""
+
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+import pandas as pd
+
+from sap_nhap_export import COLUMNS
+
+
+def normalize_name(text):
+    """Chuẩn hóa tên địa danh để so khớp: bỏ dấu, đ -> d, chữ thường, gộp khoảng trắng"""
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFD', str(text).replace('đ', 'd').replace('Đ', 'D'))
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return re.sub(r'\s+', ' ', text).strip().lower()
+
+
+class ResultStore:
+    def __init__(self, path='sap_nhap_results.sqlite3'):
+        self.path = path
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS results (
+                ma_tinh TEXT NOT NULL,
+                ma_xa TEXT NOT NULL,
+                ten_tinh TEXT,
+                ten_xa TEXT,
+                cap_hanh_chinh TEXT,
+                url TEXT,
+                truoc_sap_nhap TEXT,
+                sau_sap_nhap TEXT,
+                chi_tiet_json TEXT,
+                so_luong_thay_doi INTEGER,
+                co_thong_tin INTEGER,
+                ten_tinh_norm TEXT,
+                ten_xa_norm TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (ma_tinh, ma_xa)
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_results_ma_xa ON results(ma_xa)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_results_ten_tinh ON results(ten_tinh_norm)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_results_ten_xa ON results(ten_xa_norm, ten_tinh_norm)')
+        self._conn.commit()
+
+    def _row_values(self, record):
+        return (
+            str(record.get('ma_tinh') or ''),
+            str(record.get('ma_xa') or ''),
+            record.get('ten_tinh'),
+            record.get('ten_xa'),
+            record.get('cap_hanh_chinh'),
+            record.get('url'),
+            record.get('truoc_sap_nhap'),
+            record.get('sau_sap_nhap'),
+            record.get('chi_tiet_json'),
+            int(record.get('so_luong_thay_doi') or 0),
+            int(bool(record.get('co_thong_tin'))),
+            normalize_name(record.get('ten_tinh')),
+            normalize_name(record.get('ten_xa')),
+            time.time()
+        )
+
+    def upsert_many(self, records):
+        """Thêm hoặc cập nhật nhiều bản ghi trong một transaction"""
+        rows = [self._row_values(record) for record in records]
+
+        with self._lock:
+            self._conn.executemany('''
+                INSERT INTO results (ma_tinh, ma_xa, ten_tinh, ten_xa, cap_hanh_chinh, url,
+                                     truoc_sap_nhap, sau_sap_nhap, chi_tiet_json, so_luong_thay_doi,
+                                     co_thong_tin, ten_tinh_norm, ten_xa_norm, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(ma_tinh, ma_xa) DO UPDATE SET
+                    ten_tinh = excluded.ten_tinh,
+                    ten_xa = excluded.ten_xa,
+                    cap_hanh_chinh = excluded.cap_hanh_chinh,
+                    url = excluded.url,
+                    truoc_sap_nhap = excluded.truoc_sap_nhap,
+                    sau_sap_nhap = excluded.sau_sap_nhap,
+                    chi_tiet_json = excluded.chi_tiet_json,
+                    so_luong_thay_doi = excluded.so_luong_thay_doi,
+                    co_thong_tin = excluded.co_thong_tin,
+                    ten_tinh_norm = excluded.ten_tinh_norm,
+                    ten_xa_norm = excluded.ten_xa_norm,
+                    updated_at = excluded.updated_at
+            ''', rows)
+            self._conn.commit()
+
+        return len(rows)
+
+    def upsert(self, record):
+        """Thêm hoặc cập nhật một bản ghi theo (ma_tinh, ma_xa)"""
+        return self.upsert_many([record])
+
+    def _to_record(self, row):
+        record = {col: row[col] for col in COLUMNS}
+        record['co_thong_tin'] = bool(record['co_thong_tin'])
+        return record
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [self._to_record(row) for row in rows]
+
+    def get(self, ma_tinh, ma_xa=''):
+        """Tra cứu một bản ghi theo mã, trả về dict hoặc None"""
+        rows = self._query('SELECT * FROM results WHERE ma_tinh = ? AND ma_xa = ?',
+                           (str(ma_tinh), str(ma_xa or '')))
+        return rows[0] if rows else None
+
+    def find_by_name(self, ten_xa, ten_tinh=None):
+        """Tra cứu theo tên xã (và tên tỉnh), không phân biệt dấu / hoa thường"""
+        if ten_tinh:
+            return self._query('SELECT * FROM results WHERE ten_xa_norm = ? AND ten_tinh_norm = ?',
+                               (normalize_name(ten_xa), normalize_name(ten_tinh)))
+        return self._query('SELECT * FROM results WHERE ten_xa_norm = ?', (normalize_name(ten_xa),))
+
+    def list_xa(self, ma_tinh):
+        """Danh sách xã/phường của một tỉnh, sắp theo tên"""
+        return self._query("SELECT * FROM results WHERE ma_tinh = ? AND ma_xa != '' ORDER BY ten_xa",
+                           (str(ma_tinh),))
+
+    def all_records(self):
+        """Toàn bộ bản ghi, sắp theo (ma_tinh, ma_xa)"""
+        return self._query('SELECT * FROM results ORDER BY ma_tinh, ma_xa')
+
+    def to_dataframe(self):
+        """Toàn bộ kho dưới dạng DataFrame (cùng cột với file Excel)"""
+        with self._lock:
+            df = pd.read_sql_query(f"SELECT {', '.join(COLUMNS)} FROM results ORDER BY ma_tinh, ma_xa",
+                                   self._conn)
+        df['co_thong_tin'] = df['co_thong_tin'].astype(bool)
+        return df
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()